@@ -18,11 +18,13 @@ import time
 try:
     from llm_service import generate_biografia, LLMResponse, ContentType
     from avatar_service import generate_avatar_for_persona, AvatarResponse
+    from http_session_service import close_http_sessions
 except ImportError as e:
     print(f"Erro ao importar serviços LLM: {e}")
     # Fallback para desenvolvimento
     generate_biografia = None
     generate_avatar_for_persona = None
+    close_http_sessions = None
 
 # Setup logging
 logging.basicConfig(
@@ -35,17 +37,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Concorrência e rate limiting (configuráveis via .env)
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('VCM_BIOGRAFIA_CONCURRENCY', '5'))
+DEFAULT_PROVIDER_RATES = {
+    'llm': float(os.getenv('VCM_LLM_REQUESTS_PER_SECOND', '2')),
+    'avatar': float(os.getenv('VCM_AVATAR_REQUESTS_PER_SECOND', '1'))
+}
+
+class TokenBucketRateLimiter:
+    """
+    Rate limiter token bucket por provider
+    Substitui a pausa fixa entre gerações: permite rajadas até `capacity`
+    e mantém a taxa média em `rate` requisições por segundo
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[int] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Aguarda até haver um token disponível e o consome"""
+        if self.rate <= 0:
+            return
+        
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 class BiografiaLLMGenerator:
     """
     Gerador de biografias usando LLM
     Integra Google AI + OpenAI + Nano Banana para resultados realistas
     """
     
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None):
         self.base_path = Path(__file__).parent.parent
         self.output_path = self.base_path / "01_SETUP_E_CRIACAO" / "test_biografias_output"
         self.output_path.mkdir(exist_ok=True)
         
+        # Pool de workers limitado por semáforo + rate limit por provider
+        self.max_concurrency = max(1, max_concurrency or DEFAULT_MAX_CONCURRENCY)
+        self.rate_limiters = {
+            provider: TokenBucketRateLimiter(rate)
+            for provider, rate in DEFAULT_PROVIDER_RATES.items()
+        }
+        
         # Configurações do sistema
         self.personas_config = self.load_personas_config()
         self.generation_stats = {
@@ -165,18 +212,38 @@ class BiografiaLLMGenerator:
                 "generated_at": datetime.now().isoformat(),
                 "generator_version": "2.0.0-llm",
                 "total_personas": len(personas),
-                "generation_method": "llm_integrated"
+                "generation_method": "llm_integrated",
+                "max_concurrency": self.max_concurrency
             }
         }
         
-        # Gera biografias sequencialmente para melhor controle
-        for i, persona in enumerate(personas, 1):
-            logger.info(f"📝 Gerando biografia {i}/{len(personas)} - {persona['cargo']}")
+        # Gera biografias em paralelo (limitado pelo semáforo), mantendo a ordem das personas
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = [
+            self._generate_biografia_worker(semaphore, i, len(personas), empresa, persona)
+            for i, persona in enumerate(personas, 1)
+        ]
+        biografias = await asyncio.gather(*tasks)
+        
+        results["biografias"] = [biografia for biografia in biografias if biografia]
+        
+        # Salva resultados
+        await self.save_results(results)
+        
+        # Log de estatísticas
+        self.log_generation_stats()
+        
+        return results
+    
+    async def _generate_biografia_worker(self, semaphore: asyncio.Semaphore, index: int, total: int,
+                                         empresa: Dict[str, Any], persona: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Worker do pool: gera uma biografia respeitando o limite de concorrência"""
+        async with semaphore:
+            logger.info(f"📝 Gerando biografia {index}/{total} - {persona['cargo']}")
             
             biografia = await self.generate_single_biografia(empresa, persona)
             
             if biografia:
-                results["biografias"].append(biografia)
                 self.generation_stats['successful'] += 1
                 logger.info(f"✅ Biografia gerada: {biografia['nome_completo']}")
             else:
@@ -185,16 +252,7 @@ class BiografiaLLMGenerator:
             
             self.generation_stats['total_generated'] += 1
             
-            # Pausa pequena entre gerações para evitar rate limiting
-            await asyncio.sleep(1)
-        
-        # Salva resultados
-        await self.save_results(results)
-        
-        # Log de estatísticas
-        self.log_generation_stats()
-        
-        return results
+            return biografia
     
     async def generate_single_biografia(self, empresa: Dict[str, Any], persona: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -216,6 +274,7 @@ class BiografiaLLMGenerator:
             }
             
             # Gera biografia usando LLM
+            await self.rate_limiters['llm'].acquire()
             llm_response = await generate_biografia(context)
             
             if not llm_response.success:
@@ -284,6 +343,7 @@ class BiografiaLLMGenerator:
     async def generate_avatar_for_biografia(self, biografia_data: Dict[str, Any]) -> Optional[AvatarResponse]:
         """Gera avatar para a biografia"""
         try:
+            await self.rate_limiters['avatar'].acquire()
             return await generate_avatar_for_persona(biografia_data)
         except Exception as e:
             logger.error(f"Erro na geração de avatar: {str(e)}")
@@ -365,6 +425,7 @@ class BiografiaLLMGenerator:
         logger.info(f"Custo LLM: ${self.generation_stats['total_cost']:.4f}")
         logger.info(f"Custo Avatar: ${self.generation_stats['avatar_cost']:.4f}")
         logger.info(f"Custo Total: ${(self.generation_stats['total_cost'] + self.generation_stats['avatar_cost']):.4f}")
+        logger.info(f"Concorrência máxima: {self.max_concurrency}")
         logger.info(f"Tempo total: {total_time:.1f}s")
         logger.info(f"Tempo médio por persona: {(total_time/self.generation_stats['total_generated']):.1f}s")
 
@@ -398,13 +459,18 @@ async def main():
         logger.error(f"Erro na execução principal: {str(e)}")
         print(f"❌ Erro: {str(e)}")
         return False
+    
+    finally:
+        # Encerra sessões HTTP compartilhadas antes do event loop fechar
+        if close_http_sessions:
+            await close_http_sessions()
 
 # Função para integração com API
-async def generate_biografias_api(empresa_data: Dict[str, Any]) -> Dict[str, Any]:
+async def generate_biografias_api(empresa_data: Dict[str, Any], max_concurrency: Optional[int] = None) -> Dict[str, Any]:
     """
     Função para integração com API do dashboard
     """
-    generator = BiografiaLLMGenerator()
+    generator = BiografiaLLMGenerator(max_concurrency=max_concurrency)
     return await generator.generate_all_biografias(empresa_data)
 
 # Execução standalone
@@ -17,10 +17,17 @@ import os
 import sys
 import json
 import re
+import time
+import argparse
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from persona_workers import list_persona_folders, process_personas_parallel, resolve_workers
+from persona_loader import full_bio_info, get_persona_loader, parse_bio
+from build_graph import BuildGraph, plan_cascade, print_plan
+from persona_writer import FileWriter
+
 class CompetenciasGenerator:
     def __init__(self, base_path: str = None):
         """Inicializar gerador de competências"""
@@ -33,6 +40,18 @@ class CompetenciasGenerator:
         self.output_path = self.base_path / "competencias_output"
         self.output_path.mkdir(exist_ok=True)
         
+        # Resultados em memória por persona (repassados ao próximo estágio pelo pipeline_runner)
+        self.generated: Dict[str, Dict] = {}
+        
+        # Biografias analisadas uma vez por cascata (cache por mtime+tamanho)
+        self.persona_loader = get_persona_loader()
+        
+        # Personas com biografia e gerador inalterados desde o último build são puladas
+        self.build_graph = BuildGraph({1: Path(__file__)})
+        
+        # Gravação dos arquivos (BufferedWriter no modo fused adia a gravação)
+        self.writer = FileWriter()
+        
         # Templates de competências por área
         self.competencias_templates = {
             "assistente": {
@@ -129,50 +148,7 @@ class CompetenciasGenerator:
         
     def extract_bio_info(self, bio_content: str) -> Dict:
         """Extrair informações relevantes da biografia"""
-        info = {
-            "nome": "",
-            "nacionalidade": "",
-            "idade": "",
-            "formacao": "",
-            "experiencia": "",
-            "especializacao": "",
-            "idiomas": [],
-            "habilidades_mencionadas": [],
-            "bio_completa": bio_content  # Adicionar texto completo para análise
-        }
-        
-        # Extrair nome
-        nome_match = re.search(r'\*\*(?:👤\s*)?Nome:\*\*\s*(.+)', bio_content)
-        if nome_match:
-            info["nome"] = nome_match.group(1).strip()
-        
-        # Extrair nacionalidade
-        nacionalidade_match = re.search(r'\*\*Nacionalidade:\*\*\s*(.+)', bio_content)
-        if nacionalidade_match:
-            info["nacionalidade"] = nacionalidade_match.group(1).strip()
-        
-        # Extrair idade
-        idade_match = re.search(r'\*\*Idade[^:]*:\*\*\s*(.+)', bio_content)
-        if idade_match:
-            info["idade"] = idade_match.group(1).strip()
-        
-        # Extrair formação
-        formacao_matches = re.findall(r'formação|graduação|mestrado|doutorado|curso|certificação', bio_content, re.IGNORECASE)
-        if formacao_matches:
-            info["formacao"] = "Identificada na biografia"
-        
-        # Extrair idiomas
-        idiomas_match = re.search(r'\*\*Idiomas:\*\*\s*(.+)', bio_content)
-        if idiomas_match:
-            idiomas_text = idiomas_match.group(1)
-            info["idiomas"] = [lang.strip() for lang in re.split(r'[,e]', idiomas_text) if lang.strip()]
-        
-        # Extrair especialização
-        espec_match = re.search(r'\*\*Especialização:\*\*\s*(.+)', bio_content)
-        if espec_match:
-            info["especializacao"] = espec_match.group(1).strip()
-        
-        return info
+        return full_bio_info(parse_bio(bio_content))
     
     def generate_competencias_from_bio(self, bio_info: Dict, role_type: str) -> Dict:
         """Gerar competências baseadas na biografia e tipo de role"""
@@ -512,12 +488,8 @@ class CompetenciasGenerator:
         
         bio_file = bio_files[0]
         
-        # Ler biografia
-        with open(bio_file, 'r', encoding='utf-8') as f:
-            bio_content = f.read()
-        
-        # Extrair informações
-        bio_info = self.extract_bio_info(bio_content)
+        # Ler e extrair informações da biografia (cache compartilhado)
+        bio_info = full_bio_info(self.persona_loader.load_bio(bio_file))
         
         # Determinar tipo de role
         persona_name = persona_path.name
@@ -535,9 +507,8 @@ class CompetenciasGenerator:
         # Gerar competências
         competencias = self.generate_competencias_from_bio(bio_info, role_type)
         
-        # Criar pasta de competências
+        # Pasta de competências (criada pelo writer)
         comp_path = persona_path / "competencias"
-        comp_path.mkdir(exist_ok=True)
         
         # Salvar JSON de competências
         comp_json = {
@@ -558,14 +529,14 @@ class CompetenciasGenerator:
         }
         
         json_file = comp_path / "competencias_core.json"
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(comp_json, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(json_file, comp_json)
         
         # Criar arquivo MD detalhado
         md_content = self.generate_competencias_md(comp_json, bio_info)
         md_file = comp_path / "competencias_detalhadas.md"
-        with open(md_file, 'w', encoding='utf-8') as f:
-            f.write(md_content)
+        self.writer.write_text(md_file, md_content)
+        
+        self.generated[str(persona_path)] = {"competencias": comp_json}
         
         print(f"✅ Competências geradas para {persona_name}")
         print(f"   📄 {json_file}")
@@ -686,8 +657,8 @@ class CompetenciasGenerator:
         
         return md_content
     
-    def process_all_personas(self) -> Dict:
-        """Processar todas as personas encontradas"""
+    def process_all_personas(self, workers: Optional[int] = None, force: bool = False) -> Dict:
+        """Processar todas as personas encontradas (workers > 1 processa em paralelo; force ignora o build graph)"""
         
         print("\n" + "="*60)
         print("🎯 SCRIPT 1 - GERADOR DE COMPETÊNCIAS")
@@ -695,33 +666,49 @@ class CompetenciasGenerator:
         print(f"📍 Base: {self.base_path}")
         print(f"👥 Personas: {self.personas_path}")
         
-        results = {
-            "processed": [],
-            "failed": [],
-            "total": 0
-        }
+        workers = resolve_workers(workers)
+        self.build_graph.force = force
+        started_at = time.time()
         
         # Buscar todas as pastas de personas
-        for role_folder in self.personas_path.iterdir():
-            if role_folder.is_dir():
-                print(f"\n📁 Processando {role_folder.name}...")
-                
-                for persona_folder in role_folder.iterdir():
-                    if persona_folder.is_dir():
-                        results["total"] += 1
-                        
-                        if self.create_competencias_structure(persona_folder):
-                            results["processed"].append(str(persona_folder))
-                        else:
-                            results["failed"].append(str(persona_folder))
+        if workers > 1:
+            persona_folders = list_persona_folders(self.personas_path)
+            print(f"\n⚡ {len(persona_folders)} personas em {workers} workers...")
+            results = process_personas_parallel(self, persona_folders, workers)
+        else:
+            results = {
+                "processed": [],
+                "skipped": [],
+                "failed": [],
+                "total": 0
+            }
+            
+            for role_folder in self.personas_path.iterdir():
+                if role_folder.is_dir():
+                    print(f"\n📁 Processando {role_folder.name}...")
+                    
+                    for persona_folder in role_folder.iterdir():
+                        if persona_folder.is_dir():
+                            self.process_persona(persona_folder, results)
+            
+            # Persistir o cache de biografias/JSONs para os próximos scripts
+            self.persona_loader.flush()
+        
+        elapsed = time.time() - started_at
+        results["workers"] = workers
+        results["elapsed_seconds"] = round(elapsed, 3)
+        results["personas_per_second"] = round(results["total"] / elapsed, 2) if elapsed > 0 else 0.0
         
         # Relatório final
         print(f"\n{'='*60}")
         print("📊 RELATÓRIO FINAL")
         print(f"{'='*60}")
         print(f"✅ Processadas: {len(results['processed'])}")
+        print(f"⏭️ Sem alterações: {len(results['skipped'])}")
         print(f"❌ Falharam: {len(results['failed'])}")
         print(f"📊 Total: {results['total']}")
+        print(f"⚡ Throughput: {results['personas_per_second']} personas/s "
+              f"({results['elapsed_seconds']}s, {workers} worker(s))")
         
         if results["failed"]:
             print(f"\n❌ Falhas:")
@@ -729,20 +716,45 @@ class CompetenciasGenerator:
                 print(f"   - {failed}")
         
         return results
+    
+    def process_persona(self, persona_folder: Path, results: Dict):
+        """Processar uma persona e registrar o resultado"""
+        results["total"] += 1
+        
+        if self.build_graph.is_fresh(1, persona_folder):
+            results["skipped"].append(str(persona_folder))
+            return
+        
+        if self.create_competencias_structure(persona_folder):
+            self.build_graph.record(1, persona_folder)
+            results["processed"].append(str(persona_folder))
+        else:
+            results["failed"].append(str(persona_folder))
 
 
 def main():
     """Função principal"""
     
     # Verificar argumentos
-    if len(sys.argv) > 1:
-        base_path = sys.argv[1]
-    else:
-        base_path = None
+    parser = argparse.ArgumentParser(description="Script 1 da cascata VCM")
+    parser.add_argument("base_path", nargs="?", default=None)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos paralelos (0 = todos os núcleos; padrão VCM_GENERATOR_WORKERS ou 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocessar todas as personas, mesmo sem alterações")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Só listar as personas que seriam reprocessadas")
+    args = parser.parse_args()
+    
+    generator = CompetenciasGenerator(args.base_path)
+    
+    if args.dry_run:
+        persona_folders = list_persona_folders(generator.personas_path)
+        print_plan(plan_cascade(persona_folders, [1], {1: Path(__file__)}, force=args.force), len(persona_folders))
+        sys.exit(0)
     
     # Executar gerador
-    generator = CompetenciasGenerator(base_path)
-    results = generator.process_all_personas()
+    results = generator.process_all_personas(workers=args.workers, force=args.force)
     
     # Exit code baseado no resultado
     if results["failed"]:
@@ -26,10 +26,20 @@ import os
 import sys
 import json
 import re
+import time
+import argparse
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from persona_workers import list_persona_folders, process_personas_parallel, resolve_workers
+from persona_loader import get_persona_loader, parse_bio, summary_bio_info
+from build_graph import BuildGraph, plan_cascade, print_plan
+from persona_writer import FileWriter
+
+# Campos da biografia usados por este script
+BIO_FIELDS = ("especializacao", "idiomas", "idade")
+
 class TechSpecsGenerator:
     def __init__(self, base_path: str = None):
         """Inicializar gerador de tech specs"""
@@ -40,6 +50,17 @@ class TechSpecsGenerator:
         
         self.personas_path = self.base_path / "04_PERSONAS_COMPLETAS"
         
+        # Resultados do estágio anterior em memória (evitam reler competencias_core.json)
+        self.preloaded: Dict[str, Dict] = {}
+        self.generated: Dict[str, Dict] = {}
+        self.persona_loader = get_persona_loader()
+        
+        # Personas com entradas e gerador inalterados desde o último build são puladas
+        self.build_graph = BuildGraph({2: Path(__file__)})
+        
+        # Gravação dos arquivos (BufferedWriter no modo fused adia a gravação)
+        self.writer = FileWriter()
+        
         # Templates de configurações por role type
         self.ai_configs_templates = {
             "assistente": {
@@ -159,41 +180,24 @@ class TechSpecsGenerator:
             "persona_name": persona_path.name
         }
         
-        # Carregar biografia
+        # Carregar biografia (cache compartilhado entre os scripts)
         bio_files = list(persona_path.glob("*_bio.md"))
         if bio_files:
-            with open(bio_files[0], 'r', encoding='utf-8') as f:
-                bio_content = f.read()
-                data["bio_info"] = self.extract_bio_info(bio_content)
+            data["bio_info"] = summary_bio_info(self.persona_loader.load_bio(bio_files[0]), BIO_FIELDS)
         
         # Carregar competências
+        preloaded = self.preloaded.get(str(persona_path), {})
         comp_file = persona_path / "competencias" / "competencias_core.json"
-        if comp_file.exists():
-            with open(comp_file, 'r', encoding='utf-8') as f:
-                data["competencias"] = json.load(f)
+        if "competencias" in preloaded:
+            data["competencias"] = preloaded["competencias"]
+        elif comp_file.exists():
+            data["competencias"] = self.persona_loader.load_json(comp_file)
         
         return data
     
     def extract_bio_info(self, bio_content: str) -> Dict:
         """Extrair informações da biografia"""
-        info = {}
-        
-        # Extrair especialização
-        espec_match = re.search(r'\*\*Especialização:\*\*\s*(.+)', bio_content)
-        if espec_match:
-            info["especializacao"] = espec_match.group(1).strip()
-        
-        # Extrair idiomas
-        idiomas_match = re.search(r'\*\*Idiomas:\*\*\s*(.+)', bio_content)
-        if idiomas_match:
-            info["idiomas"] = idiomas_match.group(1).strip()
-        
-        # Extrair idade
-        idade_match = re.search(r'\*\*Idade[^:]*:\*\*\s*(.+)', bio_content)
-        if idade_match:
-            info["idade"] = idade_match.group(1).strip()
-            
-        return info
+        return summary_bio_info(parse_bio(bio_content), BIO_FIELDS)
     
     def determine_role_type(self, persona_path: Path) -> str:
         """Determinar tipo de role baseado no caminho"""
@@ -359,8 +363,9 @@ class TechSpecsGenerator:
     def create_tech_specs_structure(self, persona_path: Path) -> bool:
         """Criar estrutura de tech specs para uma persona"""
         
-        # Verificar dependências
-        if not (persona_path / "competencias").exists():
+        # Verificar dependências (em memória no modo fused, ainda não gravadas)
+        preloaded = self.preloaded.get(str(persona_path), {})
+        if "competencias" not in preloaded and not (persona_path / "competencias").exists():
             print(f"❌ Competências não encontradas em {persona_path}")
             return False
         
@@ -373,22 +378,21 @@ class TechSpecsGenerator:
         comm_config = self.generate_communication_config(persona_data, role_type)
         rag_config = self.generate_rag_config(persona_data, role_type)
         
-        # Criar pasta tech_specs
+        # Pasta tech_specs (criada pelo writer)
         tech_path = persona_path / "tech_specs"
-        tech_path.mkdir(exist_ok=True)
         
         # Salvar configuração de IA
         ai_file = tech_path / "ai_config.json"
-        with open(ai_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "metadata": {
-                    "persona_name": persona_data["persona_name"],
-                    "role_type": role_type,
-                    "generated_at": datetime.now().isoformat(),
-                    "script_version": "2.0.0"
-                },
-                "ai_configuration": ai_config
-            }, f, indent=2, ensure_ascii=False)
+        ai_document = {
+            "metadata": {
+                "persona_name": persona_data["persona_name"],
+                "role_type": role_type,
+                "generated_at": datetime.now().isoformat(),
+                "script_version": "2.0.0"
+            },
+            "ai_configuration": ai_config
+        }
+        self.writer.write_json(ai_file, ai_document)
         
         # Salvar configuração de ferramentas
         tools_config = {
@@ -401,14 +405,16 @@ class TechSpecsGenerator:
         }
         
         tools_file = tech_path / "tools_config.json"
-        with open(tools_file, 'w', encoding='utf-8') as f:
-            json.dump(tools_config, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(tools_file, tools_config)
         
         # Criar documentação MD
         md_content = self.generate_tech_specs_md(persona_data, role_type, ai_config, comm_config, rag_config)
         md_file = tech_path / "tech_specs_completas.md"
-        with open(md_file, 'w', encoding='utf-8') as f:
-            f.write(md_content)
+        self.writer.write_text(md_file, md_content)
+        
+        self.generated[str(persona_path)] = {
+            "tech_specs": {"ai_config": ai_document, "tools_config": tools_config}
+        }
         
         print(f"✅ Tech Specs geradas para {persona_data['persona_name']}")
         print(f"   🤖 {ai_file}")
@@ -517,8 +523,8 @@ class TechSpecsGenerator:
         
         return md_content
     
-    def process_all_personas(self) -> Dict:
-        """Processar todas as personas"""
+    def process_all_personas(self, workers: Optional[int] = None, force: bool = False) -> Dict:
+        """Processar todas as personas (workers > 1 processa em paralelo; force ignora o build graph)"""
         
         print("\n" + "="*60)
         print("⚙️ SCRIPT 2 - GERADOR DE TECH SPECS")
@@ -526,33 +532,49 @@ class TechSpecsGenerator:
         print(f"📍 Base: {self.base_path}")
         print(f"👥 Personas: {self.personas_path}")
         
-        results = {
-            "processed": [],
-            "failed": [],
-            "total": 0
-        }
+        workers = resolve_workers(workers)
+        self.build_graph.force = force
+        started_at = time.time()
         
         # Buscar todas as pastas de personas
-        for role_folder in self.personas_path.iterdir():
-            if role_folder.is_dir():
-                print(f"\n📁 Processando {role_folder.name}...")
-                
-                for persona_folder in role_folder.iterdir():
-                    if persona_folder.is_dir():
-                        results["total"] += 1
-                        
-                        if self.create_tech_specs_structure(persona_folder):
-                            results["processed"].append(str(persona_folder))
-                        else:
-                            results["failed"].append(str(persona_folder))
+        if workers > 1:
+            persona_folders = list_persona_folders(self.personas_path)
+            print(f"\n⚡ {len(persona_folders)} personas em {workers} workers...")
+            results = process_personas_parallel(self, persona_folders, workers)
+        else:
+            results = {
+                "processed": [],
+                "skipped": [],
+                "failed": [],
+                "total": 0
+            }
+            
+            for role_folder in self.personas_path.iterdir():
+                if role_folder.is_dir():
+                    print(f"\n📁 Processando {role_folder.name}...")
+                    
+                    for persona_folder in role_folder.iterdir():
+                        if persona_folder.is_dir():
+                            self.process_persona(persona_folder, results)
+            
+            # Persistir o cache de biografias/JSONs para os próximos scripts
+            self.persona_loader.flush()
+        
+        elapsed = time.time() - started_at
+        results["workers"] = workers
+        results["elapsed_seconds"] = round(elapsed, 3)
+        results["personas_per_second"] = round(results["total"] / elapsed, 2) if elapsed > 0 else 0.0
         
         # Relatório final
         print(f"\n{'='*60}")
         print("📊 RELATÓRIO FINAL")
         print(f"{'='*60}")
         print(f"✅ Processadas: {len(results['processed'])}")
+        print(f"⏭️ Sem alterações: {len(results['skipped'])}")
         print(f"❌ Falharam: {len(results['failed'])}")
         print(f"📊 Total: {results['total']}")
+        print(f"⚡ Throughput: {results['personas_per_second']} personas/s "
+              f"({results['elapsed_seconds']}s, {workers} worker(s))")
         
         if results["failed"]:
             print(f"\n❌ Falhas:")
@@ -560,20 +582,45 @@ class TechSpecsGenerator:
                 print(f"   - {failed}")
         
         return results
+    
+    def process_persona(self, persona_folder: Path, results: Dict):
+        """Processar uma persona e registrar o resultado"""
+        results["total"] += 1
+        
+        if self.build_graph.is_fresh(2, persona_folder):
+            results["skipped"].append(str(persona_folder))
+            return
+        
+        if self.create_tech_specs_structure(persona_folder):
+            self.build_graph.record(2, persona_folder)
+            results["processed"].append(str(persona_folder))
+        else:
+            results["failed"].append(str(persona_folder))
 
 
 def main():
     """Função principal"""
     
     # Verificar argumentos
-    if len(sys.argv) > 1:
-        base_path = sys.argv[1]
-    else:
-        base_path = None
+    parser = argparse.ArgumentParser(description="Script 2 da cascata VCM")
+    parser.add_argument("base_path", nargs="?", default=None)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos paralelos (0 = todos os núcleos; padrão VCM_GENERATOR_WORKERS ou 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocessar todas as personas, mesmo sem alterações")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Só listar as personas que seriam reprocessadas")
+    args = parser.parse_args()
+    
+    generator = TechSpecsGenerator(args.base_path)
+    
+    if args.dry_run:
+        persona_folders = list_persona_folders(generator.personas_path)
+        print_plan(plan_cascade(persona_folders, [2], {2: Path(__file__)}, force=args.force), len(persona_folders))
+        sys.exit(0)
     
     # Executar gerador
-    generator = TechSpecsGenerator(base_path)
-    results = generator.process_all_personas()
+    results = generator.process_all_personas(workers=args.workers, force=args.force)
     
     # Exit code baseado no resultado
     if results["failed"]:
@@ -17,10 +17,20 @@ import os
 import sys
 import json
 import re
+import time
+import argparse
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from persona_workers import list_persona_folders, process_personas_parallel, resolve_workers
+from persona_loader import get_persona_loader, parse_bio, summary_bio_info
+from build_graph import BuildGraph, plan_cascade, print_plan
+from persona_writer import FileWriter
+
+# Campos da biografia usados por este script
+BIO_FIELDS = ("especializacao", "idiomas")
+
 class RAGGenerator:
     def __init__(self, base_path: str = None):
         """Inicializar gerador de RAG"""
@@ -31,6 +41,19 @@ class RAGGenerator:
         
         self.personas_path = self.base_path / "04_PERSONAS_COMPLETAS"
         
+        # Resultados dos estágios anteriores em memória (evitam reler competências e tech specs)
+        self.preloaded: Dict[str, Dict] = {}
+        self.persona_loader = get_persona_loader()
+        
+        # Personas com entradas e gerador inalterados desde o último build são puladas
+        self.build_graph = BuildGraph({3: Path(__file__)})
+        
+        # Gravação dos arquivos (BufferedWriter no modo fused adia a gravação)
+        self.writer = FileWriter()
+        
+        # Especialização detectada por persona (contagem do relatório sem recarregar os dados)
+        self.specializations: Dict[str, str] = {}
+        
         # Templates de knowledge base por área de especialização
         self.knowledge_templates = {
             "nutrição": {
@@ -208,48 +231,38 @@ class RAGGenerator:
             "persona_name": persona_path.name
         }
         
-        # Carregar biografia
+        # Carregar biografia (cache compartilhado entre os scripts)
         bio_files = list(persona_path.glob("*_bio.md"))
         if bio_files:
-            with open(bio_files[0], 'r', encoding='utf-8') as f:
-                bio_content = f.read()
-                data["bio_info"] = self.extract_bio_info(bio_content)
+            data["bio_info"] = summary_bio_info(self.persona_loader.load_bio(bio_files[0]), BIO_FIELDS)
         
         # Carregar competências
+        preloaded = self.preloaded.get(str(persona_path), {})
         comp_file = persona_path / "competencias" / "competencias_core.json"
-        if comp_file.exists():
-            with open(comp_file, 'r', encoding='utf-8') as f:
-                data["competencias"] = json.load(f)
+        if "competencias" in preloaded:
+            data["competencias"] = preloaded["competencias"]
+        elif comp_file.exists():
+            data["competencias"] = self.persona_loader.load_json(comp_file)
         
         # Carregar tech specs
         ai_config_file = persona_path / "tech_specs" / "ai_config.json"
         tools_config_file = persona_path / "tech_specs" / "tools_config.json"
         
+        if "tech_specs" in preloaded:
+            data["tech_specs"] = dict(preloaded["tech_specs"])
+            return data
+        
         if ai_config_file.exists():
-            with open(ai_config_file, 'r', encoding='utf-8') as f:
-                data["tech_specs"]["ai_config"] = json.load(f)
+            data["tech_specs"]["ai_config"] = self.persona_loader.load_json(ai_config_file)
         
         if tools_config_file.exists():
-            with open(tools_config_file, 'r', encoding='utf-8') as f:
-                data["tech_specs"]["tools_config"] = json.load(f)
+            data["tech_specs"]["tools_config"] = self.persona_loader.load_json(tools_config_file)
         
         return data
     
     def extract_bio_info(self, bio_content: str) -> Dict:
         """Extrair informações da biografia"""
-        info = {}
-        
-        # Extrair especialização
-        espec_match = re.search(r'\*\*Especialização:\*\*\s*(.+)', bio_content)
-        if espec_match:
-            info["especializacao"] = espec_match.group(1).strip()
-        
-        # Extrair idiomas
-        idiomas_match = re.search(r'\*\*Idiomas:\*\*\s*(.+)', bio_content)
-        if idiomas_match:
-            info["idiomas"] = idiomas_match.group(1).strip()
-        
-        return info
+        return summary_bio_info(parse_bio(bio_content), BIO_FIELDS)
     
     def determine_specialization_area(self, persona_data: Dict) -> str:
         """Determinar área de especialização baseada nos dados"""
@@ -467,46 +480,44 @@ class RAGGenerator:
     def create_rag_structure(self, persona_path: Path) -> bool:
         """Criar estrutura RAG para uma persona"""
         
-        # Verificar dependências
-        if not (persona_path / "tech_specs").exists():
+        # Verificar dependências (em memória no modo fused, ainda não gravadas)
+        preloaded = self.preloaded.get(str(persona_path), {})
+        if "tech_specs" not in preloaded and not (persona_path / "tech_specs").exists():
             print(f"❌ Tech Specs não encontradas em {persona_path}")
             return False
         
         # Carregar dados
         persona_data = self.load_persona_data(persona_path)
         specialization = self.determine_specialization_area(persona_data)
+        self.specializations[str(persona_path)] = specialization
         
         # Gerar knowledge base
         knowledge_base = self.generate_knowledge_base(persona_data, specialization)
         
-        # Criar pasta rag
+        # Pasta rag (criada pelo writer)
         rag_path = persona_path / "rag"
-        rag_path.mkdir(exist_ok=True)
         
         # Salvar knowledge base principal
         kb_file = rag_path / "knowledge_base.json"
-        with open(kb_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "metadata": {
-                    "persona_name": persona_data["persona_name"],
-                    "specialization": specialization,
-                    "generated_at": datetime.now().isoformat(),
-                    "script_version": "3.0.0"
-                },
-                "knowledge_base": knowledge_base
-            }, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(kb_file, {
+            "metadata": {
+                "persona_name": persona_data["persona_name"],
+                "specialization": specialization,
+                "generated_at": datetime.now().isoformat(),
+                "script_version": "3.0.0"
+            },
+            "knowledge_base": knowledge_base
+        })
         
         # Salvar regras de contexto
         context_rules = self.generate_context_rules(persona_data, specialization, knowledge_base)
         rules_file = rag_path / "context_rules.md"
-        with open(rules_file, 'w', encoding='utf-8') as f:
-            f.write(context_rules)
+        self.writer.write_text(rules_file, context_rules)
         
         # Salvar configuração de busca
         search_config = self.generate_search_config(persona_data, specialization)
         search_file = rag_path / "search_config.json"
-        with open(search_file, 'w', encoding='utf-8') as f:
-            json.dump(search_config, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(search_file, search_config)
         
         print(f"✅ RAG gerado para {persona_data['persona_name']} (especialização: {specialization})")
         print(f"   📚 {kb_file}")
@@ -638,8 +649,8 @@ class RAGGenerator:
             }
         }
     
-    def process_all_personas(self) -> Dict:
-        """Processar todas as personas"""
+    def process_all_personas(self, workers: Optional[int] = None, force: bool = False) -> Dict:
+        """Processar todas as personas (workers > 1 processa em paralelo; force ignora o build graph)"""
         
         print("\n" + "="*60)
         print("📚 SCRIPT 3 - GERADOR DE RAG PERSONALIZADO")
@@ -647,39 +658,51 @@ class RAGGenerator:
         print(f"📍 Base: {self.base_path}")
         print(f"👥 Personas: {self.personas_path}")
         
-        results = {
-            "processed": [],
-            "failed": [],
-            "total": 0,
-            "specializations": {}
-        }
+        workers = resolve_workers(workers)
+        self.build_graph.force = force
+        started_at = time.time()
         
         # Buscar todas as pastas de personas
-        for role_folder in self.personas_path.iterdir():
-            if role_folder.is_dir():
-                print(f"\n📁 Processando {role_folder.name}...")
-                
-                for persona_folder in role_folder.iterdir():
-                    if persona_folder.is_dir():
-                        results["total"] += 1
-                        
-                        if self.create_rag_structure(persona_folder):
-                            results["processed"].append(str(persona_folder))
-                            
-                            # Contar especializações
-                            persona_data = self.load_persona_data(persona_folder)
-                            spec = self.determine_specialization_area(persona_data)
-                            results["specializations"][spec] = results["specializations"].get(spec, 0) + 1
-                        else:
-                            results["failed"].append(str(persona_folder))
+        if workers > 1:
+            persona_folders = list_persona_folders(self.personas_path)
+            print(f"\n⚡ {len(persona_folders)} personas em {workers} workers...")
+            results = process_personas_parallel(self, persona_folders, workers)
+            results.setdefault("specializations", {})
+        else:
+            results = {
+                "processed": [],
+                "skipped": [],
+                "failed": [],
+                "total": 0,
+                "specializations": {}
+            }
+            
+            for role_folder in self.personas_path.iterdir():
+                if role_folder.is_dir():
+                    print(f"\n📁 Processando {role_folder.name}...")
+                    
+                    for persona_folder in role_folder.iterdir():
+                        if persona_folder.is_dir():
+                            self.process_persona(persona_folder, results)
+            
+            # Persistir o cache de biografias/JSONs para os próximos scripts
+            self.persona_loader.flush()
+        
+        elapsed = time.time() - started_at
+        results["workers"] = workers
+        results["elapsed_seconds"] = round(elapsed, 3)
+        results["personas_per_second"] = round(results["total"] / elapsed, 2) if elapsed > 0 else 0.0
         
         # Relatório final
         print(f"\n{'='*60}")
         print("📊 RELATÓRIO FINAL")
         print(f"{'='*60}")
         print(f"✅ Processadas: {len(results['processed'])}")
+        print(f"⏭️ Sem alterações: {len(results['skipped'])}")
         print(f"❌ Falharam: {len(results['failed'])}")
         print(f"📊 Total: {results['total']}")
+        print(f"⚡ Throughput: {results['personas_per_second']} personas/s "
+              f"({results['elapsed_seconds']}s, {workers} worker(s))")
         
         print(f"\n📈 Especializações Detectadas:")
         for spec, count in results["specializations"].items():
@@ -691,20 +714,52 @@ class RAGGenerator:
                 print(f"   - {failed}")
         
         return results
+    
+    def process_persona(self, persona_folder: Path, results: Dict):
+        """Processar uma persona e registrar o resultado (com a especialização detectada)"""
+        results["total"] += 1
+        
+        if self.build_graph.is_fresh(3, persona_folder):
+            # Especialização da persona pulada lida do knowledge base existente
+            results["skipped"].append(str(persona_folder))
+            knowledge_base = self.persona_loader.load_json(persona_folder / "rag" / "knowledge_base.json")
+            spec = knowledge_base["metadata"]["specialization"]
+        elif self.create_rag_structure(persona_folder):
+            self.build_graph.record(3, persona_folder)
+            results["processed"].append(str(persona_folder))
+            spec = self.specializations[str(persona_folder)]
+        else:
+            results["failed"].append(str(persona_folder))
+            return
+        
+        # Contar especializações
+        specializations = results.setdefault("specializations", {})
+        specializations[spec] = specializations.get(spec, 0) + 1
 
 
 def main():
     """Função principal"""
     
     # Verificar argumentos
-    if len(sys.argv) > 1:
-        base_path = sys.argv[1]
-    else:
-        base_path = None
+    parser = argparse.ArgumentParser(description="Script 3 da cascata VCM")
+    parser.add_argument("base_path", nargs="?", default=None)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos paralelos (0 = todos os núcleos; padrão VCM_GENERATOR_WORKERS ou 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocessar todas as personas, mesmo sem alterações")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Só listar as personas que seriam reprocessadas")
+    args = parser.parse_args()
+    
+    generator = RAGGenerator(args.base_path)
+    
+    if args.dry_run:
+        persona_folders = list_persona_folders(generator.personas_path)
+        print_plan(plan_cascade(persona_folders, [3], {3: Path(__file__)}, force=args.force), len(persona_folders))
+        sys.exit(0)
     
     # Executar gerador
-    generator = RAGGenerator(base_path)
-    results = generator.process_all_personas()
+    results = generator.process_all_personas(workers=args.workers, force=args.force)
     
     # Exit code baseado no resultado
     if results["failed"]:
@@ -15,6 +15,9 @@ from pathlib import Path
 from datetime import datetime
 import uuid
 
+from task_classifier import KeywordMatcher, get_task_classifier
+from persona_writer import FileWriter
+
 # Configuração de logging
 import os
 os.makedirs('logs', exist_ok=True)
@@ -43,6 +46,15 @@ class FluxoAnalyzer:
             }
         }
         
+        # Regras de palavras-chave (task_rules.json) compiladas uma vez por processo
+        self.classifier = get_task_classifier()
+        
+        # Matchers de dependência por lista de tarefas diárias (personas do mesmo template compartilham)
+        self._dependency_matchers = {}
+        
+        # Gravação dos arquivos (BufferedWriter no modo fused adia a gravação)
+        self.writer = FileWriter()
+        
     def load_persona_data(self, persona_path):
         """Carrega competências e tech specs de uma persona"""
         try:
@@ -81,17 +93,20 @@ class FluxoAnalyzer:
             logging.error(f"Erro ao carregar dados da persona {persona_path}: {e}")
             return None
     
-    def analyze_task_flow(self, task, competencias, tech_specs, categoria_temporal):
-        """Analisa um fluxo específico de uma tarefa"""
+    def analyze_task_flow(self, task, competencias, tech_specs, categoria_temporal, classification=None):
+        """Analisa um fluxo específico de uma tarefa (classification: resultado já calculado em lote)"""
+        
+        if classification is None:
+            classification = self.classifier.classify(task)
         
         # Identificar origem da informação
-        origem = self._identify_data_source(task, competencias)
+        origem = self._identify_data_source(task, competencias, classification)
         
         # Identificar processamento necessário
-        processamento = self._identify_processing(task, tech_specs)
+        processamento = self._identify_processing(task, tech_specs, classification)
         
         # Identificar destino/saída
-        destino = self._identify_output_destination(task, competencias)
+        destino = self._identify_output_destination(task, competencias, classification)
         
         # Criar assistente virtual específico para este fluxo
         assistente = self._create_flow_assistant(task, categoria_temporal)
@@ -107,47 +122,20 @@ class FluxoAnalyzer:
             },
             "assistente_virtual": assistente,
             "dependencies": self._identify_dependencies(task, competencias),
-            "tools_required": self._identify_tools(task, tech_specs),
-            "validation_criteria": self._create_validation_criteria(task)
+            "tools_required": self._identify_tools(task, tech_specs, classification),
+            "validation_criteria": self._create_validation_criteria(task, classification)
         }
     
-    def _identify_data_source(self, task, competencias):
+    def _identify_data_source(self, task, competencias, classification=None):
         """Identifica de onde vem a informação para a tarefa"""
-        sources = []
-        
-        if any(keyword in task.lower() for keyword in ['clientes', 'atendimento', 'vendas']):
-            sources.append("CRM/Sistema de Clientes")
-        if any(keyword in task.lower() for keyword in ['dados', 'análise', 'relatório']):
-            sources.append("Base de Dados/Analytics")
-        if any(keyword in task.lower() for keyword in ['email', 'comunicação']):
-            sources.append("Sistema de Email/Comunicação")
-        if any(keyword in task.lower() for keyword in ['financeiro', 'pagamento']):
-            sources.append("Sistema Financeiro")
-        if any(keyword in task.lower() for keyword in ['produto', 'estoque']):
-            sources.append("Sistema de Produtos/Estoque")
-        
-        # Se não identificou fonte específica, usar competências
-        if not sources:
-            sources.append("Input Manual/Competência Especializada")
-            
-        return sources
+        # Sem fonte específica nas regras: "Input Manual/Competência Especializada"
+        classification = classification or self.classifier.classify(task)
+        return list(classification["origem"])
     
-    def _identify_processing(self, task, tech_specs):
+    def _identify_processing(self, task, tech_specs, classification=None):
         """Identifica o que precisa ser feito com a informação"""
-        processing = []
-        
-        if any(keyword in task.lower() for keyword in ['análise', 'analisar']):
-            processing.append("Análise de Dados")
-        if any(keyword in task.lower() for keyword in ['relatório', 'report']):
-            processing.append("Geração de Relatório")
-        if any(keyword in task.lower() for keyword in ['criar', 'gerar']):
-            processing.append("Criação de Conteúdo")
-        if any(keyword in task.lower() for keyword in ['atualizar', 'modificar']):
-            processing.append("Atualização de Dados")
-        if any(keyword in task.lower() for keyword in ['validar', 'verificar']):
-            processing.append("Validação/Verificação")
-        if any(keyword in task.lower() for keyword in ['enviar', 'comunicar']):
-            processing.append("Comunicação/Envio")
+        classification = classification or self.classifier.classify(task)
+        processing = list(classification["processamento"])
         
         # Adicionar processamento baseado nas tech specs
         if 'ai_config' in tech_specs:
@@ -157,26 +145,11 @@ class FluxoAnalyzer:
             
         return processing
     
-    def _identify_output_destination(self, task, competencias):
+    def _identify_output_destination(self, task, competencias, classification=None):
         """Identifica para onde a informação deve ir"""
-        destinations = []
-        
-        if any(keyword in task.lower() for keyword in ['cliente', 'atendimento']):
-            destinations.append("Sistema CRM/Cliente")
-        if any(keyword in task.lower() for keyword in ['relatório', 'dashboard']):
-            destinations.append("Dashboard/Relatórios")
-        if any(keyword in task.lower() for keyword in ['email', 'notificação']):
-            destinations.append("Sistema de Notificação")
-        if any(keyword in task.lower() for keyword in ['arquivo', 'documento']):
-            destinations.append("Sistema de Arquivos")
-        if any(keyword in task.lower() for keyword in ['equipe', 'colaborador']):
-            destinations.append("Comunicação Interna")
-        
-        # Default destination
-        if not destinations:
-            destinations.append("Output Estruturado/Base de Dados")
-            
-        return destinations
+        # Sem destino específico nas regras: "Output Estruturado/Base de Dados"
+        classification = classification or self.classifier.classify(task)
+        return list(classification["destino"])
     
     def _create_flow_assistant(self, task, categoria_temporal):
         """Cria configuração do assistente virtual para o fluxo"""
@@ -208,17 +181,32 @@ class FluxoAnalyzer:
     
     def _identify_dependencies(self, task, competencias):
         """Identifica dependências da tarefa"""
-        dependencies = []
-        
-        # Analisar dependências baseadas nas competências
-        if 'tarefas_diarias' in competencias:
-            for tarefa_diaria in competencias['tarefas_diarias']:
-                if task != tarefa_diaria and any(word in task.lower() for word in tarefa_diaria.lower().split()):
-                    dependencies.append(tarefa_diaria)
-                    
-        return dependencies
+        
+        # Tarefas diárias que compartilham alguma palavra com a tarefa
+        tarefas_diarias = competencias.get('tarefas_diarias')
+        if not tarefas_diarias:
+            return []
+        
+        matched = self._dependency_matcher(tarefas_diarias).match(task.lower())
+        return [tarefa_diaria for index, tarefa_diaria in enumerate(tarefas_diarias)
+                if index in matched and task != tarefa_diaria]
+    
+    def _dependency_matcher(self, tarefas_diarias):
+        """Matcher palavra -> índices das tarefas diárias (compilado uma vez por lista)"""
+        key = tuple(tarefas_diarias)
+        matcher = self._dependency_matchers.get(key)
+        if matcher is None:
+            words = {}
+            for index, tarefa_diaria in enumerate(tarefas_diarias):
+                for word in tarefa_diaria.lower().split():
+                    words.setdefault(word, set()).add(index)
+            
+            if len(self._dependency_matchers) >= 256:
+                self._dependency_matchers.clear()
+            matcher = self._dependency_matchers[key] = KeywordMatcher(words)
+        return matcher
     
-    def _identify_tools(self, task, tech_specs):
+    def _identify_tools(self, task, tech_specs, classification=None):
         """Identifica ferramentas necessárias"""
         tools = []
         
@@ -226,36 +214,20 @@ class FluxoAnalyzer:
             tools.extend(tech_specs['tools'])
         
         # Adicionar ferramentas baseadas na tarefa
-        if any(keyword in task.lower() for keyword in ['email', 'comunicação']):
-            tools.append("Email API")
-        if any(keyword in task.lower() for keyword in ['dados', 'análise']):
-            tools.append("Analytics Engine")
-        if any(keyword in task.lower() for keyword in ['relatório']):
-            tools.append("Report Generator")
+        classification = classification or self.classifier.classify(task)
+        tools.extend(classification["ferramentas"])
             
         return list(set(tools))  # Remove duplicatas
     
-    def _create_validation_criteria(self, task):
+    def _create_validation_criteria(self, task, classification=None):
         """Cria critérios de validação para a tarefa"""
-        criteria = []
-        
-        criteria.append("Dados de entrada validados")
-        criteria.append("Processamento executado sem erros")
-        criteria.append("Output gerado no formato correto")
-        
-        if any(keyword in task.lower() for keyword in ['cliente', 'atendimento']):
-            criteria.append("Satisfação do cliente verificada")
-        if any(keyword in task.lower() for keyword in ['dados', 'análise']):
-            criteria.append("Precisão dos dados verificada")
-        if any(keyword in task.lower() for keyword in ['relatório']):
-            criteria.append("Completude do relatório verificada")
-            
-        return criteria
+        # Critérios base ("always" em task_rules.json) seguidos dos específicos da tarefa
+        classification = classification or self.classifier.classify(task)
+        return list(classification["validacao"])
     
-    def generate_tasktodo_document(self, persona_data):
-        """Gera documento tasktodo.md para uma persona"""
+    def analyze_persona_flows(self, persona_data):
+        """Analisa todas as tarefas de uma persona por categoria temporal"""
         
-        persona_name = persona_data["persona_name"]
         competencias = persona_data["competencias"]
         tech_specs = persona_data["tech_specs"]
         
@@ -266,42 +238,49 @@ class FluxoAnalyzer:
             "mensais": []
         }
         
-        # Processar tarefas diárias
-        if 'tarefas_diarias' in competencias:
-            for task in competencias['tarefas_diarias']:
-                analysis = self.analyze_task_flow(task, competencias, tech_specs, "diaria")
-                fluxos_analysis["diarias"].append(analysis)
+        periodos = [
+            ("diarias", "tarefas_diarias", "diaria"),
+            ("semanais", "tarefas_semanais", "semanal"),
+            ("mensais", "tarefas_mensais", "mensal")
+        ]
+        
+        # Todas as tarefas da persona classificadas em uma única varredura
+        tasks = [(periodo, categoria_temporal, task)
+                 for periodo, key, categoria_temporal in periodos
+                 for task in competencias.get(key, [])]
+        classifications = self.classifier.classify_batch(task for _, _, task in tasks)
         
-        # Processar tarefas semanais
-        if 'tarefas_semanais' in competencias:
-            for task in competencias['tarefas_semanais']:
-                analysis = self.analyze_task_flow(task, competencias, tech_specs, "semanal")
-                fluxos_analysis["semanais"].append(analysis)
+        for (periodo, categoria_temporal, task), classification in zip(tasks, classifications):
+            analysis = self.analyze_task_flow(task, competencias, tech_specs, categoria_temporal, classification)
+            fluxos_analysis[periodo].append(analysis)
         
-        # Processar tarefas mensais
-        if 'tarefas_mensais' in competencias:
-            for task in competencias['tarefas_mensais']:
-                analysis = self.analyze_task_flow(task, competencias, tech_specs, "mensal")
-                fluxos_analysis["mensais"].append(analysis)
+        return fluxos_analysis
+    
+    def generate_tasktodo_document(self, persona_data, fluxos_analysis=None):
+        """Gera documento tasktodo.md para uma persona"""
+        
+        persona_name = persona_data["persona_name"]
+        if fluxos_analysis is None:
+            fluxos_analysis = self.analyze_persona_flows(persona_data)
         
         # Gerar documento markdown
         tasktodo_content = self._generate_markdown_content(persona_name, fluxos_analysis)
         
         # Criar diretório script4_tasktodo dentro da pasta da persona
         categoria = persona_data.get("categoria", "unknown")
-        persona_path = self.output_dir / "04_PERSONAS_SCRIPTS_1_2_3" / categoria / persona_data["persona_name"]
+        if persona_data.get("persona_dir"):
+            persona_path = Path(persona_data["persona_dir"])
+        else:
+            persona_path = self.output_dir / "04_PERSONAS_SCRIPTS_1_2_3" / categoria / persona_data["persona_name"]
         tasktodo_dir = persona_path / "script4_tasktodo"
-        tasktodo_dir.mkdir(parents=True, exist_ok=True)
         
         # Salvar documento
         tasktodo_path = tasktodo_dir / "tasktodo.md"
-        with open(tasktodo_path, 'w', encoding='utf-8') as f:
-            f.write(tasktodo_content)
+        self.writer.write_text(tasktodo_path, tasktodo_content)
             
         # Salvar análise JSON para processamento posterior
         analysis_path = tasktodo_dir / "fluxos_analysis.json"
-        with open(analysis_path, 'w', encoding='utf-8') as f:
-            json.dump(fluxos_analysis, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(analysis_path, fluxos_analysis)
             
         logging.info(f"TaskTodo gerado para {persona_name}: {tasktodo_path}")
         return tasktodo_path
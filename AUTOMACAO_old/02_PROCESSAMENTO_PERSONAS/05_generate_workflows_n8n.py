@@ -15,6 +15,9 @@ from pathlib import Path
 from datetime import datetime
 import uuid
 
+from persona_writer import FileWriter
+from workflow_graph import WorkflowGraph
+
 # Configuração de logging
 import os
 os.makedirs('logs', exist_ok=True)
@@ -34,6 +37,9 @@ class N8NWorkflowGenerator:
         self.output_dir = Path(output_dir)
         self.node_counter = 0
         
+        # Gravação dos arquivos (BufferedWriter no modo fused adia a gravação)
+        self.writer = FileWriter()
+        
     def load_tasktodo_data(self, persona_path):
         """Carrega dados do tasktodo de uma persona"""
         try:
@@ -80,61 +86,54 @@ class N8NWorkflowGenerator:
     
     def create_workflow_from_tasktodo(self, persona_data):
         """Cria workflow N8N completo baseado no tasktodo"""
+        return self.build_workflow_graph(persona_data).to_n8n()
+    
+    def build_workflow_graph(self, persona_data):
+        """Monta o grafo do workflow (nós indexados por id, conexões em O(1))"""
         
         persona_name = persona_data["persona_name"]
         fluxos = persona_data["fluxos"]
         
+        # IDs determinísticos: cada workflow numera seus nós a partir de node_1
+        self.node_counter = 0
+        
         # Estrutura base do workflow N8N
-        workflow = {
-            "name": f"Workflow_{persona_name}_Complete",
-            "nodes": [],
-            "connections": {},
-            "active": True,
-            "settings": {},
-            "staticData": {},
-            "meta": {
+        graph = WorkflowGraph(
+            f"Workflow_{persona_name}_Complete",
+            active=True,
+            settings={},
+            staticData={},
+            meta={
                 "instanceId": str(uuid.uuid4()),
                 "generated_by": "Virtual Company Generator Script 5",
                 "generated_at": datetime.now().isoformat(),
                 "persona": persona_name,
                 "version": "2.0.0"
             }
-        }
+        )
         
         # Criar nó coordenador principal
-        coordenador_node = self.create_coordenador_node(persona_name)
-        workflow["nodes"].append(coordenador_node)
+        coordenador_id = graph.add_node(self.create_coordenador_node(persona_name))
         
         # Processar cada categoria temporal
-        previous_nodes = [coordenador_node["id"]]
-        
         for categoria, fluxos_categoria in fluxos.items():
             if not fluxos_categoria:
                 continue
             
-            # Criar nó de categoria temporal
-            categoria_node = self.create_categoria_node(categoria, len(fluxos_categoria))
-            workflow["nodes"].append(categoria_node)
-            
-            # Conectar ao coordenador
-            self.add_connection(workflow, coordenador_node["id"], categoria_node["id"])
+            # Criar nó de categoria temporal conectado ao coordenador
+            categoria_id = graph.add_node(self.create_categoria_node(categoria, len(fluxos_categoria)))
+            graph.connect(coordenador_id, categoria_id)
             
             # Processar fluxos da categoria
-            categoria_previous = [categoria_node["id"]]
-            
             for fluxo in fluxos_categoria:
-                fluxo_nodes = self.create_fluxo_workflow(fluxo, categoria)
-                workflow["nodes"].extend(fluxo_nodes)
+                fluxo_ids = graph.add_nodes(self.create_fluxo_workflow(fluxo, categoria))
                 
-                # Conectar primeiro nó do fluxo à categoria
-                if fluxo_nodes:
-                    self.add_connection(workflow, categoria_node["id"], fluxo_nodes[0]["id"])
-                    
-                    # Conectar nós do fluxo entre si
-                    for i in range(len(fluxo_nodes) - 1):
-                        self.add_connection(workflow, fluxo_nodes[i]["id"], fluxo_nodes[i + 1]["id"])
-        
-        return workflow
+                # Conectar primeiro nó do fluxo à categoria e os nós do fluxo entre si
+                if fluxo_ids:
+                    graph.connect(categoria_id, fluxo_ids[0])
+                    graph.chain(fluxo_ids)
+        
+        return graph
     
     def create_coordenador_node(self, persona_name):
         """Cria nó coordenador principal"""
@@ -472,34 +471,18 @@ for (const item of items) {{
 return results.map(result => ({{ json: result }}));
 """
     
-    def add_connection(self, workflow, source_id, target_id, output_index=0, input_index=0):
-        """Adiciona conexão entre nós"""
-        if source_id not in workflow["connections"]:
-            workflow["connections"][source_id] = {}
-        
-        if f"main" not in workflow["connections"][source_id]:
-            workflow["connections"][source_id]["main"] = []
-        
-        # Garantir que há listas suficientes para o output_index
-        while len(workflow["connections"][source_id]["main"]) <= output_index:
-            workflow["connections"][source_id]["main"].append([])
-        
-        workflow["connections"][source_id]["main"][output_index].append({
-            "node": target_id,
-            "type": "main",
-            "index": input_index
-        })
-    
     def get_next_node_id(self):
         """Gera próximo ID de nó"""
         self.node_counter += 1
         return f"node_{self.node_counter}"
     
     def validate_workflow_consistency(self, workflow, persona_data):
-        """Valida consistência entre workflow e dados originais"""
+        """Valida consistência entre workflow e dados originais (aceita o grafo ou o JSON do N8N)"""
+        graph = workflow if isinstance(workflow, WorkflowGraph) else WorkflowGraph.from_n8n(workflow)
+        
         validation_report = {
             "persona": persona_data["persona_name"],
-            "workflow_name": workflow["name"],
+            "workflow_name": graph.name,
             "validations": [],
             "errors": [],
             "warnings": []
@@ -530,21 +513,47 @@ return results.map(result => ({{ json: result }}));
             validation_report["validations"].append("Tech specs AI config encontrada")
         
         # Validar estrutura do workflow
-        if len(workflow["nodes"]) == 0:
+        if len(graph.nodes) == 0:
             validation_report["errors"].append("Workflow sem nós")
         
-        if not workflow["connections"]:
+        if not graph.edge_count:
             validation_report["warnings"].append("Workflow sem conexões")
         
+        # Validação estrutural do grafo (linear em nós + conexões)
+        structure = graph.validate()
+        if structure["dangling"]:
+            validation_report["errors"].append(
+                f"Conexões para nós inexistentes: {len(structure['dangling'])}"
+            )
+        if structure["cycles"]:
+            validation_report["errors"].append(
+                f"Ciclo entre nós: {', '.join(structure['cycles'])}"
+            )
+        if structure["orphans"]:
+            validation_report["warnings"].append(
+                f"Nós sem conexões: {', '.join(structure['orphans'])}"
+            )
+        if structure["unreachable"]:
+            validation_report["warnings"].append(
+                f"Nós inalcançáveis a partir da entrada: {', '.join(structure['unreachable'])}"
+            )
+        if len(structure["entry_nodes"]) > 1:
+            validation_report["warnings"].append(
+                f"Mais de um nó de entrada: {', '.join(structure['entry_nodes'])}"
+            )
+        if graph.nodes and not any(structure[key] for key in ("dangling", "cycles", "orphans", "unreachable")):
+            validation_report["validations"].append("Estrutura do workflow íntegra (sem ciclos, órfãos ou conexões pendentes)")
+        
+        validation_report["structure"] = structure
         validation_report["summary"] = {
-            "total_nodes": len(workflow["nodes"]),
-            "total_connections": len(workflow["connections"]),
+            "total_nodes": len(graph.nodes),
+            "total_connections": graph.edge_count,
             "validation_status": "PASS" if not validation_report["errors"] else "FAIL"
         }
         
         return validation_report
     
-    def save_workflow(self, workflow, persona_path, validation_report):
+    def save_workflow(self, workflow, persona_path, validation_report, persona_dir=None):
         """Salva workflow e relatório de validação"""
         
         # Extrair informações da persona
@@ -553,25 +562,21 @@ return results.map(result => ({{ json: result }}));
         persona_name = parts[1]
         
         # Salvar workflow dentro da pasta da persona
-        persona_dir = self.output_dir / "04_PERSONAS_SCRIPTS_1_2_3" / categoria / persona_name
+        persona_dir = Path(persona_dir) if persona_dir else self.output_dir / "04_PERSONAS_SCRIPTS_1_2_3" / categoria / persona_name
         workflows_dir = persona_dir / "script5_workflows_n8n"
-        workflows_dir.mkdir(exist_ok=True)
         
         # Salvar workflow
         workflow_path = workflows_dir / f"workflow_{persona_name.lower()}.json"
-        with open(workflow_path, 'w', encoding='utf-8') as f:
-            json.dump(workflow, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(workflow_path, workflow)
         
         # Salvar relatório de validação
         validation_path = workflows_dir / f"validation_{persona_name.lower()}.json"
-        with open(validation_path, 'w', encoding='utf-8') as f:
-            json.dump(validation_report, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(validation_path, validation_report)
         
         # Criar README do workflow
         readme_content = self.generate_workflow_readme(workflow, validation_report)
         readme_path = workflows_dir / f"README_{persona_name.lower()}.md"
-        with open(readme_path, 'w', encoding='utf-8') as f:
-            f.write(readme_content)
+        self.writer.write_text(readme_path, readme_content)
         
         return workflow_path, validation_path, readme_path
     
@@ -696,14 +701,14 @@ def main():
         
         if persona_data:
             # Gerar workflow
-            workflow = generator.create_workflow_from_tasktodo(persona_data)
+            graph = generator.build_workflow_graph(persona_data)
             
             # Validar consistência
-            validation_report = generator.validate_workflow_consistency(workflow, persona_data)
+            validation_report = generator.validate_workflow_consistency(graph, persona_data)
             
             # Salvar workflow e relatórios
             workflow_path, validation_path, readme_path = generator.save_workflow(
-                workflow, persona, validation_report
+                graph.to_n8n(), persona, validation_report
             )
             
             workflows_gerados += 1
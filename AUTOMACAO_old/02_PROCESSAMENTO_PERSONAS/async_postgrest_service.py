@@ -0,0 +1,342 @@
+"""
+VCM Async PostgREST Service
+Acesso assíncrono ao Supabase (PostgREST) com cliente HTTP em pool
+API fluente compatível com supabase-py: table().select().eq()... com `await execute()`
+Author: VCM Team
+Date: November 2025
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional, Tuple, Union
+
+import httpx
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Configuração do pool (configurável via .env)
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('VCM_POSTGREST_MAX_CONCURRENCY', '10'))
+DEFAULT_TIMEOUT = float(os.getenv('VCM_POSTGREST_TIMEOUT', '60'))
+DEFAULT_MAX_RETRIES = int(os.getenv('VCM_POSTGREST_MAX_RETRIES', '2'))
+
+# Status que indicam falha transitória do gateway
+RETRY_STATUS = {502, 503, 504}
+
+# Falhas em que a requisição certamente não chegou ao servidor (seguro repetir qualquer método)
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class PostgrestError(Exception):
+    """Erro retornado pelo PostgREST"""
+
+    def __init__(self, status_code: int, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(f"PostgREST {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+        self.details = details or {}
+
+class PostgrestResponse:
+    """Resposta de uma consulta (mesmos atributos usados do supabase-py)"""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class AsyncQueryBuilder:
+    """Construtor de consultas de uma tabela"""
+
+    def __init__(self, client: 'AsyncPostgrestClient', table: str):
+        self.client = client
+        self.table = table
+        self.method = 'GET'
+        self.params: List[Tuple[str, str]] = []
+        self.headers: Dict[str, str] = {}
+        self.body: Any = None
+        # Repetir a requisição não altera o resultado (select, upsert com on_conflict)
+        self.idempotent = True
+
+    # Operações
+
+    def select(self, columns: str = '*', count: Optional[str] = None) -> 'AsyncQueryBuilder':
+        self.method = 'GET'
+        self.params.append(('select', ''.join(columns.split())))
+        if count:
+            self.headers['Prefer'] = f'count={count}'
+        return self
+
+    def insert(self, rows: Union[Dict, List[Dict]], returning: str = 'representation') -> 'AsyncQueryBuilder':
+        self.method = 'POST'
+        self.idempotent = False
+        self.body = rows
+        self.headers['Prefer'] = f'return={returning}'
+        self._add_columns(rows)
+        return self
+
+    def upsert(self, rows: Union[Dict, List[Dict]], on_conflict: Optional[str] = None,
+               ignore_duplicates: bool = False, returning: str = 'representation') -> 'AsyncQueryBuilder':
+        self.insert(rows, returning)
+        resolution = 'ignore-duplicates' if ignore_duplicates else 'merge-duplicates'
+        self.headers['Prefer'] = f'resolution={resolution},return={returning}'
+        if on_conflict:
+            self.params.append(('on_conflict', on_conflict))
+            self.idempotent = True
+        return self
+
+    def update(self, values: Dict[str, Any], returning: str = 'representation') -> 'AsyncQueryBuilder':
+        self.method = 'PATCH'
+        self.idempotent = False
+        self.body = values
+        self.headers['Prefer'] = f'return={returning}'
+        return self
+
+    def delete(self, returning: str = 'representation') -> 'AsyncQueryBuilder':
+        self.method = 'DELETE'
+        self.idempotent = False
+        self.headers['Prefer'] = f'return={returning}'
+        return self
+
+    # Filtros
+
+    def eq(self, column: str, value: Any) -> 'AsyncQueryBuilder':
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column: str, value: Any) -> 'AsyncQueryBuilder':
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column: str, value: Any) -> 'AsyncQueryBuilder':
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column: str, value: Any) -> 'AsyncQueryBuilder':
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column: str, value: Any) -> 'AsyncQueryBuilder':
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column: str, value: Any) -> 'AsyncQueryBuilder':
+        return self._filter(column, 'lte', value)
+
+    def is_(self, column: str, value: Any) -> 'AsyncQueryBuilder':
+        return self._filter(column, 'is', value)
+
+    def in_(self, column: str, values: List[Any]) -> 'AsyncQueryBuilder':
+        quoted = ','.join(_quote_value(value) for value in values)
+        self.params.append((column, f'in.({quoted})'))
+        return self
+
+    # Modificadores
+
+    def order(self, column: str, desc: bool = False) -> 'AsyncQueryBuilder':
+        self.params.append(('order', f"{column}.{'desc' if desc else 'asc'}"))
+        return self
+
+    def limit(self, count: int) -> 'AsyncQueryBuilder':
+        self.params.append(('limit', str(count)))
+        return self
+
+    def range(self, start: int, end: int) -> 'AsyncQueryBuilder':
+        self.params.append(('offset', str(start)))
+        self.params.append(('limit', str(end - start + 1)))
+        return self
+
+    async def execute(self) -> PostgrestResponse:
+        return await self.client.request(self.method, f'/rest/v1/{self.table}',
+                                         self.params, self.headers, self.body,
+                                         idempotent=self.idempotent)
+
+    def _filter(self, column: str, operator: str, value: Any) -> 'AsyncQueryBuilder':
+        self.params.append((column, f'{operator}.{_format_value(value)}'))
+        return self
+
+    def _add_columns(self, rows: Union[Dict, List[Dict]]):
+        """Insert em lote com chaves diferentes por linha precisa do parâmetro columns"""
+        if isinstance(rows, list) and rows:
+            columns = []
+            for row in rows:
+                columns.extend(key for key in row if key not in columns)
+            self.params.append(('columns', ','.join(columns)))
+
+class AsyncRPCBuilder:
+    """Chamada de função SQL (rpc)"""
+
+    def __init__(self, client: 'AsyncPostgrestClient', function: str, params: Dict[str, Any]):
+        self.client = client
+        self.function = function
+        self.body = params
+
+    async def execute(self) -> PostgrestResponse:
+        return await self.client.request('POST', f'/rest/v1/rpc/{self.function}', [], {}, self.body,
+                                         idempotent=False)
+
+class AsyncPostgrestClient:
+    """
+    Cliente PostgREST assíncrono
+    Um httpx.AsyncClient com pool de conexões por event loop e um semáforo
+    limitando as requisições simultâneas
+    """
+
+    def __init__(self, url: str, key: str,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.url = url.rstrip('/')
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {'requests': 0, 'retries': 0, 'errors': 0}
+        self.last_used = time.time()
+
+    def table(self, name: str) -> AsyncQueryBuilder:
+        return AsyncQueryBuilder(self, name)
+
+    def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> AsyncRPCBuilder:
+        return AsyncRPCBuilder(self, function, params or {})
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Cliente do event loop atual (recriado se o loop mudou)"""
+        loop = asyncio.get_running_loop()
+
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            if self._client is not None:
+                self._discard_client(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                headers={
+                    'apikey': self.key,
+                    'Authorization': f'Bearer {self.key}',
+                    'Content-Type': 'application/json'
+                },
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+                timeout=self.timeout,
+                transport=self.transport
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+        return self._client
+
+    def _discard_client(self, client: httpx.AsyncClient, client_loop: asyncio.AbstractEventLoop):
+        """
+        Encerra o cliente criado em outro event loop antes de substituí-lo
+        Loop antigo ainda ativo: aclose() é agendado nele; loop encerrado: aclose() não pode
+        mais rodar, então as conexões do pool são derrubadas (shutdown) e o cliente descartado
+        """
+        if client.is_closed:
+            return
+
+        if client_loop is not None and client_loop.is_running() and not client_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)
+        else:
+            _shutdown_connections(client)
+        logger.info(f"Cliente PostgREST de {self.url} encerrado (event loop alterado)")
+
+    async def request(self, method: str, path: str, params: List[Tuple[str, str]],
+                      headers: Dict[str, str], body: Any = None,
+                      idempotent: Optional[bool] = None) -> PostgrestResponse:
+        """
+        Executa a requisição com limite de concorrência e retry de falhas transitórias
+        Requisições não idempotentes (insert, rpc, ...) só são repetidas quando não chegaram
+        ao servidor: um timeout depois do commit gravaria as linhas duas vezes
+        """
+        if idempotent is None:
+            idempotent = method in ('GET', 'HEAD')
+        client = self._get_client()
+        content = json.dumps(body, default=str) if body is not None else None
+        self.last_used = time.time()
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                self.stats['requests'] += 1
+                try:
+                    response = await client.request(method, path, params=params,
+                                                    headers=headers, content=content)
+                except httpx.TransportError as e:
+                    if attempt < self.max_retries and (idempotent or isinstance(e, NOT_SENT_ERRORS)):
+                        self.stats['retries'] += 1
+                        await asyncio.sleep(0.5 * (attempt + 1))
+                        continue
+                    self.stats['errors'] += 1
+                    raise PostgrestError(0, f"Falha de conexão: {e}")
+
+                if response.status_code in RETRY_STATUS and idempotent and attempt < self.max_retries:
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(0.5 * (attempt + 1))
+                    continue
+
+                return self._parse_response(response)
+
+    def _parse_response(self, response: httpx.Response) -> PostgrestResponse:
+        if response.status_code >= 400:
+            self.stats['errors'] += 1
+            try:
+                details = response.json()
+            except ValueError:
+                details = {'message': response.text}
+            message = details.get('message', response.text) if isinstance(details, dict) else response.text
+            raise PostgrestError(response.status_code, message, details if isinstance(details, dict) else None)
+
+        data = response.json() if response.content else []
+
+        count = None
+        content_range = response.headers.get('content-range')
+        if content_range and '/' in content_range:
+            total = content_range.split('/')[-1]
+            count = int(total) if total.isdigit() else None
+
+        return PostgrestResponse(data, count)
+
+    async def ping(self) -> float:
+        """Latência (s) de um HEAD na raiz da API (verificação de saúde, não conta como uso)"""
+        client = self._get_client()
+        started_at = time.time()
+        try:
+            response = await client.head('/rest/v1/')
+        except httpx.TransportError as e:
+            raise PostgrestError(0, f"Falha de conexão: {e}")
+        if response.status_code >= 500:
+            raise PostgrestError(response.status_code, response.text)
+        return time.time() - started_at
+
+    async def aclose(self):
+        """Fecha o pool de conexões"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+def _shutdown_connections(client: httpx.AsyncClient):
+    """Derruba os sockets do pool de um cliente cujo event loop já foi encerrado"""
+    pool = getattr(getattr(client, '_transport', None), '_pool', None)
+    for connection in list(getattr(pool, 'connections', None) or []):
+        stream = getattr(getattr(connection, '_connection', None), '_network_stream', None)
+        try:
+            sock = stream.get_extra_info('socket') if stream is not None else None
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+        except Exception as e:
+            logger.debug(f"Conexão do loop encerrado já fechada: {e}")
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _quote_value(value: Any) -> str:
+    """Valor de lista in.(...) entre aspas (ids/textos com vírgula ou parênteses)"""
+    text = _format_value(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+def create_async_client(url: str, key: str, **kwargs) -> AsyncPostgrestClient:
+    """Cria cliente assíncrono (equivalente a supabase.create_client)"""
+    return AsyncPostgrestClient(url, key, **kwargs)
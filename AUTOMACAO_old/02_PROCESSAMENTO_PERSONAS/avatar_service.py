@@ -18,6 +18,8 @@ from enum import Enum
 import time
 import hashlib
 
+from http_session_service import get_http_session
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
@@ -88,7 +90,7 @@ class NanoBananaClient:
         
     def setup_client(self):
         """Setup do cliente"""
-        self.session = None
+        # Sessão HTTP compartilhada vem do http_session_service (pool por provider)
         self.cost_tracker = AvatarCostTracker()
         
     async def generate_avatar(self, request: AvatarRequest) -> AvatarResponse:
@@ -169,27 +171,27 @@ class NanoBananaClient:
         
         url = f"{self.base_url}/generate/avatar"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Nano Banana API error {response.status}: {error_text}")
-                
-                result = await response.json()
-                generation_time = int((time.time() - start_time) * 1000)
-                
-                avatar_response = AvatarResponse(
-                    image_url=result.get('image_url'),
-                    image_base64=result.get('image_base64'),
-                    success=True,
-                    cost_usd=result.get('cost', 0.05),  # Default cost
-                    generation_time_ms=generation_time,
-                    error=None
-                )
-                
-                self.cost_tracker.track_generation(avatar_response)
-                
-                return avatar_response
+        session = get_http_session("nano_banana")
+        async with session.post(url, json=payload, headers=headers) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"Nano Banana API error {response.status}: {error_text}")
+            
+            result = await response.json()
+            generation_time = int((time.time() - start_time) * 1000)
+            
+            avatar_response = AvatarResponse(
+                image_url=result.get('image_url'),
+                image_base64=result.get('image_base64'),
+                success=True,
+                cost_usd=result.get('cost', 0.05),  # Default cost
+                generation_time_ms=generation_time,
+                error=None
+            )
+            
+            self.cost_tracker.track_generation(avatar_response)
+            
+            return avatar_response
     
     def _build_nano_banana_prompt(self, request: AvatarRequest) -> str:
         """
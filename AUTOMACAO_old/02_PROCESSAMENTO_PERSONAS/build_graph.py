@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+🧱 BUILD GRAPH
+==============
+
+Grafo de dependências dos artefatos de persona (scripts 1-5).
+
+Cada pasta de persona guarda um manifesto (.build_manifest.json) com, por script,
+o hash do gerador, os hashes das entradas e das saídas do último build.
+Um script só reprocessa a persona quando algo mudou: editar uma biografia
+reconstrói os artefatos dessa persona, e não os da empresa inteira.
+
+Versão: 1.0.0
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+MANIFEST_FILENAME = ".build_manifest.json"
+
+def _bio_files(persona_dir: Path) -> List[Path]:
+    return sorted(persona_dir.glob("*_bio.md"))
+
+def _competencias(persona_dir: Path) -> List[Path]:
+    return [persona_dir / "competencias" / "competencias_core.json"]
+
+def _tech_specs(persona_dir: Path) -> List[Path]:
+    return [persona_dir / "tech_specs" / "ai_config.json",
+            persona_dir / "tech_specs" / "tools_config.json"]
+
+def _fluxos(persona_dir: Path) -> List[Path]:
+    return [persona_dir / "script4_tasktodo" / "fluxos_analysis.json"]
+
+# Script -> (nome no manifesto, entradas, saídas, scripts dos quais depende)
+STAGES: Dict[int, Tuple[str, Callable[[Path], List[Path]], Callable[[Path], List[Path]], Tuple[int, ...]]] = {
+    1: ("competencias",
+        _bio_files,
+        lambda d: [d / "competencias" / "competencias_core.json",
+                   d / "competencias" / "competencias_detalhadas.md"],
+        ()),
+    2: ("tech_specs",
+        lambda d: _bio_files(d) + _competencias(d),
+        lambda d: _tech_specs(d) + [d / "tech_specs" / "tech_specs_completas.md"],
+        (1,)),
+    3: ("rag",
+        lambda d: _bio_files(d) + _competencias(d) + _tech_specs(d),
+        lambda d: [d / "rag" / "knowledge_base.json",
+                   d / "rag" / "context_rules.md",
+                   d / "rag" / "search_config.json"],
+        (1, 2)),
+    4: ("fluxos",
+        lambda d: _competencias(d) + _tech_specs(d),
+        lambda d: [d / "script4_tasktodo" / "tasktodo.md"] + _fluxos(d),
+        (1, 2)),
+    5: ("workflows",
+        lambda d: _fluxos(d) + _competencias(d) + _tech_specs(d),
+        lambda d: [d / "script5_workflows_n8n" / f"{prefix}_{d.name.lower()}.{ext}"
+                   for prefix, ext in (("workflow", "json"), ("validation", "json"), ("README", "md"))],
+        (1, 2, 4)),
+}
+
+# Arquivos auxiliares (na pasta do gerador) que também determinam a saída do script
+STAGE_SOURCES: Dict[int, Tuple[str, ...]] = {
+    1: ("persona_loader.py", "persona_writer.py"),
+    2: ("persona_loader.py", "persona_writer.py"),
+    3: ("persona_loader.py", "persona_writer.py"),
+    4: ("task_classifier.py", "task_rules.json", "persona_writer.py"),
+    5: ("workflow_graph.py", "persona_writer.py"),
+}
+
+def file_digest(path: Path) -> str:
+    """SHA-256 do conteúdo do arquivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BuildGraph:
+    """
+    Verifica se os artefatos de um script estão atualizados e registra novos builds
+    O gerador é identificado pelo hash do seu código-fonte (mudar o script reconstrói tudo)
+    """
+
+    def __init__(self, sources: Dict[int, Path], force: bool = False):
+        self.sources = {stage: Path(path) for stage, path in sources.items()}
+        self.force = force
+        self._fingerprints: Dict[int, str] = {}
+        self._manifests: Dict[str, Dict] = {}
+
+    def fingerprint(self, stage: int) -> str:
+        """Hash do código do gerador e dos seus arquivos auxiliares (calculado uma vez por processo)"""
+        if stage not in self._fingerprints:
+            source = self.sources.get(stage)
+            if source and source.exists():
+                files = [source] + [source.parent / name for name in STAGE_SOURCES.get(stage, ())]
+                digests = [file_digest(path) for path in files if path.exists()]
+                fingerprint = digests[0] if len(digests) == 1 else hashlib.sha256(''.join(digests).encode()).hexdigest()
+                self._fingerprints[stage] = fingerprint[:16]
+            else:
+                self._fingerprints[stage] = "unknown"
+        return self._fingerprints[stage]
+
+    def stale_reason(self, stage: int, persona_dir: Path) -> Optional[str]:
+        """Motivo para reconstruir a persona neste script; None se está atualizada"""
+        if self.force:
+            return "forçado"
+
+        name, inputs_of, outputs_of, _ = STAGES[stage]
+        entry = self._load_manifest(persona_dir).get(name)
+        if not entry:
+            return "sem build registrado"
+
+        if entry.get("generator") != self.fingerprint(stage):
+            return "gerador alterado"
+
+        inputs = self._signatures(persona_dir, inputs_of(persona_dir), entry.get("inputs", {}))
+        if inputs is None or inputs.keys() != entry.get("inputs", {}).keys():
+            return "entradas adicionadas ou removidas"
+        changed = [rel for rel, signature in inputs.items() if signature["sha256"] != entry["inputs"][rel]["sha256"]]
+        if changed:
+            return f"entrada alterada: {', '.join(changed)}"
+
+        outputs = self._signatures(persona_dir, outputs_of(persona_dir), entry.get("outputs", {}))
+        if outputs is None:
+            return "saída ausente"
+        edited = [rel for rel, signature in outputs.items()
+                  if signature["sha256"] != entry.get("outputs", {}).get(rel, {}).get("sha256")]
+        if edited:
+            return f"saída modificada: {', '.join(edited)}"
+
+        return None
+
+    def is_fresh(self, stage: int, persona_dir: Path) -> bool:
+        """True se a persona pode ser pulada neste script"""
+        return self.stale_reason(stage, persona_dir) is None
+
+    def stale_stages(self, persona_dir: Path, stages: List[int]) -> Dict[int, str]:
+        """
+        Scripts a reconstruir para a persona, com o motivo
+        Reconstruir um script também reconstrói os scripts que dependem dele
+        """
+        stale: Dict[int, str] = {}
+        for stage in sorted(stages):
+            upstream = next((dep for dep in STAGES[stage][3] if dep in stale), None)
+            reason = f"script {upstream} reconstruído" if upstream else self.stale_reason(stage, persona_dir)
+            if reason:
+                stale[stage] = reason
+        return stale
+
+    def record(self, stage: int, persona_dir: Path):
+        """Registra o build concluído: hashes atuais das entradas e saídas"""
+        name, inputs_of, outputs_of, _ = STAGES[stage]
+        manifest = self._load_manifest(persona_dir)
+        previous = manifest.get(name, {})
+
+        manifest[name] = {
+            "generator": self.fingerprint(stage),
+            "inputs": self._signatures(persona_dir, inputs_of(persona_dir), previous.get("inputs", {}),
+                                       allow_missing=True),
+            "outputs": self._signatures(persona_dir, outputs_of(persona_dir), {}, allow_missing=True)
+        }
+        self._save_manifest(persona_dir, manifest)
+
+    def _signatures(self, persona_dir: Path, paths: List[Path], known: Dict[str, Dict],
+                    allow_missing: bool = False) -> Optional[Dict[str, Dict]]:
+        """
+        Hash de cada arquivo (relativo à pasta da persona)
+        mtime+tamanho iguais ao manifesto reaproveitam o hash registrado sem reler o arquivo
+        """
+        signatures = {}
+        for path in paths:
+            rel = path.relative_to(persona_dir).as_posix()
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                if allow_missing:
+                    continue
+                return None
+
+            previous = known.get(rel)
+            if previous and previous.get("mtime_ns") == stat.st_mtime_ns and previous.get("size") == stat.st_size:
+                signatures[rel] = previous
+            else:
+                signatures[rel] = {"sha256": file_digest(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        return signatures
+
+    def _load_manifest(self, persona_dir: Path) -> Dict:
+        key = str(persona_dir)
+        if key not in self._manifests:
+            try:
+                with open(Path(persona_dir) / MANIFEST_FILENAME, 'r', encoding='utf-8') as f:
+                    self._manifests[key] = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._manifests[key] = {}
+        return self._manifests[key]
+
+    def _save_manifest(self, persona_dir: Path, manifest: Dict):
+        manifest_path = Path(persona_dir) / MANIFEST_FILENAME
+        temp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, manifest_path)
+
+def plan_cascade(persona_dirs: List[Path], stages: List[int], sources: Dict[int, Path],
+                 force: bool = False) -> Dict[int, List[Dict[str, str]]]:
+    """
+    Dry-run: personas que cada script reconstruiria
+    Uma persona reconstruída em um script também é reconstruída nos scripts que dependem dele
+    """
+    graph = BuildGraph(sources, force=force)
+    plan: Dict[int, List[Dict[str, str]]] = {stage: [] for stage in sorted(stages)}
+
+    for persona_dir in persona_dirs:
+        for stage, reason in graph.stale_stages(persona_dir, stages).items():
+            plan[stage].append({"persona": str(persona_dir), "reason": reason})
+
+    return plan
+
+def print_plan(plan: Dict[int, List[Dict[str, str]]], total_personas: int):
+    """Relatório do dry-run"""
+    print(f"\n{'='*60}")
+    print("🧱 DRY-RUN - ARTEFATOS A RECONSTRUIR")
+    print(f"{'='*60}")
+    for stage, entries in plan.items():
+        print(f"\n📜 Script {stage} ({STAGES[stage][0]}): {len(entries)}/{total_personas} persona(s)")
+        for entry in entries:
+            print(f"   - {entry['persona']} ({entry['reason']})")
@@ -0,0 +1,130 @@
+"""
+VCM HTTP Session Service - Sessões aiohttp compartilhadas por provider
+Mantém uma ClientSession de longa duração (keep-alive + pool de conexões)
+para cada provider externo (Google AI, OpenAI, Nano Banana)
+Author: VCM Team
+Date: November 2024
+"""
+
+import os
+import logging
+import asyncio
+import aiohttp
+from typing import Dict, Optional, Tuple
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Configuração do pool (configurável via .env)
+DEFAULT_POOL_SIZE = int(os.getenv('VCM_HTTP_POOL_SIZE', '100'))
+DEFAULT_POOL_PER_HOST = int(os.getenv('VCM_HTTP_POOL_PER_HOST', '20'))
+DEFAULT_DNS_TTL = int(os.getenv('VCM_HTTP_DNS_TTL', '300'))
+DEFAULT_KEEPALIVE_TIMEOUT = float(os.getenv('VCM_HTTP_KEEPALIVE_TIMEOUT', '60'))
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv('VCM_HTTP_REQUEST_TIMEOUT', '120'))
+
+class HTTPSessionManager:
+    """
+    Gerenciador de sessões HTTP por provider
+    Cada provider recebe uma sessão própria, criada sob demanda e reutilizada
+    entre requisições, evitando um handshake TCP+TLS por persona
+    """
+
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 pool_per_host: int = DEFAULT_POOL_PER_HOST,
+                 dns_ttl: int = DEFAULT_DNS_TTL,
+                 keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self._sessions: Dict[str, Tuple[aiohttp.ClientSession, asyncio.AbstractEventLoop]] = {}
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Cria sessão com connector configurado"""
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def get_session(self, provider: str) -> aiohttp.ClientSession:
+        """
+        Retorna a sessão do provider, criando-a se necessário
+        Sessões fechadas ou criadas em outro event loop são recriadas
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._sessions.get(provider)
+
+        if entry:
+            session, session_loop = entry
+            if not session.closed and session_loop is loop:
+                return session
+            self._discard_session(provider, session, session_loop)
+
+        session = self._create_session()
+        self._sessions[provider] = (session, loop)
+        logger.info(f"Sessão HTTP criada para {provider} (pool={self.pool_size}, por host={self.pool_per_host})")
+        return session
+
+    def _discard_session(self, provider: str, session: aiohttp.ClientSession,
+                         session_loop: asyncio.AbstractEventLoop):
+        """
+        Encerra a sessão criada em outro event loop antes de substituí-la
+        Loop antigo ainda ativo: close() é agendado nele; loop encerrado: o connector
+        é desvinculado e fechado aqui (sem isso a sessão vaza com "Unclosed client session")
+        """
+        if session.closed:
+            return
+
+        if session_loop.is_running() and not session_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+        else:
+            connector = session.connector
+            session.detach()
+            if connector is not None:
+                try:
+                    closing = connector.close()
+                    if asyncio.iscoroutine(closing):  # close() assíncrono: não há loop para aguardá-lo
+                        closing.close()
+                except Exception as e:
+                    logger.debug(f"Connector de {provider} já encerrado com o loop antigo: {e}")
+        logger.info(f"Sessão HTTP de {provider} encerrada (event loop alterado)")
+
+    async def close(self, provider: Optional[str] = None):
+        """Fecha a sessão de um provider ou todas as sessões"""
+        providers = [provider] if provider else list(self._sessions.keys())
+
+        for name in providers:
+            entry = self._sessions.pop(name, None)
+            if not entry:
+                continue
+            session, _ = entry
+            if not session.closed:
+                await session.close()
+            logger.info(f"Sessão HTTP encerrada para {name}")
+
+    def get_stats(self) -> Dict[str, Dict[str, bool]]:
+        """Estado das sessões ativas"""
+        return {
+            name: {'closed': session.closed}
+            for name, (session, _) in self._sessions.items()
+        }
+
+# Instância global compartilhada entre os serviços
+http_sessions = HTTPSessionManager()
+
+# Funções de conveniência
+def get_http_session(provider: str) -> aiohttp.ClientSession:
+    """Sessão compartilhada do provider"""
+    return http_sessions.get_session(provider)
+
+async def close_http_sessions():
+    """Fecha todas as sessões (usar no shutdown da aplicação)"""
+    await http_sessions.close()
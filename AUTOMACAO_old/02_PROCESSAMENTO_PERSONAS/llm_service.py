@@ -16,6 +16,11 @@ from dataclasses import dataclass
 from enum import Enum
 import time
 import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from http_session_service import get_http_session
 
 # Setup logging
 logging.basicConfig(
@@ -50,6 +55,7 @@ class LLMResponse:
     quality_score: float
     success: bool
     error: Optional[str] = None
+    cached: bool = False
 
 @dataclass
 class PromptTemplate:
@@ -59,6 +65,7 @@ class PromptTemplate:
     max_tokens: int
     temperature: float
     content_type: ContentType
+    version: str = "1.0"  # Incrementar ao alterar o template (invalida o cache)
 
 class LLMService:
     """
@@ -72,6 +79,10 @@ class LLMService:
         self.setup_providers()
         self.load_prompt_templates()
         self.cost_tracker = CostTracker()
+        self.response_cache = ResponseCache(
+            db_path=Path(os.getenv('VCM_LLM_CACHE_PATH', str(self.base_path / '.cache' / 'llm_cache.sqlite'))),
+            enabled=os.getenv('VCM_LLM_CACHE_DISABLED', 'false').lower() != 'true'
+        )
         
     def load_environment(self):
         """Carrega variáveis de ambiente"""
@@ -181,9 +192,11 @@ class LLMService:
     async def generate(self, 
                       content_type: ContentType, 
                       context: Dict[str, Any],
-                      preferred_provider: Optional[LLMProvider] = None) -> LLMResponse:
+                      preferred_provider: Optional[LLMProvider] = None,
+                      use_cache: bool = True) -> LLMResponse:
         """
         Gera conteúdo usando LLM com fallback automático
+        Respostas aprovadas são reaproveitadas do cache (use_cache=False ignora o cache)
         """
         if content_type not in self.templates:
             raise ValueError(f"Template não encontrado para {content_type}")
@@ -195,6 +208,17 @@ class LLMService:
         providers_to_try = [preferred_provider] if preferred_provider else self.fallback_order
         providers_to_try = [p for p in providers_to_try if p and self.providers.get(p)]
         
+        # Consulta o cache antes de qualquer chamada de rede
+        cache_keys = {p: self._cache_key(p, template, prompt) for p in providers_to_try}
+        if use_cache:
+            for provider in providers_to_try:
+                cached_response = self.response_cache.get(cache_keys[provider])
+                if cached_response:
+                    logger.info(f"Cache hit para {template.name} ({provider.value})")
+                    return cached_response
+        else:
+            self.response_cache.stats['bypassed'] += 1
+        
         last_error = None
         
         for provider in providers_to_try:
@@ -209,6 +233,8 @@ class LLMService:
                 if quality_score >= 0.7:  # Threshold mínimo de qualidade
                     logger.info(f"Sucesso com {provider.value} - Qualidade: {quality_score:.2f}")
                     self.cost_tracker.track_usage(response)
+                    if use_cache:
+                        self.response_cache.put(cache_keys[provider], response)
                     return response
                 else:
                     logger.warning(f"Qualidade baixa com {provider.value}: {quality_score:.2f}")
@@ -237,6 +263,21 @@ class LLMService:
             error=None
         )
         
+    def _cache_key(self, provider: LLMProvider, template: PromptTemplate, prompt: str) -> str:
+        """Chave content-addressed: hash do prompt montado + modelo + parâmetros + versão do template"""
+        client = self.providers[provider]
+        key_data = json.dumps({
+            'template': template.name,
+            'version': template.version,
+            'system_prompt': template.system_prompt,
+            'prompt': prompt,
+            'provider': provider.value,
+            'model': getattr(client, 'default_model', None),
+            'temperature': template.temperature,
+            'max_tokens': template.max_tokens
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+        
     def _build_prompt(self, template: PromptTemplate, context: Dict[str, Any]) -> str:
         """Constrói prompt a partir do template e contexto"""
         try:
@@ -440,29 +481,29 @@ class GoogleAIClient:
                 'cost_usd': 0.008  # Gemini 2.5 Flash é ainda mais barato
             }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Google AI error {response.status}: {error_text}")
-                    
-                result = await response.json()
-                
-                # Extrai conteúdo da resposta do Google AI
-                content = result['candidates'][0]['content']['parts'][0]['text']
-                
-                # Estima tokens (Google AI não retorna count exato)
-                tokens_used = len(content.split()) * 1.3  # Estimativa aproximada
-                
-                # Calcula custo (Gemini 2.5 Flash é ainda mais barato que 1.5)
-                # Gemini 2.5 Flash: ~$0.05 per 1M input tokens, $0.20 per 1M output tokens
-                cost_usd = (tokens_used / 1000000) * 0.20  # Assume output tokens
-                
-                return {
-                    'content': content,
-                    'tokens_used': int(tokens_used),
-                    'cost_usd': cost_usd
-                }
+        session = get_http_session(LLMProvider.GOOGLE_AI.value)
+        async with session.post(url, json=payload, headers=headers) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"Google AI error {response.status}: {error_text}")
+
+            result = await response.json()
+
+            # Extrai conteúdo da resposta do Google AI
+            content = result['candidates'][0]['content']['parts'][0]['text']
+
+            # Estima tokens (Google AI não retorna count exato)
+            tokens_used = len(content.split()) * 1.3  # Estimativa aproximada
+
+            # Calcula custo (Gemini 2.5 Flash é ainda mais barato que 1.5)
+            # Gemini 2.5 Flash: ~$0.05 per 1M input tokens, $0.20 per 1M output tokens
+            cost_usd = (tokens_used / 1000000) * 0.20  # Assume output tokens
+
+            return {
+                'content': content,
+                'tokens_used': int(tokens_used),
+                'cost_usd': cost_usd
+            }
 
 class OpenAIClient:
     """Cliente para OpenAI (fallback)"""
@@ -470,6 +511,7 @@ class OpenAIClient:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.base_url = "https://api.openai.com/v1"
+        self.default_model = "gpt-4o-mini"  # Modelo mais barato
         
     async def generate(self, system_prompt: str, user_prompt: str,
                       max_tokens: int = 2000, temperature: float = 0.7) -> Dict[str, Any]:
@@ -481,7 +523,7 @@ class OpenAIClient:
         }
         
         payload = {
-            "model": "gpt-4o-mini",  # Modelo mais barato
+            "model": self.default_model,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
@@ -492,27 +534,27 @@ class OpenAIClient:
         
         url = f"{self.base_url}/chat/completions"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"OpenAI error {response.status}: {error_text}")
-                    
-                result = await response.json()
-                
-                content = result['choices'][0]['message']['content']
-                tokens_used = result['usage']['total_tokens']
-                
-                # GPT-4o-mini pricing: $0.15 per 1M input, $0.60 per 1M output
-                input_tokens = result['usage']['prompt_tokens']
-                output_tokens = result['usage']['completion_tokens']
-                cost_usd = (input_tokens / 1000000) * 0.15 + (output_tokens / 1000000) * 0.60
-                
-                return {
-                    'content': content,
-                    'tokens_used': tokens_used,
-                    'cost_usd': cost_usd
-                }
+        session = get_http_session(LLMProvider.OPENAI.value)
+        async with session.post(url, json=payload, headers=headers) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"OpenAI error {response.status}: {error_text}")
+
+            result = await response.json()
+
+            content = result['choices'][0]['message']['content']
+            tokens_used = result['usage']['total_tokens']
+
+            # GPT-4o-mini pricing: $0.15 per 1M input, $0.60 per 1M output
+            input_tokens = result['usage']['prompt_tokens']
+            output_tokens = result['usage']['completion_tokens']
+            cost_usd = (input_tokens / 1000000) * 0.15 + (output_tokens / 1000000) * 0.60
+
+            return {
+                'content': content,
+                'tokens_used': tokens_used,
+                'cost_usd': cost_usd
+            }
 
 class CostTracker:
     """Rastreamento de custos e uso"""
@@ -550,6 +592,191 @@ class CostTracker:
             
         return self.daily_costs.get(date, {'cost': 0.0, 'tokens': 0, 'requests': 0})
 
+class ResponseCache:
+    """
+    Cache content-addressed de respostas LLM
+    Dois níveis: LRU em memória + SQLite em disco, com TTL e limite de tamanho
+    """
+    
+    def __init__(self, db_path: Path, enabled: bool = True,
+                 memory_items: int = int(os.getenv('VCM_LLM_CACHE_MEMORY_ITEMS', '256')),
+                 ttl_seconds: int = int(os.getenv('VCM_LLM_CACHE_TTL', str(30 * 24 * 3600))),
+                 max_disk_bytes: int = int(os.getenv('VCM_LLM_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))):
+        self.enabled = enabled
+        self.memory_items = memory_items
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'bypassed': 0,
+            'disk_errors': 0
+        }
+        self._lock = threading.Lock()
+        self.db = None
+        
+        if self.enabled:
+            self._setup_disk_tier(db_path)
+    
+    def _setup_disk_tier(self, db_path: Path):
+        """Abre (ou cria) o banco SQLite do cache em disco"""
+        try:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+            self.db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache em disco indisponível ({db_path}): {e} - usando apenas memória")
+            self.db = None
+    
+    def get(self, key: str) -> Optional[LLMResponse]:
+        """Busca resposta no cache (memória primeiro, depois disco)"""
+        if not self.enabled:
+            return None
+        
+        now = time.time()
+        
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry and now - entry[1] <= self.ttl_seconds:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self._deserialize(entry[0])
+            if entry:
+                del self.memory[key]
+            
+            if self.db:
+                try:
+                    row = self.db.execute(
+                        "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    
+                    if row and now - row[1] <= self.ttl_seconds:
+                        self.db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                        self.db.commit()
+                        self._remember(key, row[0], row[1])
+                        self.stats['disk_hits'] += 1
+                        return self._deserialize(row[0])
+                    if row:
+                        self.db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        self.db.commit()
+                        self.stats['evictions'] += 1
+                except sqlite3.Error as e:
+                    # Ex.: "database is locked" com outro processo usando o arquivo: tratado como miss
+                    self._disk_error('leitura', e)
+            
+            self.stats['misses'] += 1
+            return None
+    
+    def put(self, key: str, response: LLMResponse):
+        """Armazena resposta aprovada nos dois níveis"""
+        if not self.enabled:
+            return
+        
+        now = time.time()
+        payload = json.dumps({
+            'content': response.content,
+            'provider': response.provider.value,
+            'tokens_used': response.tokens_used,
+            'quality_score': response.quality_score
+        }, ensure_ascii=False)
+        
+        with self._lock:
+            self._remember(key, payload, now)
+            
+            if self.db:
+                try:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, response, size, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, payload, len(payload.encode('utf-8')), now, now)
+                    )
+                    self._evict_disk(now)
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    # A resposta já foi paga e aprovada: fica só no nível em memória
+                    self._disk_error('escrita', e)
+            
+            self.stats['writes'] += 1
+    
+    def _disk_error(self, operation: str, error: sqlite3.Error):
+        """Erro do SQLite não interrompe a geração: desfaz a transação e segue sem o disco"""
+        self.stats['disk_errors'] += 1
+        logger.warning(f"Cache em disco: erro de {operation} ({error}) - ignorado")
+        try:
+            self.db.rollback()
+        except sqlite3.Error:
+            pass
+    
+    def _remember(self, key: str, payload: str, created_at: float):
+        """Insere no LRU em memória, descartando o item menos usado"""
+        self.memory[key] = (payload, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+    
+    def _evict_disk(self, now: float):
+        """Remove entradas expiradas e, se preciso, as menos acessadas até caber no limite"""
+        expired = self.db.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.stats['evictions'] += max(expired, 0)
+        
+        total_size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total_size <= self.max_disk_bytes:
+            return
+        
+        for key, size in self.db.execute(
+            "SELECT key, size FROM llm_cache ORDER BY last_access ASC"
+        ).fetchall():
+            if total_size <= self.max_disk_bytes:
+                break
+            self.db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self.memory.pop(key, None)
+            total_size -= size
+            self.stats['evictions'] += 1
+    
+    def _deserialize(self, payload: str) -> LLMResponse:
+        """Reconstrói LLMResponse a partir do cache (sem custo nem latência)"""
+        data = json.loads(payload)
+        return LLMResponse(
+            content=data['content'],
+            provider=LLMProvider(data['provider']),
+            tokens_used=data['tokens_used'],
+            cost_usd=0.0,
+            latency_ms=0,
+            quality_score=data['quality_score'],
+            success=True,
+            cached=True
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores de hit/miss do cache"""
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+        
+        return {
+            'enabled': self.enabled,
+            **self.stats,
+            'hits': hits,
+            'hit_rate': (hits / lookups) if lookups else 0.0,
+            'memory_entries': len(self.memory)
+        }
+
 # Instância global do serviço
 llm_service = LLMService()
 
@@ -566,6 +793,10 @@ def get_cost_summary() -> Dict[str, Any]:
     """Resumo de custos"""
     return llm_service.cost_tracker.get_daily_summary()
 
+def get_cache_stats() -> Dict[str, Any]:
+    """Estatísticas do cache de respostas"""
+    return llm_service.response_cache.get_stats()
+
 # Teste do serviço
 if __name__ == "__main__":
     async def test_service():
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+🧬 PERSONA LOADER
+=================
+
+Leitura compartilhada dos dados de persona pelos scripts 1-3.
+
+- Biografia analisada em uma única passada (padrões pré-compilados)
+- Biografia e JSONs (competências, tech specs) em cache por mtime+tamanho
+- Cache em memória (LRU por pasta) e em arquivo auxiliar JSON por persona (.persona_cache.json)
+
+Cada biografia é analisada uma vez por cascata, e não uma vez por script.
+Os valores em cache são compartilhados: quem os recebe não deve modificá-los.
+
+Versão: 1.0.0
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+import os
+import re
+import json
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+# Versão do formato analisado: mudar invalida os arquivos de cache existentes
+PARSER_VERSION = 1
+
+# Arquivo auxiliar em JSON (valores vêm de parse_bio/json.loads; assinatura gravada como lista)
+CACHE_FILENAME = ".persona_cache.json"
+CACHE_MAX_PERSONAS = int(os.getenv('VCM_PERSONA_CACHE_MAX', '2048'))
+CACHE_PERSIST = os.getenv('VCM_PERSONA_CACHE_PERSIST', 'true').lower() != 'false'
+
+# Campos "**Rótulo:** valor" da biografia (primeira ocorrência de cada campo vale)
+BIO_FIELD_PATTERN = re.compile(
+    r'\*\*(?:(?:👤\s*)?(?P<nome>Nome)|(?P<label>Nacionalidade|Idade[^:]*|Idiomas|Especialização)):\*\*\s*(?P<value>.+)'
+)
+FORMACAO_PATTERN = re.compile(r'formação|graduação|mestrado|doutorado|curso|certificação', re.IGNORECASE)
+IDIOMAS_SPLIT_PATTERN = re.compile(r'[,e]')
+
+BIO_FIELDS = {
+    "Nome": "nome",
+    "Nacionalidade": "nacionalidade",
+    "Idiomas": "idiomas",
+    "Especialização": "especializacao"
+}
+
+def parse_bio(bio_content: str) -> Dict[str, Any]:
+    """
+    Analisa a biografia em uma passada
+    Campos ausentes ficam None (cada script decide o valor padrão)
+    """
+    record = {
+        "nome": None,
+        "nacionalidade": None,
+        "idade": None,
+        "idiomas": None,
+        "especializacao": None,
+        "formacao": bool(FORMACAO_PATTERN.search(bio_content)),
+        "bio_completa": bio_content
+    }
+
+    for match in BIO_FIELD_PATTERN.finditer(bio_content):
+        label = match.group("nome") or match.group("label")
+        field = "idade" if label.startswith("Idade") else BIO_FIELDS[label]
+        if record[field] is None:
+            record[field] = match.group("value").strip()
+
+    return record
+
+def full_bio_info(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Formato do script 1: todos os campos, idiomas como lista e texto completo"""
+    idiomas_text = record["idiomas"]
+    return {
+        "nome": record["nome"] or "",
+        "nacionalidade": record["nacionalidade"] or "",
+        "idade": record["idade"] or "",
+        "formacao": "Identificada na biografia" if record["formacao"] else "",
+        "experiencia": "",
+        "especializacao": record["especializacao"] or "",
+        "idiomas": [lang.strip() for lang in IDIOMAS_SPLIT_PATTERN.split(idiomas_text) if lang.strip()]
+                   if idiomas_text is not None else [],
+        "habilidades_mencionadas": [],
+        "bio_completa": record["bio_completa"]
+    }
+
+def summary_bio_info(record: Dict[str, Any], fields: Iterable[str]) -> Dict[str, str]:
+    """Formato dos scripts 2-3: só os campos encontrados, idiomas como texto"""
+    return {field: record[field] for field in fields if record.get(field) is not None}
+
+class PersonaLoader:
+    """
+    Cache de arquivos de persona por mtime+tamanho
+    Entradas ficam em memória e são gravadas no arquivo auxiliar da persona em flush()
+    """
+
+    def __init__(self, max_personas: int = CACHE_MAX_PERSONAS, persist: bool = CACHE_PERSIST):
+        self.max_personas = max_personas
+        self.persist = persist
+        self._personas: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Scripts em threads do mesmo processo (modo fused) compartilham o loader
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'sidecar_loads': 0, 'sidecar_writes': 0}
+
+    def load_bio(self, bio_file: Path) -> Dict[str, Any]:
+        """Biografia analisada (parse_bio) da persona"""
+        return self._load(Path(bio_file), lambda path: parse_bio(path.read_text(encoding='utf-8')))
+
+    def load_json(self, json_file: Path) -> Optional[Dict[str, Any]]:
+        """JSON de saída de um script (None se o arquivo não existe)"""
+        json_file = Path(json_file)
+        if not json_file.exists():
+            return None
+        return self._load(json_file, lambda path: json.loads(path.read_text(encoding='utf-8')))
+
+    def _load(self, path: Path, parse):
+        persona_dir, name = self._persona_key(path)
+        stat = path.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+
+        with self._lock:
+            entry = self._get_entry(persona_dir)
+            cached = entry["files"].get(name)
+            if cached and cached[0] == signature:
+                self.stats['hits'] += 1
+                return cached[1]
+
+        value = parse(path)
+
+        with self._lock:
+            self.stats['misses'] += 1
+            entry = self._get_entry(persona_dir)
+            entry["files"][name] = [signature, value]
+            entry["dirty"] = True
+        return value
+
+    @staticmethod
+    def _persona_key(path: Path):
+        """Pasta da persona e nome relativo (bio na raiz, JSONs em competencias/ e tech_specs/)"""
+        if path.name.endswith("_bio.md"):
+            return str(path.parent), path.name
+        return str(path.parent.parent), f"{path.parent.name}/{path.name}"
+
+    def _get_entry(self, persona_dir: str) -> Dict[str, Any]:
+        entry = self._personas.get(persona_dir)
+        if entry is not None:
+            self._personas.move_to_end(persona_dir)
+            return entry
+
+        entry = {"files": self._read_sidecar(persona_dir), "dirty": False}
+        self._personas[persona_dir] = entry
+
+        while len(self._personas) > self.max_personas:
+            evicted_dir, evicted = self._personas.popitem(last=False)
+            if evicted["dirty"]:
+                self._write_sidecar(evicted_dir, evicted)
+
+        return entry
+
+    def _read_sidecar(self, persona_dir: str) -> Dict[str, Any]:
+        if not self.persist:
+            return {}
+
+        sidecar = Path(persona_dir) / CACHE_FILENAME
+        try:
+            with open(sidecar, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            # Cache corrompido: reconstruído no próximo flush
+            return {}
+
+        if not isinstance(data, dict) or data.get("version") != PARSER_VERSION \
+                or not isinstance(data.get("files"), dict):
+            return {}
+
+        self.stats['sidecar_loads'] += 1
+        return {name: cached for name, cached in data["files"].items()
+                if isinstance(cached, list) and len(cached) == 2}
+
+    def _write_sidecar(self, persona_dir: str, entry: Dict[str, Any]):
+        entry["dirty"] = False
+        if not self.persist or not Path(persona_dir).exists():
+            return
+
+        sidecar = Path(persona_dir) / CACHE_FILENAME
+        temp_path = sidecar.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": PARSER_VERSION, "files": entry["files"]}, f, ensure_ascii=False)
+            os.replace(temp_path, sidecar)
+            self.stats['sidecar_writes'] += 1
+        except OSError:
+            temp_path.unlink(missing_ok=True)
+
+    def flush(self):
+        """Grava os arquivos auxiliares das personas alteradas"""
+        with self._lock:
+            for persona_dir, entry in self._personas.items():
+                if entry["dirty"]:
+                    self._write_sidecar(persona_dir, entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Acertos/faltas do cache"""
+        return {**self.stats, 'personas_in_memory': len(self._personas)}
+
+# Instância global (compartilhada pelos scripts carregados no mesmo processo)
+_persona_loader: Optional[PersonaLoader] = None
+
+def get_persona_loader() -> PersonaLoader:
+    """Loader compartilhado do processo"""
+    global _persona_loader
+    if _persona_loader is None:
+        _persona_loader = PersonaLoader()
+    return _persona_loader
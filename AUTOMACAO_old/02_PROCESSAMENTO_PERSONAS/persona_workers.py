@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+👥 PERSONA WORKERS
+==================
+
+Processamento paralelo das pastas de persona pelos scripts 1-3 (--workers N).
+
+As pastas são divididas em lotes entre um pool de processos; cada worker cria
+seu próprio gerador e devolve resultados, saída e dados gerados para agregação.
+
+Versão: 1.0.0
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+import io
+import os
+from pathlib import Path
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+# Lotes por worker: lotes menores equilibram melhor personas de custo diferente
+SHARDS_PER_WORKER = 4
+
+def list_persona_folders(personas_path: Path) -> List[Path]:
+    """Pastas 04_PERSONAS_COMPLETAS/<role>/<persona> na ordem de varredura dos scripts"""
+    folders = []
+    for role_folder in personas_path.iterdir():
+        if role_folder.is_dir():
+            for persona_folder in role_folder.iterdir():
+                if persona_folder.is_dir():
+                    folders.append(persona_folder)
+    return folders
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """Número de workers: argumento, VCM_GENERATOR_WORKERS ou 1 (serial); 0 usa todos os núcleos"""
+    if workers is None:
+        workers = int(os.getenv('VCM_GENERATOR_WORKERS', '1'))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def process_personas_parallel(generator, persona_folders: List[Path], workers: int) -> Dict:
+    """
+    Distribui as personas entre workers e agrega os dicts de resultados
+    O gerador precisa de process_persona(persona_folder, results)
+    """
+    shard_size = max(1, -(-len(persona_folders) // (workers * SHARDS_PER_WORKER)))
+    shards = [persona_folders[i:i + shard_size] for i in range(0, len(persona_folders), shard_size)]
+    preloaded = getattr(generator, 'preloaded', {})
+    build_graph = getattr(generator, 'build_graph', None)
+    force = bool(build_graph and build_graph.force)
+
+    results = {"processed": [], "skipped": [], "failed": [], "total": 0}
+    generated = getattr(generator, 'generated', None)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+        futures = [
+            executor.submit(
+                _process_shard, type(generator), str(generator.base_path),
+                [str(folder) for folder in shard],
+                {str(folder): preloaded[str(folder)] for folder in shard if str(folder) in preloaded},
+                force
+            )
+            for shard in shards
+        ]
+
+        # Ordem dos lotes preservada na saída e nas listas de resultados
+        for future in futures:
+            shard_results, output, shard_generated = future.result()
+            print(output, end='')
+            merge_results(results, shard_results)
+            if generated is not None:
+                generated.update(shard_generated)
+
+    return results
+
+def _process_shard(generator_cls, base_path: str, persona_folders: List[str],
+                   preloaded: Dict[str, Dict], force: bool = False):
+    """Executado no worker: processa um lote com um gerador próprio"""
+    generator = generator_cls(base_path)
+    if preloaded and hasattr(generator, 'preloaded'):
+        generator.preloaded = preloaded
+    if hasattr(generator, 'build_graph'):
+        generator.build_graph.force = force
+
+    results = {"processed": [], "skipped": [], "failed": [], "total": 0}
+    output = io.StringIO()
+    with redirect_stdout(output):
+        for persona_folder in persona_folders:
+            generator.process_persona(Path(persona_folder), results)
+
+    # Cache de personas do worker gravado antes de devolver o lote
+    if hasattr(generator, 'persona_loader'):
+        generator.persona_loader.flush()
+
+    return results, output.getvalue(), getattr(generator, 'generated', {})
+
+def merge_results(total: Dict, partial: Dict):
+    """Soma listas, contadores e dicts de contagem (ex.: especializações do script 3)"""
+    for key, value in partial.items():
+        if isinstance(value, list):
+            total.setdefault(key, []).extend(value)
+        elif isinstance(value, dict):
+            counts = total.setdefault(key, {})
+            for name, count in value.items():
+                counts[name] = counts.get(name, 0) + count
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
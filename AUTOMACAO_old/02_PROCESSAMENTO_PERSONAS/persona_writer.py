@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+💾 PERSONA WRITER
+=================
+
+Gravação dos arquivos gerados pelos scripts 1-5.
+
+- FileWriter: grava na hora (execução normal, script a script)
+- BufferedWriter: guarda os arquivos de uma persona em memória e grava tudo em flush()
+  (modo fused do pipeline_runner: a persona passa pelos 5 scripts e é gravada uma vez no fim)
+
+O conteúdo gravado é idêntico nos dois casos (JSON com indent=2, UTF-8 sem escapes).
+
+Versão: 1.0.0
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+class FileWriter:
+    """Grava os arquivos imediatamente, criando as pastas necessárias"""
+
+    def write_json(self, path: Path, data: Any):
+        """JSON no formato dos scripts (indent=2, ensure_ascii=False)"""
+        self.write_text(path, json.dumps(data, indent=2, ensure_ascii=False))
+
+    def write_text(self, path: Path, content: str):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+class BufferedWriter(FileWriter):
+    """
+    Arquivos de uma persona mantidos em memória até flush()
+    Um arquivo escrito duas vezes é gravado uma só vez (última versão)
+    """
+
+    def __init__(self):
+        self.pending: Dict[Path, str] = {}
+
+    def write_text(self, path: Path, content: str):
+        self.pending[Path(path)] = content
+
+    def flush(self) -> List[Path]:
+        """Grava os arquivos pendentes; devolve os caminhos gravados"""
+        written = []
+        for path, content in self.pending.items():
+            super().write_text(path, content)
+            written.append(path)
+        self.pending = {}
+        return written
+
+    @property
+    def pending_bytes(self) -> int:
+        return sum(len(content.encode('utf-8')) for content in self.pending.values())
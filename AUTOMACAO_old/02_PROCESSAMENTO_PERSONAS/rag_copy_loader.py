@@ -0,0 +1,359 @@
+"""
+VCM RAG COPY Loader
+Carga em massa de rag_documents/rag_chunks via COPY ... FROM STDIN (formato binário)
+Lotes vão para uma tabela de staging temporária e são mesclados na tabela final
+Author: VCM Team
+Date: November 2025
+"""
+
+import os
+import io
+import json
+import time
+import struct
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+
+import psycopg2
+from psycopg2 import sql
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Backend de escrita da ingestão: 'auto' (COPY se houver URL do banco), 'copy' ou 'rest'
+DEFAULT_WRITE_BACKEND = os.getenv('VCM_RAG_WRITE_BACKEND', 'auto')
+
+# Lotes maiores que os do REST: o custo por lote do COPY é baixo
+DEFAULT_COPY_BATCH_SIZE = int(os.getenv('VCM_RAG_COPY_BATCH_SIZE', '5000'))
+
+# Cabeçalho e trailer do formato binário do COPY
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+COPY_TRAILER = struct.pack('!h', -1)
+
+class CopyLoaderUnavailable(Exception):
+    """Banco inacessível para COPY (a ingestão volta para o REST)"""
+
+class PostgresCopyLoader:
+    """
+    Loader COPY para uma conexão direta ao Postgres
+    Colunas vector são enviadas em binário (formato do pgvector); as demais como texto
+    e convertidas para o tipo da coluna no INSERT ... SELECT de merge
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._connection = None
+        self._columns: Dict[str, Dict[str, str]] = {}
+        # psycopg2 não permite uso simultâneo da mesma conexão por várias threads
+        self._lock = threading.Lock()
+        self.stats = {
+            'rows_copied': 0,
+            'batches': 0,
+            'bytes_copied': 0,
+            'copy_seconds': 0.0
+        }
+
+    async def load(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """Copia um lote para a tabela (upsert por id); roda fora do event loop"""
+        return await asyncio.to_thread(self._load_sync, table, rows)
+
+    def _load_sync(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        with self._lock:
+            connection = self._get_connection()
+            started_at = time.time()
+
+            try:
+                table_columns = self._get_table_columns(table)
+                columns = _batch_columns(rows)
+                unknown = [column for column in columns if column not in table_columns]
+                if unknown:
+                    raise ValueError(f"Colunas inexistentes em {table}: {', '.join(unknown)}")
+
+                vector_columns = {column for column, column_type in table_columns.items()
+                                  if _is_vector(column_type)}
+                payload = encode_copy_binary(columns, rows, vector_columns)
+                stage = f'stage_{table}'
+
+                with connection.cursor() as cursor:
+                    cursor.execute(sql.SQL(
+                        "CREATE TEMP TABLE IF NOT EXISTS {stage} ({columns}) ON COMMIT DELETE ROWS"
+                    ).format(
+                        stage=sql.Identifier(stage),
+                        columns=sql.SQL(', ').join(
+                            sql.SQL('{} {}').format(sql.Identifier(column),
+                                                    sql.SQL('vector' if column in vector_columns else 'text'))
+                            # Todas as colunas da tabela: a staging serve a lotes com colunas diferentes
+                            for column in table_columns
+                        )
+                    ))
+                    cursor.copy_expert(sql.SQL(
+                        "COPY {stage} ({columns}) FROM STDIN WITH (FORMAT binary)"
+                    ).format(
+                        stage=sql.Identifier(stage),
+                        columns=sql.SQL(', ').join(map(sql.Identifier, columns))
+                    ).as_string(connection), io.BytesIO(payload))
+                    cursor.execute(_merge_statement(table, stage, columns, table_columns))
+
+                connection.commit()
+
+            except Exception:
+                connection.rollback()
+                raise
+
+            self.stats['rows_copied'] += len(rows)
+            self.stats['batches'] += 1
+            self.stats['bytes_copied'] += len(payload)
+            self.stats['copy_seconds'] += time.time() - started_at
+
+            return len(rows)
+
+    def _get_connection(self):
+        if self._connection is None or self._connection.closed:
+            try:
+                self._connection = psycopg2.connect(self.dsn)
+            except psycopg2.OperationalError as e:
+                raise CopyLoaderUnavailable(f"Conexão direta ao Postgres falhou: {e}")
+        return self._connection
+
+    def _get_table_columns(self, table: str) -> Dict[str, str]:
+        """Colunas da tabela e seus tipos (consultado uma vez por tabela)"""
+        if table not in self._columns:
+            with self._connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+                    "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped "
+                    "ORDER BY attnum",
+                    (table,)
+                )
+                self._columns[table] = dict(cursor.fetchall())
+        return self._columns[table]
+
+    async def get_columns(self, table: str) -> Dict[str, str]:
+        """Colunas da tabela e seus tipos"""
+        return await asyncio.to_thread(self._locked, self._get_table_columns, table)
+
+    async def delete_rows(self, table: str, column: str, values: List[Any]) -> int:
+        """Apaga as linhas da tabela com `column` em `values` (ex.: limpeza de cargas de teste)"""
+        return await asyncio.to_thread(self._locked, self._delete_rows_sync, table, column, values)
+
+    def _locked(self, function, *args):
+        with self._lock:
+            self._get_connection()
+            return function(*args)
+
+    def _delete_rows_sync(self, table: str, column: str, values: List[Any]) -> int:
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute(sql.SQL("DELETE FROM {table} WHERE {column}::text = ANY(%s)").format(
+                    table=sql.Identifier(table),
+                    column=sql.Identifier(column)
+                ), ([str(value) for value in values],))
+                deleted = cursor.rowcount
+            self._connection.commit()
+            return deleted
+        except Exception:
+            self._connection.rollback()
+            raise
+
+    def get_report(self) -> Dict[str, Any]:
+        """Relatório de throughput do COPY"""
+        elapsed = max(self.stats['copy_seconds'], 1e-6)
+        return {
+            **self.stats,
+            'copy_seconds': round(self.stats['copy_seconds'], 3),
+            'rows_per_second': round(self.stats['rows_copied'] / elapsed, 2)
+        }
+
+    async def close(self):
+        """Fecha a conexão (tabelas temporárias de staging são descartadas junto)"""
+        if self._connection is not None and not self._connection.closed:
+            await asyncio.to_thread(self._connection.close)
+        self._connection = None
+
+def encode_copy_binary(columns: List[str], rows: List[Dict[str, Any]],
+                       vector_columns: Optional[set] = None) -> bytes:
+    """Linhas no formato binário do COPY (texto em UTF-8, vetores no formato do pgvector)"""
+    vector_columns = vector_columns or set()
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    field_count = struct.pack('!h', len(columns))
+
+    for row in rows:
+        buffer.write(field_count)
+        for column in columns:
+            value = row.get(column)
+            if value is None:
+                buffer.write(struct.pack('!i', -1))
+                continue
+
+            data = _encode_vector(value) if column in vector_columns else _encode_text(value)
+            buffer.write(struct.pack('!i', len(data)))
+            buffer.write(data)
+
+    buffer.write(COPY_TRAILER)
+    return buffer.getvalue()
+
+def _encode_text(value: Any) -> bytes:
+    if isinstance(value, bool):
+        return b'true' if value else b'false'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+    return str(value).encode('utf-8')
+
+def _encode_vector(value: Any) -> bytes:
+    """vector_recv do pgvector: dimensão (int16), reservado (int16) e float4 big-endian"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return struct.pack(f'!hh{len(value)}f', len(value), 0, *value)
+
+def _is_vector(column_type: str) -> bool:
+    return column_type.startswith('vector')
+
+def _batch_columns(rows: List[Dict[str, Any]]) -> List[str]:
+    """Colunas presentes no lote (linhas podem ter chaves diferentes)"""
+    columns: List[str] = []
+    seen = set()
+    for row in rows:
+        for column in row:
+            if column not in seen:
+                seen.add(column)
+                columns.append(column)
+    return columns
+
+def _merge_statement(table: str, stage: str, columns: List[str],
+                     table_columns: Dict[str, str]) -> sql.Composed:
+    """INSERT ... SELECT da staging com cast para os tipos da tabela, upsert por id"""
+    casts = sql.SQL(', ').join(
+        sql.SQL('{}::{}').format(sql.Identifier(column), sql.SQL(table_columns[column]))
+        for column in columns
+    )
+    statement = sql.SQL("INSERT INTO {table} ({columns}) SELECT {casts} FROM {stage}").format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+        casts=casts,
+        stage=sql.Identifier(stage)
+    )
+
+    updates = [column for column in columns if column != 'id']
+    if 'id' in columns and updates:
+        statement += sql.SQL(" ON CONFLICT (id) DO UPDATE SET {}").format(
+            sql.SQL(', ').join(
+                sql.SQL('{0} = EXCLUDED.{0}').format(sql.Identifier(column)) for column in updates
+            )
+        )
+
+    return statement
+
+def get_database_url() -> Optional[str]:
+    """
+    URL de conexão direta ao Postgres
+    VCM_SUPABASE_DB_URL ou VCM_SUPABASE_DB_PASSWORD com URL completa (como em setup_database.py)
+    """
+    for name in ('VCM_SUPABASE_DB_URL', 'VCM_SUPABASE_DB_PASSWORD'):
+        value = os.getenv(name)
+        if value and value.startswith(('postgresql://', 'postgres://')):
+            return value
+    return None
+
+def create_copy_loader(backend: Optional[str] = None) -> Optional[PostgresCopyLoader]:
+    """
+    Loader COPY conforme VCM_RAG_WRITE_BACKEND
+    None quando o backend é 'rest' ou não há URL do banco (só service key)
+    """
+    backend = (backend or DEFAULT_WRITE_BACKEND).lower()
+    if backend == 'rest':
+        return None
+
+    dsn = get_database_url()
+    if not dsn:
+        if backend == 'copy':
+            logger.warning("VCM_RAG_WRITE_BACKEND=copy sem URL do banco - usando REST")
+        return None
+
+    return PostgresCopyLoader(dsn)
+
+# Benchmark contra um Postgres local (ex.: VCM_SUPABASE_DB_URL=postgresql://localhost/vcm)
+if __name__ == "__main__":
+    import uuid
+    import random
+
+    def make_rows(document_id: str, count: int, dimension: int = 1536) -> List[Dict[str, Any]]:
+        rng = random.Random(42)
+        return [{
+            'id': str(uuid.uuid4()),
+            'document_id': document_id,
+            'chunk_index': i,
+            'content': f'Chunk sintético {i} ' * 20,
+            'metadata': {'chunk_number': i + 1},
+            'embedding': [rng.random() for _ in range(dimension)]
+        } for i in range(count)]
+
+    async def benchmark_document(loader: PostgresCopyLoader, document_id: str,
+                                 columns: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Documento pai dos chunks com as colunas obrigatórias do schema em uso"""
+        document = {'id': document_id, 'title': 'Benchmark COPY', 'document_type': 'benchmark'}
+        optional = {
+            'content': 'benchmark',
+            'content_raw': 'benchmark',
+            'external_id': f'benchmark:{document_id}',
+            'is_active': False
+        }
+        document.update({column: value for column, value in optional.items() if column in columns})
+
+        if 'empresa_id' in columns:
+            empresa_id = os.getenv('VCM_RAG_COPY_BENCHMARK_EMPRESA_ID')
+            if not empresa_id:
+                print("❌ Configure VCM_RAG_COPY_BENCHMARK_EMPRESA_ID (empresa existente) para o benchmark")
+                return None
+            document['empresa_id'] = empresa_id
+
+        if 'collection_id' in columns:
+            # Collection própria do benchmark (FK rag_documents.collection_id)
+            await loader.load('rag_collections', [{
+                'id': document_id,
+                'code': f'benchmark-{document_id}',
+                'name': 'Benchmark COPY',
+                'is_active': False
+            }])
+            document['collection_id'] = document_id
+
+        return document
+
+    async def benchmark():
+        loader = create_copy_loader('copy')
+        if not loader:
+            print("❌ Configure VCM_SUPABASE_DB_URL para o benchmark")
+            return
+
+        document_id = str(uuid.uuid4())
+        columns = await loader.get_columns('rag_documents')
+        try:
+            document = await benchmark_document(loader, document_id, columns)
+            if not document:
+                return
+            await loader.load('rag_documents', [document])
+
+            total = int(os.getenv('VCM_RAG_COPY_BENCHMARK_ROWS', '100000'))
+            rows = make_rows(document_id, DEFAULT_COPY_BATCH_SIZE)
+            copied_before = loader.stats['rows_copied']
+            started_at = time.time()
+            for _ in range(0, total, DEFAULT_COPY_BATCH_SIZE):
+                for row in rows:
+                    row['id'] = str(uuid.uuid4())
+                await loader.load('rag_chunks', rows)
+            elapsed = time.time() - started_at
+
+            copied = loader.stats['rows_copied'] - copied_before
+            print(f"📦 {copied} chunks em {elapsed:.1f}s ({copied / elapsed:.0f} chunks/s)")
+
+        finally:
+            # Remove os dados do benchmark (chunks antes do documento, documento antes da collection)
+            await loader.delete_rows('rag_chunks', 'document_id', [document_id])
+            await loader.delete_rows('rag_documents', 'id', [document_id])
+            if 'collection_id' in columns:
+                await loader.delete_rows('rag_collections', 'id', [document_id])
+            await loader.close()
+
+    asyncio.run(benchmark())
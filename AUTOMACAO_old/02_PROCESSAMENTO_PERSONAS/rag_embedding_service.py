@@ -0,0 +1,178 @@
+"""
+VCM RAG Embedding Service
+Geração de embeddings em lote para rag_chunks
+Backends plugáveis: hashing local (offline, determinístico) e OpenAI
+Author: VCM Team
+Date: November 2025
+"""
+
+import os
+import re
+import math
+import time
+import logging
+import hashlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Dimensão das colunas VECTOR(1536) em rag_documents/rag_chunks
+EMBEDDING_DIMENSION = 1536
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+class EmbeddingBackend:
+    """Interface dos backends de embedding"""
+
+    name = "base"
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION):
+        self.dimension = dimension
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Retorna matriz float32 (len(texts), dimension) com vetores normalizados"""
+        raise NotImplementedError
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Backend local determinístico (feature hashing)
+    Tokens são projetados em `dimension` posições com sinal, peso TF sublinear
+    e normalização L2 - não requer rede, ideal para testes e busca offline
+    """
+
+    name = "hashing"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        """Versão síncrona (usada também para vetorizar consultas)"""
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            counts = Counter(TOKEN_PATTERN.findall(text.lower()))
+            for token, count in counts.items():
+                index, sign = _hash_token(token, self.dimension)
+                matrix[row, index] += sign * (1.0 + math.log(count))
+
+        return _normalize_rows(matrix)
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Backend remoto via API de embeddings da OpenAI"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str = "text-embedding-ada-002",
+                 dimension: int = EMBEDDING_DIMENSION):
+        super().__init__(dimension)
+        self.api_key = api_key
+        self.model = model
+        self.url = "https://api.openai.com/v1/embeddings"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        from http_session_service import get_http_session
+
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.api_key}'
+        }
+        payload = {"model": self.model, "input": texts}
+
+        session = get_http_session("openai_embeddings")
+        async with session.post(self.url, json=payload, headers=headers) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"OpenAI embeddings error {response.status}: {error_text}")
+
+            result = await response.json()
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for item in result['data']:
+            matrix[item['index']] = np.asarray(item['embedding'], dtype=np.float32)
+
+        return _normalize_rows(matrix)
+
+class ChunkEmbedder:
+    """
+    Estágio de embedding do pipeline de ingestão
+    Recebe lotes de linhas de rag_chunks, vetoriza em uma única chamada ao backend
+    e preenche a coluna `embedding` antes da escrita em massa
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_batch_size: int = 512):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.stats = {
+            'chunks_embedded': 0,
+            'batches': 0,
+            'embedding_seconds': 0.0
+        }
+
+    async def embed_rows(self, rows: List[Dict[str, Any]]):
+        """Preenche `embedding` em cada linha (modifica as linhas no lugar)"""
+        for start in range(0, len(rows), self.max_batch_size):
+            batch = rows[start:start + self.max_batch_size]
+            started_at = time.time()
+
+            vectors = await self.backend.embed([row['content'] for row in batch])
+
+            for row, vector in zip(batch, vectors):
+                row['embedding'] = vector.tolist()
+
+            self.stats['chunks_embedded'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['embedding_seconds'] += time.time() - started_at
+
+            logger.info(f"🧮 Embeddings: {self.stats['chunks_embedded']} chunks "
+                        f"({self._chunks_per_second():.1f} chunks/s)")
+
+    def _chunks_per_second(self) -> float:
+        return self.stats['chunks_embedded'] / max(self.stats['embedding_seconds'], 1e-6)
+
+    def get_report(self) -> Dict[str, Any]:
+        """Relatório de throughput do estágio de embedding"""
+        return {
+            'backend': self.backend.name,
+            'dimension': self.backend.dimension,
+            'chunks_embedded': self.stats['chunks_embedded'],
+            'batches': self.stats['batches'],
+            'embedding_seconds': round(self.stats['embedding_seconds'], 3),
+            'chunks_per_second': round(self._chunks_per_second(), 2)
+        }
+
+@lru_cache(maxsize=200000)
+def _hash_token(token: str, dimension: int) -> Tuple[int, float]:
+    """Posição e sinal de um token (hash estável entre execuções)"""
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+    value = int.from_bytes(digest, 'little')
+    return value % dimension, (1.0 if value >> 63 else -1.0)
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normalização L2 por linha (linhas zeradas permanecem zeradas)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+def create_embedding_backend(name: Optional[str] = None) -> Optional[EmbeddingBackend]:
+    """
+    Cria o backend configurado em VCM_RAG_EMBEDDING_BACKEND
+    ('hashing' padrão, 'openai' ou 'none' para desativar)
+    """
+    name = (name or os.getenv('VCM_RAG_EMBEDDING_BACKEND', 'hashing')).lower()
+
+    if name == 'none':
+        return None
+
+    if name == 'openai':
+        api_key = os.getenv('OPENAI_API_KEY')
+        if api_key:
+            return OpenAIEmbeddingBackend(api_key, model=os.getenv('VCM_EMBEDDING_MODEL', 'text-embedding-ada-002'))
+        logger.warning("OPENAI_API_KEY não encontrada - usando backend de hashing local")
+
+    return HashingEmbeddingBackend()
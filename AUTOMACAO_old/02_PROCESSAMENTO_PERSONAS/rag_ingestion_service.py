@@ -16,6 +16,23 @@ from pathlib import Path
 from datetime import datetime
 import hashlib
 import re
+import time
+import contextvars
+
+from rag_chunker import chunk_text, DEFAULT_CHUNK_TOKENS
+
+try:
+    from rag_embedding_service import ChunkEmbedder, create_embedding_backend
+    EMBEDDINGS_AVAILABLE = True
+except ImportError as e:
+    EMBEDDINGS_AVAILABLE = False
+    _embedding_import_error = e
+
+try:
+    from rag_copy_loader import create_copy_loader, CopyLoaderUnavailable, DEFAULT_COPY_BATCH_SIZE
+    COPY_LOADER_AVAILABLE = True
+except ImportError:
+    COPY_LOADER_AVAILABLE = False
 
 # Setup logging
 logging.basicConfig(
@@ -28,6 +45,215 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+if not EMBEDDINGS_AVAILABLE:
+    logger.warning(f"Embeddings desativados (dependência ausente): {_embedding_import_error}")
+
+# Tamanho de lote para escrita em massa (configurável via .env)
+DEFAULT_BATCH_SIZE = int(os.getenv('VCM_RAG_BATCH_SIZE', '500'))
+
+# Fases executadas simultaneamente no modo concorrente
+DEFAULT_MAX_CONCURRENT_PHASES = int(os.getenv('VCM_RAG_MAX_CONCURRENT_PHASES', '4'))
+
+# Fase de ingestão em execução (atribui as linhas do writer compartilhado a cada fase)
+CURRENT_PHASE: contextvars.ContextVar = contextvars.ContextVar('rag_ingestion_phase', default=None)
+
+# Personas por consulta in_('persona_id', ...) (limita o tamanho da URL do PostgREST)
+PERSONA_ID_BATCH_SIZE = int(os.getenv('VCM_RAG_PERSONA_ID_BATCH', '100'))
+
+# Documentos por delete/update com in_('id', ...) na limpeza em massa
+DOCUMENT_ID_BATCH_SIZE = int(os.getenv('VCM_RAG_DOCUMENT_ID_BATCH', '200'))
+
+class BulkWriter:
+    """
+    Buffer de escrita em lote para o Supabase
+    Acumula linhas por tabela e envia um único insert por lote,
+    com retry dos lotes que falharem
+    
+    `transforms` permite enriquecer cada lote antes do insert
+    (ex.: embeddings de rag_chunks calculados por lote)
+    
+    Com `loader` (COPY direto no Postgres), os lotes são gravados via COPY;
+    se o banco estiver inacessível, o writer volta para o REST
+    """
+    
+    # Tabelas que precisam ser gravadas antes de outras (FK)
+    DEPENDENCIES = {
+        'rag_chunks': ['rag_documents']
+    }
+    
+    # Coluna que liga cada linha ao seu documento (sucesso e falha contados por documento)
+    DOCUMENT_KEYS = {
+        'rag_documents': 'id',
+        'rag_chunks': 'document_id'
+    }
+    
+    def __init__(self, supabase, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_retries: int = 3, retry_delay: float = 1.0,
+                 transforms: Optional[Dict[str, Any]] = None,
+                 loader=None):
+        self.supabase = supabase
+        self.transforms = transforms or {}
+        self.loader = loader
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self.errors: List[Dict[str, Any]] = []
+        self.phase_rows: Dict[str, Dict[str, int]] = {}
+        self.phase_documents: Dict[str, set] = {}
+        self.failed_document_ids: set = set()
+        # Um flush por vez (documentos antes dos chunks, ver flush())
+        self._flush_lock = asyncio.Lock()
+        self.stats = {
+            'rows_written': 0,
+            'batches': 0,
+            'retries': 0,
+            'failed_batches': 0,
+            'failed_rows': 0
+        }
+        self.started_at = time.time()
+    
+    async def add(self, table: str, row: Dict[str, Any]):
+        """Adiciona linha ao buffer, enviando o lote quando cheio"""
+        buffer = self.buffers.setdefault(table, [])
+        buffer.append(row)
+        
+        phase = CURRENT_PHASE.get()
+        if phase:
+            counts = self.phase_rows.setdefault(phase, {})
+            counts[table] = counts.get(table, 0) + 1
+            if table in self.DOCUMENT_KEYS:
+                self.phase_documents.setdefault(phase, set()).add(row[self.DOCUMENT_KEYS[table]])
+        
+        if len(buffer) >= self.batch_size:
+            await self.flush(table)
+    
+    async def flush(self, table: Optional[str] = None):
+        """Envia o buffer de uma tabela (e suas dependências) ou de todas"""
+        tables = [table] if table else list(self.buffers.keys())
+        
+        async with self._flush_lock:
+            # Buffers da tabela e das dependências tomados juntos, antes de qualquer await:
+            # enquanto o flush espera a rede, outras fases continuam enchendo buffers novos,
+            # e um chunk só entra neste flush se o seu documento entrou neste ou em um anterior
+            pending: Dict[str, List[Dict[str, Any]]] = {}
+            for name in tables:
+                for pending_table in self.DEPENDENCIES.get(name, []) + [name]:
+                    if pending_table not in pending:
+                        pending[pending_table] = self.buffers.get(pending_table) or []
+                        self.buffers[pending_table] = []
+            
+            for name, rows in pending.items():
+                await self._write_rows(name, rows)
+    
+    async def _write_rows(self, table: str, rows: List[Dict[str, Any]]):
+        """Envia as linhas de uma tabela em lotes"""
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            await self._transform_batch(table, batch)
+            await self._write_batch(table, batch)
+    
+    async def _transform_batch(self, table: str, batch: List[Dict[str, Any]]):
+        """Aplica o transform da tabela (falha não impede a gravação do lote)"""
+        transform = self.transforms.get(table)
+        if not transform:
+            return
+        
+        try:
+            await transform(batch)
+        except Exception as e:
+            error_msg = f"Transform do lote de {len(batch)} linhas em {table} falhou: {e}"
+            logger.error(error_msg)
+            self.errors.append({'type': f'transform_{table}', 'error': error_msg})
+    
+    async def _write_batch(self, table: str, batch: List[Dict[str, Any]]):
+        """Insere um lote com retry e backoff"""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self._insert_batch(table, batch)
+                self.stats['rows_written'] += len(batch)
+                self.stats['batches'] += 1
+                return
+                
+            except Exception as e:
+                if attempt < self.max_retries:
+                    self.stats['retries'] += 1
+                    logger.warning(f"Lote {table} falhou (tentativa {attempt}/{self.max_retries}): {e}")
+                    await asyncio.sleep(self.retry_delay * attempt)
+                else:
+                    self.stats['failed_batches'] += 1
+                    self.stats['failed_rows'] += len(batch)
+                    if table in self.DOCUMENT_KEYS:
+                        self.failed_document_ids.update(row[self.DOCUMENT_KEYS[table]] for row in batch)
+                    error_msg = f"Lote de {len(batch)} linhas em {table} falhou após {self.max_retries} tentativas: {e}"
+                    logger.error(error_msg)
+                    self.errors.append({'type': f'bulk_{table}', 'error': error_msg})
+    
+    async def _insert_batch(self, table: str, batch: List[Dict[str, Any]]):
+        """Grava um lote via COPY (se configurado) ou insert REST"""
+        if self.loader:
+            try:
+                await self.loader.load(table, batch)
+                return
+            except CopyLoaderUnavailable as e:
+                logger.warning(f"COPY indisponível, usando REST: {e}")
+                self.loader = None
+        
+        await self.supabase.table(table).insert(batch).execute()
+    
+    def failed_documents(self, phase: str) -> int:
+        """Documentos da fase com linhas descartadas (o documento ou algum dos seus chunks)"""
+        return len(self.phase_documents.get(phase, set()) & self.failed_document_ids)
+    
+    async def close(self):
+        """Libera a conexão do loader COPY"""
+        if self.loader:
+            await self.loader.close()
+    
+    def get_report(self) -> Dict[str, Any]:
+        """Relatório de throughput da escrita"""
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        
+        return {
+            **self.stats,
+            'backend': 'copy' if self.loader else 'rest',
+            'batch_size': self.batch_size,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.stats['rows_written'] / elapsed, 2)
+        }
+
+class IncrementalSyncState:
+    """
+    Estado de uma ingestão incremental
+    Indexa os documentos existentes por external_id com o hash do conteúdo
+    """
+    
+    def __init__(self, existing_documents: List[Dict[str, Any]]):
+        self.index: Dict[str, Dict[str, Any]] = {}
+        for doc in existing_documents:
+            metadata = doc.get('metadata') or {}
+            self.index[doc['external_id']] = {
+                'id': doc['id'],
+                'content_hash': metadata.get('content_hash'),
+                'is_active': doc.get('is_active', True)
+            }
+        self.seen: set = set()
+        # Documentos atualizados: hash novo gravado só depois dos chunks (id -> metadata)
+        self.pending_hashes: Dict[str, Dict[str, Any]] = {}
+        self.stats = {
+            'inserted': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'tombstoned': 0
+        }
+    
+    def removed_document_ids(self) -> List[str]:
+        """Documentos ativos cuja fonte não existe mais"""
+        return [
+            entry['id'] for external_id, entry in self.index.items()
+            if external_id not in self.seen and entry['is_active']
+        ]
+
 class RAGIngestionService:
     """
     Serviço de ingestão de dados para RAG
@@ -39,6 +265,13 @@ class RAGIngestionService:
         self.load_environment()
         self.setup_supabase()
         
+        # Cache de collections por empresa (evita select/insert por documento)
+        self._collections: Dict[str, str] = {}
+        self._collection_locks: Dict[str, asyncio.Lock] = {}
+        
+        # Backend de embeddings dos chunks (VCM_RAG_EMBEDDING_BACKEND)
+        self.embedding_backend = create_embedding_backend() if EMBEDDINGS_AVAILABLE else None
+        
     def load_environment(self):
         """Carrega variáveis de ambiente"""
         env_paths = [
@@ -64,9 +297,9 @@ class RAGIngestionService:
             logger.warning("Nenhum arquivo .env encontrado")
     
     def setup_supabase(self):
-        """Setup cliente Supabase"""
+        """Setup cliente Supabase (PostgREST assíncrono, não bloqueia o event loop)"""
         try:
-            from supabase import create_client
+            from async_postgrest_service import create_async_client
             
             url = os.getenv('VCM_SUPABASE_URL')
             key = os.getenv('VCM_SUPABASE_SERVICE_ROLE_KEY')
@@ -74,19 +307,39 @@ class RAGIngestionService:
             if not url or not key:
                 raise ValueError("Credenciais Supabase não encontradas")
             
-            self.supabase = create_client(url, key)
+            try:
+                # Pool compartilhado com os demais serviços do processo
+                from vcm_database_strategy import VCMDatabaseManager
+                self.supabase = VCMDatabaseManager.clients.get_client(url, key)
+            except ImportError:
+                self.supabase = create_async_client(url, key)
             logger.info("✅ Cliente Supabase configurado")
             
         except ImportError:
-            logger.error("Biblioteca supabase não instalada. Execute: pip install supabase")
+            logger.error("Biblioteca httpx não instalada. Execute: pip install httpx")
             self.supabase = None
         except Exception as e:
             logger.error(f"Erro ao configurar Supabase: {e}")
             self.supabase = None
     
-    async def ingest_empresa_data(self, empresa_id: str, force_update: bool = False) -> Dict[str, Any]:
+    async def ingest_empresa_data(self, empresa_id: str, force_update: bool = False,
+                                  batch_size: Optional[int] = None,
+                                  incremental: bool = False,
+                                  concurrent: bool = False) -> Dict[str, Any]:
         """
         Ingere todos os dados de uma empresa no RAG
+        Documentos e chunks são gravados em lotes de `batch_size` linhas,
+        com os embeddings dos chunks calculados por lote antes do insert
+        
+        Com incremental=True, apenas fontes novas ou alteradas (hash do conteúdo)
+        são gravadas e fontes removidas são desativadas (tombstone)
+        
+        Com concurrent=True, as quatro fases rodam como tarefas paralelas
+        (até VCM_RAG_MAX_CONCURRENT_PHASES) compartilhando o mesmo writer
+        
+        Com force_update=True, os documentos são gravados em uma collection sombra
+        (inativos) e trocados pelos atuais no fim do job, em uma única transação
+        quando a função swap_empresa_rag_collection existe no banco
         """
         if not self.supabase:
             raise Exception("Supabase não configurado")
@@ -98,19 +351,19 @@ class RAGIngestionService:
         job_data = {
             'id': job_id,
             'empresa_id': empresa_id,
-            'job_type': 'full_sync',
+            'job_type': 'incremental_sync' if incremental else 'full_sync',
             'status': 'running',
             'started_at': datetime.now().isoformat()
         }
+        shadow_collection_id = None
+        writer = None
         
         try:
             # Registrar job
-            self.supabase.table('rag_ingestion_jobs').insert(job_data).execute()
+            await self.supabase.table('rag_ingestion_jobs').insert(job_data).execute()
             
-            # Limpar dados existentes se force_update
             if force_update:
-                logger.info("🧹 Limpando dados RAG existentes...")
-                await self._clean_empresa_rag_data(empresa_id)
+                self._collections.pop(empresa_id, None)
             
             # Buscar dados da empresa
             empresa_data = await self._get_empresa_data(empresa_id)
@@ -129,52 +382,161 @@ class RAGIngestionService:
                 'errors': []
             }
             
-            # 1. Processar biografias
-            logger.info("📝 Processando biografias...")
-            bio_result = await self._process_biografias(empresa_id)
-            results['biografias'] = bio_result['success_count']
-            results['errors'].extend(bio_result['errors'])
-            
-            # 2. Processar competências
-            logger.info("🎯 Processando competências...")
-            comp_result = await self._process_competencias(empresa_id)
-            results['competencias'] = comp_result['success_count']
-            results['errors'].extend(comp_result['errors'])
-            
-            # 3. Processar workflows
-            logger.info("⚙️ Processando workflows...")
-            work_result = await self._process_workflows(empresa_id)
-            results['workflows'] = work_result['success_count']
-            results['errors'].extend(work_result['errors'])
-            
-            # 4. Processar knowledge base existente
-            logger.info("📚 Processando knowledge base...")
-            know_result = await self._process_knowledge_base(empresa_id)
-            results['knowledge'] = know_result['success_count']
-            results['errors'].extend(know_result['errors'])
-            
-            # Atualizar job como concluído
-            total_items = results['biografias'] + results['competencias'] + results['workflows'] + results['knowledge']
+            # Collection resolvida uma única vez por job
+            collection_id = await self._get_or_create_collection(empresa_id)
+            
+            # Reingestão completa: dados atuais continuam visíveis até a troca
+            target_collection_id = collection_id
+            if force_update:
+                shadow_collection_id = await self._create_shadow_collection(empresa_id, job_id)
+                if shadow_collection_id:
+                    target_collection_id = shadow_collection_id
+                    logger.info("🌓 Reingestão em collection sombra (troca ao final do job)")
+                else:
+                    logger.warning("Collection sombra indisponível - limpando dados antes da reingestão")
+                    await self._clean_empresa_rag_data(empresa_id)
+            
+            embedder = ChunkEmbedder(self.embedding_backend) if self.embedding_backend else None
+            transforms = {}
+            if embedder:
+                transforms['rag_chunks'] = embedder.embed_rows
+            if shadow_collection_id:
+                transforms['rag_documents'] = _deactivate_rows
+            writer = self._create_writer(batch_size, transforms)
+            
+            # Índice dos documentos existentes (apenas no modo incremental)
+            sync_state = None
+            if incremental and not force_update:
+                existing_docs = await self._get_existing_documents(empresa_id)
+                sync_state = IncrementalSyncState(existing_docs)
+                logger.info(f"🔎 Modo incremental: {len(existing_docs)} documentos existentes")
+            
+            # Personas carregadas uma única vez (fontes são buscadas em lote por persona_id)
+            personas = await self._load_personas(empresa_id)
+            logger.info(f"👥 {len(personas)} personas carregadas")
+            
+            phases = [
+                ('biografias', "📝 Processando biografias...", self._process_biografias),
+                ('competencias', "🎯 Processando competências...", self._process_competencias),
+                ('workflows', "⚙️ Processando workflows...", self._process_workflows),
+                ('knowledge', "📚 Processando knowledge base...", self._process_knowledge_base)
+            ]
+            phase_semaphore = asyncio.Semaphore(DEFAULT_MAX_CONCURRENT_PHASES if concurrent else 1)
+            
+            async def run_phase(name, message, process):
+                async with phase_semaphore:
+                    logger.info(message)
+                    token = CURRENT_PHASE.set(name)
+                    started_at = time.time()
+                    try:
+                        phase_result = await process(empresa_id, personas, writer,
+                                                     target_collection_id, sync_state)
+                    finally:
+                        CURRENT_PHASE.reset(token)
+                    return name, phase_result, time.time() - started_at
+            
+            if concurrent:
+                logger.info(f"⚡ Modo concorrente: {len(phases)} fases em paralelo")
+                phase_outcomes = await asyncio.gather(*[run_phase(*phase) for phase in phases])
+            else:
+                phase_outcomes = [await run_phase(*phase) for phase in phases]
+            
+            for _, phase_result, _ in phase_outcomes:
+                results['errors'].extend(phase_result['errors'])
+            item_errors = len(results['errors'])
+            
+            # Desativar documentos cujas fontes foram removidas
+            # (só se todas as fontes foram lidas, para não desativar por falha de leitura)
+            if sync_state:
+                if any(error['type'].endswith('_general') for error in results['errors']):
+                    logger.warning("Tombstone ignorado: houve falha na leitura de alguma fonte")
+                else:
+                    await self._tombstone_documents(sync_state)
+                results['incremental_stats'] = sync_state.stats
+            
+            # Enviar lotes pendentes
+            await writer.flush()
+            
+            # Hash do conteúdo só para documentos com todos os chunks gravados
+            # (na collection sombra uma falha descarta a reingestão inteira)
+            if not shadow_collection_id:
+                await self._commit_content_hashes(writer, sync_state)
+            results['errors'].extend(writer.errors)
+            
+            # Documento só conta como gravado se ele e todos os seus chunks chegaram ao banco
+            phase_stats = {}
+            for name, phase_result, elapsed in phase_outcomes:
+                failed_documents = writer.failed_documents(name)
+                results[name] = phase_result['success_count'] - failed_documents
+                
+                rows = writer.phase_rows.get(name, {})
+                phase_stats[name] = {
+                    'duration_seconds': round(elapsed, 3),
+                    'documents': results[name],
+                    'failed_documents': failed_documents,
+                    'rows': rows,
+                    'rows_per_second': round(sum(rows.values()) / max(elapsed, 1e-6), 2),
+                    'errors': len(phase_result['errors'])
+                }
+            
+            results['phase_stats'] = phase_stats
+            results['failed_documents'] = sum(stats['failed_documents'] for stats in phase_stats.values())
+            results['write_stats'] = writer.get_report()
+            if embedder:
+                results['embedding_stats'] = embedder.get_report()
+                logger.info(f"🧮 Embeddings ({embedder.backend.name}): "
+                            f"{results['embedding_stats']['chunks_embedded']} chunks, "
+                            f"{results['embedding_stats']['chunks_per_second']} chunks/s")
+            
+            # Trocar a collection sombra pela atual (só com todas as fontes lidas e gravadas)
+            if shadow_collection_id:
+                if writer.errors or any(error['type'].endswith('_general') for error in results['errors']):
+                    raise Exception("Reingestão incompleta - dados atuais mantidos")
+                results['swap_stats'] = await self._swap_shadow_collection(
+                    empresa_id, shadow_collection_id, collection_id)
+                shadow_collection_id = None
+            
+            # Atualizar job: concluído só se nenhum lote foi descartado pelo writer
+            success_items = results['biografias'] + results['competencias'] + results['workflows'] + results['knowledge']
+            failed_items = results['failed_documents'] + item_errors
+            total_items = success_items + failed_items
             
             job_update = {
-                'status': 'completed',
+                'status': 'failed' if results['failed_documents'] else 'completed',
                 'completed_at': datetime.now().isoformat(),
                 'total_items': total_items,
                 'processed_items': total_items,
-                'success_items': total_items - len(results['errors']),
-                'failed_items': len(results['errors']),
-                'error_details': results['errors']
+                'success_items': success_items,
+                'failed_items': failed_items,
+                'error_details': results['errors'],
+                'phase_stats': {'concurrent': concurrent, 'phases': phase_stats}
             }
             
-            self.supabase.table('rag_ingestion_jobs').update(job_update).eq('id', job_id).execute()
-            
-            logger.info(f"✅ Ingestão concluída: {total_items} itens processados")
+            try:
+                await self.supabase.table('rag_ingestion_jobs').update(job_update).eq('id', job_id).execute()
+            except Exception as e:
+                # Banco sem a coluna phase_stats (migração em rag_schema_compatible.sql)
+                logger.warning(f"Não foi possível gravar phase_stats no job: {e}")
+                job_update.pop('phase_stats')
+                await self.supabase.table('rag_ingestion_jobs').update(job_update).eq('id', job_id).execute()
+            
+            if results['failed_documents']:
+                logger.error(f"❌ Ingestão com falhas de escrita: {results['failed_documents']} documentos "
+                             f"não gravados ({writer.stats['failed_rows']} linhas descartadas)")
+            else:
+                logger.info(f"✅ Ingestão concluída: {total_items} itens processados "
+                            f"({results['write_stats']['rows_written']} linhas, "
+                            f"{results['write_stats']['rows_per_second']} linhas/s)")
             
             return results
             
         except Exception as e:
             logger.error(f"❌ Erro na ingestão: {str(e)}")
             
+            # Descartar a collection sombra (dados atuais permanecem intactos)
+            if shadow_collection_id:
+                await self._drop_shadow_collection(shadow_collection_id)
+            
             # Marcar job como falho
             error_update = {
                 'status': 'failed',
@@ -183,16 +545,35 @@ class RAGIngestionService:
             }
             
             try:
-                self.supabase.table('rag_ingestion_jobs').update(error_update).eq('id', job_id).execute()
+                await self.supabase.table('rag_ingestion_jobs').update(error_update).eq('id', job_id).execute()
             except:
                 pass
             
             raise e
+        
+        finally:
+            if writer:
+                await writer.close()
+    
+    def _create_writer(self, batch_size: Optional[int],
+                       transforms: Dict[str, Any]) -> BulkWriter:
+        """
+        Writer da ingestão: COPY direto no Postgres quando há URL do banco
+        (VCM_SUPABASE_DB_URL, VCM_RAG_WRITE_BACKEND), senão inserts em lote via REST
+        """
+        loader = create_copy_loader() if COPY_LOADER_AVAILABLE else None
+        if loader:
+            logger.info("📦 Escrita via COPY direto no Postgres")
+            return BulkWriter(self.supabase, batch_size=batch_size or DEFAULT_COPY_BATCH_SIZE,
+                              transforms=transforms, loader=loader)
+        
+        return BulkWriter(self.supabase, batch_size=batch_size or DEFAULT_BATCH_SIZE,
+                          transforms=transforms)
     
     async def _get_empresa_data(self, empresa_id: str) -> Optional[Dict[str, Any]]:
         """Busca dados básicos da empresa"""
         try:
-            result = self.supabase.table('empresas').select('*').eq('id', empresa_id).execute()
+            result = await self.supabase.table('empresas').select('*').eq('id', empresa_id).execute()
             
             if result.data:
                 return result.data[0]
@@ -203,39 +584,131 @@ class RAGIngestionService:
             return None
     
     async def _clean_empresa_rag_data(self, empresa_id: str):
-        """Limpa dados RAG existentes da empresa"""
+        """
+        Limpa dados RAG existentes da empresa
+        Usa a função clean_empresa_rag_data (um único statement no banco);
+        sem ela, apaga em lotes com in_('document_id', ...)
+        """
         try:
-            # Buscar documentos da empresa
-            docs_result = self.supabase.table('rag_documents').select('id').eq('empresa_id', empresa_id).execute()
-            
-            if docs_result.data:
-                doc_ids = [doc['id'] for doc in docs_result.data]
-                
-                # Deletar chunks primeiro
-                for doc_id in doc_ids:
-                    self.supabase.table('rag_chunks').delete().eq('document_id', doc_id).execute()
-                
-                # Deletar documentos
-                self.supabase.table('rag_documents').delete().eq('empresa_id', empresa_id).execute()
-                
-                logger.info(f"🧹 Removidos {len(doc_ids)} documentos RAG existentes")
+            try:
+                result = await self.supabase.rpc('clean_empresa_rag_data',
+                                                 {'target_empresa_id': empresa_id}).execute()
+                logger.info(f"🧹 Removidos {result.data} documentos RAG existentes")
+                return
+            except Exception as e:
+                logger.warning(f"Função clean_empresa_rag_data indisponível, limpando em lotes: {e}")
+            
+            docs = await self._keyset_select(
+                lambda: self.supabase.table('rag_documents').select('id').eq('empresa_id', empresa_id)
+            )
+            removed = await self._purge_documents([doc['id'] for doc in docs])
+            logger.info(f"🧹 Removidos {removed} documentos RAG existentes")
                 
         except Exception as e:
             logger.warning(f"Erro ao limpar dados RAG: {e}")
     
-    async def _process_biografias(self, empresa_id: str) -> Dict[str, Any]:
+    async def _purge_documents(self, doc_ids: List[str],
+                               id_batch_size: int = DOCUMENT_ID_BATCH_SIZE) -> int:
+        """Apaga documentos e seus chunks (chunks primeiro) com um delete por lote de ids"""
+        for start in range(0, len(doc_ids), id_batch_size):
+            ids = doc_ids[start:start + id_batch_size]
+            await self.supabase.table('rag_chunks').delete(returning='minimal').in_('document_id', ids).execute()
+            await self.supabase.table('rag_documents').delete(returning='minimal').in_('id', ids).execute()
+        
+        return len(doc_ids)
+    
+    async def _create_shadow_collection(self, empresa_id: str, job_id: str) -> Optional[str]:
+        """Collection temporária (inativa) que recebe os documentos da reingestão"""
+        collection_data = {
+            'id': str(uuid.uuid4()),
+            'code': f'empresa_{empresa_id}__shadow_{job_id}',
+            'name': f'Reingestão {job_id}',
+            'description': 'Collection sombra de reingestão (temporária)',
+            'visibility': 'internal',
+            'metadata': {
+                'empresa_id': empresa_id,
+                'shadow_of_job': job_id,
+                'auto_generated': True
+            },
+            'is_active': False
+        }
+        
+        try:
+            result = await self.supabase.table('rag_collections').insert(collection_data).execute()
+            return result.data[0]['id']
+        except Exception as e:
+            logger.warning(f"Erro ao criar collection sombra: {e}")
+            return None
+    
+    async def _swap_shadow_collection(self, empresa_id: str, shadow_collection_id: str,
+                                      collection_id: str) -> Dict[str, Any]:
+        """
+        Substitui os documentos atuais da empresa pelos da collection sombra
+        Via função swap_empresa_rag_collection (uma transação: leitores veem o conjunto
+        antigo ou o novo). O fallback REST só roda se a função não existir no banco:
+        qualquer outro erro pode vir de uma troca já confirmada e sobe para o job
+        """
+        try:
+            result = await self.supabase.rpc('swap_empresa_rag_collection', {
+                'target_empresa_id': empresa_id,
+                'shadow_collection_id': shadow_collection_id,
+                'live_collection_id': collection_id
+            }).execute()
+            logger.info(f"🔁 Collection trocada: {result.data} documentos antigos removidos")
+            return {'mode': 'rpc', 'removed_documents': result.data}
+        except Exception as e:
+            if not _is_missing_function(e):
+                raise
+            logger.warning(f"Função swap_empresa_rag_collection indisponível, trocando via REST: {e}")
+        
+        # Sem transação, em passos que nunca deixam a empresa sem dados ativos:
+        # 1) ativa os novos ainda na collection sombra (por um instante os dois conjuntos ficam visíveis)
+        await self.supabase.table('rag_documents')\
+            .update({'is_active': True}, returning='minimal')\
+            .eq('collection_id', shadow_collection_id)\
+            .execute()
+        
+        # 2) apaga os antigos - a collection sombra continua identificando os novos
+        docs = await self._keyset_select(
+            lambda: self.supabase.table('rag_documents').select('id, collection_id').eq('empresa_id', empresa_id)
+        )
+        old_ids = [doc['id'] for doc in docs if doc.get('collection_id') != shadow_collection_id]
+        removed = await self._purge_documents(old_ids)
+        
+        # 3) move os novos para a collection da empresa
+        await self.supabase.table('rag_documents')\
+            .update({'collection_id': collection_id}, returning='minimal')\
+            .eq('collection_id', shadow_collection_id)\
+            .execute()
+        await self.supabase.table('rag_collections').delete(returning='minimal').eq('id', shadow_collection_id).execute()
+        
+        logger.info(f"🔁 Collection trocada: {removed} documentos antigos removidos")
+        return {'mode': 'rest', 'removed_documents': removed}
+    
+    async def _drop_shadow_collection(self, shadow_collection_id: str):
+        """Descarta a collection sombra de uma reingestão que falhou"""
+        try:
+            docs = await self._keyset_select(
+                lambda: self.supabase.table('rag_documents').select('id').eq('collection_id', shadow_collection_id)
+            )
+            await self._purge_documents([doc['id'] for doc in docs])
+            await self.supabase.table('rag_collections').delete(returning='minimal').eq('id', shadow_collection_id).execute()
+            logger.info(f"🗑️ Collection sombra descartada ({len(docs)} documentos)")
+        except Exception as e:
+            logger.warning(f"Erro ao descartar collection sombra {shadow_collection_id}: {e}")
+    
+    async def _process_biografias(self, empresa_id: str, personas: List[Dict[str, Any]],
+                                  writer: BulkWriter, collection_id: str,
+                                  sync_state: Optional[IncrementalSyncState] = None) -> Dict[str, Any]:
         """Processa biografias para RAG"""
         result = {'success_count': 0, 'errors': []}
         
         try:
-            # Buscar personas da empresa
-            personas_result = self.supabase.table('personas').select('*').eq('empresa_id', empresa_id).execute()
-            
-            if not personas_result.data:
+            if not personas:
                 logger.info("Nenhuma persona encontrada")
                 return result
             
-            for persona in personas_result.data:
+            for persona in personas:
                 try:
                     if not persona.get('biografia_completa'):
                         continue
@@ -243,7 +716,7 @@ class RAGIngestionService:
                     # Criar documento RAG para biografia
                     doc_data = {
                         'id': str(uuid.uuid4()),
-                        'collection_id': await self._get_or_create_collection(empresa_id),
+                        'collection_id': collection_id,
                         'external_id': f"biografia_{persona['id']}",
                         'title': f"Biografia: {persona['full_name']}",
                         'content_raw': persona['biografia_completa'],
@@ -263,11 +736,8 @@ class RAGIngestionService:
                         'processed_at': datetime.now().isoformat()
                     }
                     
-                    # Inserir documento
-                    self.supabase.table('rag_documents').insert(doc_data).execute()
-                    
-                    # Criar chunks da biografia
-                    await self._create_chunks(doc_data['id'], persona['biografia_completa'])
+                    # Gravar documento e chunks da biografia (em lote)
+                    await self._write_document(doc_data, writer, sync_state)
                     
                     result['success_count'] += 1
                     logger.debug(f"✅ Biografia processada: {persona['full_name']}")
@@ -285,31 +755,32 @@ class RAGIngestionService:
         
         return result
     
-    async def _process_competencias(self, empresa_id: str) -> Dict[str, Any]:
+    async def _process_competencias(self, empresa_id: str, personas: List[Dict[str, Any]],
+                                    writer: BulkWriter, collection_id: str,
+                                    sync_state: Optional[IncrementalSyncState] = None) -> Dict[str, Any]:
         """Processa competências para RAG"""
         result = {'success_count': 0, 'errors': []}
         
         try:
-            # Buscar competências via personas
-            personas_result = self.supabase.table('personas').select('id, full_name').eq('empresa_id', empresa_id).execute()
-            
-            if not personas_result.data:
+            if not personas:
                 return result
             
-            for persona in personas_result.data:
+            # Competências de todas as personas, agrupadas por persona_id
+            competencias_by_persona = await self._load_rows_by_persona('competencias', personas)
+            
+            for persona in personas:
                 try:
-                    # Buscar competências da persona
-                    comp_result = self.supabase.table('competencias').select('*').eq('persona_id', persona['id']).execute()
+                    competencias = competencias_by_persona.get(persona['id'])
                     
-                    if not comp_result.data:
+                    if not competencias:
                         continue
                     
                     # Agrupar competências por persona
-                    competencias_text = self._format_competencias_text(comp_result.data, persona['full_name'])
+                    competencias_text = self._format_competencias_text(competencias, persona['full_name'])
                     
                     doc_data = {
                         'id': str(uuid.uuid4()),
-                        'collection_id': await self._get_or_create_collection(empresa_id),
+                        'collection_id': collection_id,
                         'external_id': f"competencias_{persona['id']}",
                         'title': f"Competências: {persona['full_name']}",
                         'content_raw': competencias_text,
@@ -319,7 +790,7 @@ class RAGIngestionService:
                         'metadata': {
                             'persona_id': persona['id'],
                             'persona_name': persona['full_name'],
-                            'competencias_count': len(comp_result.data),
+                            'competencias_count': len(competencias),
                             'empresa_id': empresa_id
                         },
                         'empresa_id': empresa_id,
@@ -329,8 +800,7 @@ class RAGIngestionService:
                         'processed_at': datetime.now().isoformat()
                     }
                     
-                    self.supabase.table('rag_documents').insert(doc_data).execute()
-                    await self._create_chunks(doc_data['id'], competencias_text)
+                    await self._write_document(doc_data, writer, sync_state)
                     
                     result['success_count'] += 1
                     
@@ -347,32 +817,33 @@ class RAGIngestionService:
         
         return result
     
-    async def _process_workflows(self, empresa_id: str) -> Dict[str, Any]:
+    async def _process_workflows(self, empresa_id: str, personas: List[Dict[str, Any]],
+                                 writer: BulkWriter, collection_id: str,
+                                 sync_state: Optional[IncrementalSyncState] = None) -> Dict[str, Any]:
         """Processa workflows para RAG"""
         result = {'success_count': 0, 'errors': []}
         
         try:
-            # Buscar workflows via personas
-            personas_result = self.supabase.table('personas').select('id, full_name').eq('empresa_id', empresa_id).execute()
-            
-            if not personas_result.data:
+            if not personas:
                 return result
             
-            for persona in personas_result.data:
+            # Workflows de todas as personas, agrupados por persona_id
+            workflows_by_persona = await self._load_rows_by_persona('workflows', personas)
+            
+            for persona in personas:
                 try:
-                    # Buscar workflows da persona
-                    work_result = self.supabase.table('workflows').select('*').eq('persona_id', persona['id']).execute()
+                    workflows = workflows_by_persona.get(persona['id'])
                     
-                    if not work_result.data:
+                    if not workflows:
                         continue
                     
                     # Processar cada workflow
-                    for workflow in work_result.data:
+                    for workflow in workflows:
                         workflow_text = self._format_workflow_text(workflow, persona['full_name'])
                         
                         doc_data = {
                             'id': str(uuid.uuid4()),
-                            'collection_id': await self._get_or_create_collection(empresa_id),
+                            'collection_id': collection_id,
                             'external_id': f"workflow_{workflow['id']}",
                             'title': f"Workflow: {workflow['nome']} - {persona['full_name']}",
                             'content_raw': workflow_text,
@@ -394,8 +865,7 @@ class RAGIngestionService:
                             'processed_at': datetime.now().isoformat()
                         }
                         
-                        self.supabase.table('rag_documents').insert(doc_data).execute()
-                        await self._create_chunks(doc_data['id'], workflow_text)
+                        await self._write_document(doc_data, writer, sync_state)
                         
                         result['success_count'] += 1
                     
@@ -412,33 +882,34 @@ class RAGIngestionService:
         
         return result
     
-    async def _process_knowledge_base(self, empresa_id: str) -> Dict[str, Any]:
+    async def _process_knowledge_base(self, empresa_id: str, personas: List[Dict[str, Any]],
+                                      writer: BulkWriter, collection_id: str,
+                                      sync_state: Optional[IncrementalSyncState] = None) -> Dict[str, Any]:
         """Processa knowledge base existente para RAG"""
         result = {'success_count': 0, 'errors': []}
         
         try:
-            # Buscar knowledge base via personas
-            personas_result = self.supabase.table('personas').select('id, full_name').eq('empresa_id', empresa_id).execute()
-            
-            if not personas_result.data:
+            if not personas:
                 return result
             
-            for persona in personas_result.data:
+            # Knowledge de todas as personas, agrupado por persona_id
+            knowledge_by_persona = await self._load_rows_by_persona('rag_knowledge', personas)
+            
+            for persona in personas:
                 try:
-                    # Buscar knowledge da persona
-                    know_result = self.supabase.table('rag_knowledge').select('*').eq('persona_id', persona['id']).execute()
+                    knowledge_items = knowledge_by_persona.get(persona['id'])
                     
-                    if not know_result.data:
+                    if not knowledge_items:
                         continue
                     
                     # Processar cada item de knowledge
-                    for knowledge in know_result.data:
+                    for knowledge in knowledge_items:
                         if not knowledge.get('ativo', True):
                             continue
                         
                         doc_data = {
                             'id': str(uuid.uuid4()),
-                            'collection_id': await self._get_or_create_collection(empresa_id),
+                            'collection_id': collection_id,
                             'external_id': f"knowledge_{knowledge['id']}",
                             'title': knowledge['titulo'],
                             'content_raw': knowledge['conteudo'],
@@ -462,8 +933,7 @@ class RAGIngestionService:
                             'processed_at': datetime.now().isoformat()
                         }
                         
-                        self.supabase.table('rag_documents').insert(doc_data).execute()
-                        await self._create_chunks(doc_data['id'], knowledge['conteudo'])
+                        await self._write_document(doc_data, writer, sync_state)
                         
                         result['success_count'] += 1
                     
@@ -480,11 +950,201 @@ class RAGIngestionService:
         
         return result
     
+    async def _load_personas(self, empresa_id: str) -> List[Dict[str, Any]]:
+        """Personas da empresa (paginação por chave)"""
+        return await self._keyset_select(
+            lambda: self.supabase.table('personas').select('*').eq('empresa_id', empresa_id)
+        )
+    
+    async def _load_rows_by_persona(self, table: str, personas: List[Dict[str, Any]],
+                                    id_batch_size: int = PERSONA_ID_BATCH_SIZE) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Linhas de `table` de todas as personas, indexadas por persona_id
+        Uma consulta in_('persona_id', ...) por lote de ids, paginada por chave
+        """
+        persona_ids = [persona['id'] for persona in personas]
+        rows_by_persona: Dict[str, List[Dict[str, Any]]] = {}
+        
+        for start in range(0, len(persona_ids), id_batch_size):
+            batch_ids = persona_ids[start:start + id_batch_size]
+            rows = await self._keyset_select(
+                lambda: self.supabase.table(table).select('*').in_('persona_id', batch_ids)
+            )
+            for row in rows:
+                rows_by_persona.setdefault(row['persona_id'], []).append(row)
+        
+        return rows_by_persona
+    
+    async def _keyset_select(self, build_query, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Lê todas as linhas de uma consulta em páginas ordenadas por id (id > último id)
+        Termina só com uma página vazia: com max-rows do PostgREST abaixo de page_size,
+        uma página curta não significa que a consulta acabou
+        """
+        rows: List[Dict[str, Any]] = []
+        last_id = None
+        
+        while True:
+            query = build_query()
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            page = (await query.order('id').limit(page_size).execute()).data or []
+            
+            if not page:
+                return rows
+            rows.extend(page)
+            last_id = page[-1]['id']
+    
+    async def _write_document(self, doc_data: Dict[str, Any], writer: BulkWriter,
+                              sync_state: Optional[IncrementalSyncState] = None):
+        """
+        Grava documento e seus chunks
+        No modo incremental compara o hash do conteúdo com o documento existente
+        """
+        content_hash = self._compute_content_hash(doc_data)
+        doc_data['metadata']['content_hash'] = content_hash
+        
+        if sync_state is None:
+            await writer.add('rag_documents', doc_data)
+            await self._create_chunks(doc_data['id'], doc_data['content_raw'], writer)
+            return
+        
+        external_id = doc_data['external_id']
+        sync_state.seen.add(external_id)
+        existing = sync_state.index.get(external_id)
+        
+        if not existing:
+            await writer.add('rag_documents', doc_data)
+            await self._create_chunks(doc_data['id'], doc_data['content_raw'], writer)
+            sync_state.stats['inserted'] += 1
+            return
+        
+        if existing['content_hash'] == content_hash and existing['is_active']:
+            sync_state.stats['unchanged'] += 1
+            return
+        
+        # Conteúdo alterado: atualiza o documento no lugar e recria apenas seus chunks
+        # O hash novo fica pendente até os chunks serem gravados (_commit_content_hashes)
+        doc_data['id'] = existing['id']
+        metadata = doc_data['metadata']
+        update_data = {key: value for key, value in doc_data.items() if key != 'id'}
+        update_data['metadata'] = {key: value for key, value in metadata.items() if key != 'content_hash'}
+        await self.supabase.table('rag_documents').update(update_data).eq('id', existing['id']).execute()
+        await self.supabase.table('rag_chunks').delete().eq('document_id', existing['id']).execute()
+        await self._create_chunks(existing['id'], doc_data['content_raw'], writer)
+        sync_state.pending_hashes[existing['id']] = metadata
+        sync_state.stats['updated'] += 1
+    
+    async def _commit_content_hashes(self, writer: BulkWriter,
+                                     sync_state: Optional[IncrementalSyncState] = None):
+        """
+        Confirma o hash dos documentos atualizados cujos chunks foram gravados e remove
+        o hash dos documentos com lote descartado (um hash sem chunks faria a ingestão
+        incremental pular o documento para sempre)
+        """
+        failed_ids = writer.failed_document_ids
+        
+        if sync_state:
+            for doc_id, metadata in sync_state.pending_hashes.items():
+                if doc_id in failed_ids:
+                    continue
+                try:
+                    await self.supabase.table('rag_documents')\
+                        .update({'metadata': metadata}, returning='minimal').eq('id', doc_id).execute()
+                except Exception as e:
+                    logger.warning(f"Hash do documento {doc_id} não gravado (será reprocessado): {e}")
+        
+        invalidated = 0
+        failed_list = list(failed_ids)
+        for start in range(0, len(failed_list), DOCUMENT_ID_BATCH_SIZE):
+            ids = failed_list[start:start + DOCUMENT_ID_BATCH_SIZE]
+            try:
+                docs = await self.supabase.table('rag_documents').select('id, metadata').in_('id', ids).execute()
+                for doc in docs.data or []:
+                    metadata = doc.get('metadata') or {}
+                    if metadata.pop('content_hash', None) is None:
+                        continue
+                    await self.supabase.table('rag_documents')\
+                        .update({'metadata': metadata}, returning='minimal').eq('id', doc['id']).execute()
+                    invalidated += 1
+            except Exception as e:
+                error_msg = f"Não foi possível invalidar o hash de documentos com chunks descartados: {e}"
+                logger.error(error_msg)
+                writer.errors.append({'type': 'content_hash', 'error': error_msg})
+        
+        if invalidated:
+            logger.warning(f"🔓 Hash removido de {invalidated} documentos com lotes descartados")
+    
+    def _compute_content_hash(self, doc_data: Dict[str, Any]) -> str:
+        """Hash do conteúdo indexável de um documento"""
+        hash_source = f"{doc_data['title']}\n{doc_data['document_type']}\n{doc_data['content_raw']}"
+        return hashlib.sha256(hash_source.encode('utf-8')).hexdigest()
+    
+    async def _get_existing_documents(self, empresa_id: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """Busca (paginado) os documentos RAG existentes da empresa"""
+        documents = []
+        start = 0
+        
+        while True:
+            page = await self.supabase.table('rag_documents') \
+                .select('id, external_id, metadata, is_active') \
+                .eq('empresa_id', empresa_id) \
+                .order('id') \
+                .range(start, start + page_size - 1) \
+                .execute()
+            
+            if not page.data:
+                break
+            documents.extend(page.data)
+            # Avança pelo que veio (max-rows do PostgREST pode devolver menos que page_size)
+            start += len(page.data)
+        
+        return documents
+    
+    async def _tombstone_documents(self, sync_state: IncrementalSyncState):
+        """Desativa documentos cujas fontes foram removidas e descarta seus chunks"""
+        removed_ids = sync_state.removed_document_ids()
+        if not removed_ids:
+            return
+        
+        tombstone = {
+            'is_active': False,
+            'processed_at': datetime.now().isoformat()
+        }
+        
+        for start in range(0, len(removed_ids), DOCUMENT_ID_BATCH_SIZE):
+            ids = removed_ids[start:start + DOCUMENT_ID_BATCH_SIZE]
+            await self.supabase.table('rag_chunks').delete().in_('document_id', ids).execute()
+            await self.supabase.table('rag_documents').update(tombstone).in_('id', ids).execute()
+        
+        sync_state.stats['tombstoned'] = len(removed_ids)
+        logger.info(f"🪦 {len(removed_ids)} documentos desativados (fonte removida)")
+    
     async def _get_or_create_collection(self, empresa_id: str) -> str:
-        """Busca ou cria collection para a empresa"""
+        """Busca ou cria collection para a empresa (memoizado por serviço)"""
+        if empresa_id in self._collections:
+            return self._collections[empresa_id]
+        
+        # Lock por empresa evita que jobs concorrentes criem collections duplicadas
+        lock = self._collection_locks.setdefault(empresa_id, asyncio.Lock())
+        
+        async with lock:
+            if empresa_id not in self._collections:
+                collection_id = await self._fetch_or_create_collection(empresa_id)
+                if not collection_id:
+                    # Retornar um ID padrão se falhar (não memoizado)
+                    return str(uuid.uuid4())
+                self._collections[empresa_id] = collection_id
+        
+        return self._collections[empresa_id]
+    
+    async def _fetch_or_create_collection(self, empresa_id: str) -> Optional[str]:
+        """Busca collection no banco ou cria uma nova"""
+        code = f'empresa_{empresa_id}'
+        
         try:
             # Buscar collection existente
-            result = self.supabase.table('rag_collections').select('id').eq('code', f'empresa_{empresa_id}').execute()
+            result = await self.supabase.table('rag_collections').select('id').eq('code', code).execute()
             
             if result.data:
                 return result.data[0]['id']
@@ -495,7 +1155,7 @@ class RAGIngestionService:
             
             collection_data = {
                 'id': str(uuid.uuid4()),
-                'code': f'empresa_{empresa_id}',
+                'code': code,
                 'name': f'Knowledge Base - {empresa_nome}',
                 'description': f'Base de conhecimento da empresa {empresa_nome}',
                 'visibility': 'internal',
@@ -506,74 +1166,54 @@ class RAGIngestionService:
                 'is_active': True
             }
             
-            insert_result = self.supabase.table('rag_collections').insert(collection_data).execute()
-            return insert_result.data[0]['id']
+            try:
+                insert_result = await self.supabase.table('rag_collections').insert(collection_data).execute()
+                return insert_result.data[0]['id']
+            except Exception:
+                # `code` é UNIQUE: outro processo pode ter criado a collection antes
+                retry = await self.supabase.table('rag_collections').select('id').eq('code', code).execute()
+                if retry.data:
+                    return retry.data[0]['id']
+                raise
             
         except Exception as e:
             logger.error(f"Erro ao criar/buscar collection: {e}")
-            # Retornar um ID padrão se falhar
-            return str(uuid.uuid4())
+            return None
     
-    async def _create_chunks(self, document_id: str, content: str, chunk_size: int = 1000):
-        """Cria chunks de um documento"""
+    async def _create_chunks(self, document_id: str, content: str, writer: BulkWriter,
+                             max_tokens: int = DEFAULT_CHUNK_TOKENS):
+        """Cria chunks de um documento (enfileirados no writer em lote)"""
         try:
-            # Dividir texto em chunks
-            chunks = self._split_text_into_chunks(content, chunk_size)
+            # Spans (offset, length) alinhados a frases; o texto só é copiado na linha final
+            spans = chunk_text(content, max_tokens)
             
-            for i, chunk_content in enumerate(chunks):
+            for i, span in enumerate(spans):
+                chunk_content = content[span.offset:span.end]
+                next_overlap = spans[i + 1].overlap_prev if i + 1 < len(spans) else 0
                 chunk_data = {
                     'id': str(uuid.uuid4()),
                     'document_id': document_id,
                     'chunk_index': i,
                     'content': chunk_content,
-                    'content_length': len(chunk_content),
+                    'content_length': span.length,
+                    'tokens': span.tokens,
+                    'start_char': span.offset,
+                    'end_char': span.end,
+                    'overlap_prev': span.overlap_prev,
+                    'overlap_next': next_overlap,
                     'metadata': {
                         'chunk_number': i + 1,
-                        'total_chunks': len(chunks)
+                        'total_chunks': len(spans)
                     }
                 }
                 
-                self.supabase.table('rag_chunks').insert(chunk_data).execute()
+                await writer.add('rag_chunks', chunk_data)
             
-            logger.debug(f"✅ Criados {len(chunks)} chunks para documento {document_id}")
+            logger.debug(f"✅ Criados {len(spans)} chunks para documento {document_id}")
             
         except Exception as e:
             logger.error(f"Erro ao criar chunks: {e}")
     
-    def _split_text_into_chunks(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Divide texto em chunks com overlap"""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            if end >= len(text):
-                chunks.append(text[start:])
-                break
-            
-            # Tentar quebrar em uma frase completa
-            chunk = text[start:end]
-            last_period = chunk.rfind('.')
-            last_newline = chunk.rfind('\n')
-            
-            break_point = max(last_period, last_newline)
-            
-            if break_point > start + chunk_size // 2:  # Se encontrou um bom ponto de quebra
-                actual_end = start + break_point + 1
-                chunks.append(text[start:actual_end])
-                start = actual_end - overlap
-            else:
-                chunks.append(chunk)
-                start = end - overlap
-            
-            start = max(0, start)  # Garantir que não seja negativo
-        
-        return chunks
-    
     def _format_competencias_text(self, competencias: List[Dict], persona_name: str) -> str:
         """Formata competências em texto estruturado"""
         text = f"Competências de {persona_name}:\n\n"
@@ -619,17 +1259,17 @@ class RAGIngestionService:
         
         return text
     
-    def get_ingestion_status(self, empresa_id: str) -> Dict[str, Any]:
+    async def get_ingestion_status(self, empresa_id: str) -> Dict[str, Any]:
         """Retorna status das ingestões de uma empresa"""
         try:
             if not self.supabase:
                 return {'error': 'Supabase não configurado'}
             
             # Buscar jobs recentes
-            result = self.supabase.table('rag_ingestion_jobs').select('*').eq('empresa_id', empresa_id).order('created_at', desc=True).limit(10).execute()
+            result = await self.supabase.table('rag_ingestion_jobs').select('*').eq('empresa_id', empresa_id).order('created_at', desc=True).limit(10).execute()
             
             # Buscar estatísticas RAG
-            stats_result = self.supabase.rpc('rag_empresa_stats', {'target_empresa_id': empresa_id}).execute()
+            stats_result = await self.supabase.rpc('rag_empresa_stats', {'target_empresa_id': empresa_id}).execute()
             
             return {
                 'recent_jobs': result.data if result.data else [],
@@ -641,17 +1281,32 @@ class RAGIngestionService:
             logger.error(f"Erro ao buscar status: {e}")
             return {'error': str(e)}
 
+async def _deactivate_rows(rows: List[Dict[str, Any]]):
+    """Documentos da collection sombra ficam inativos até a troca"""
+    for row in rows:
+        row['is_active'] = False
+
+def _is_missing_function(error: Exception) -> bool:
+    """Erro do PostgREST para função RPC inexistente (404 / PGRST202 / 42883)"""
+    details = getattr(error, 'details', None)
+    code = getattr(error, 'code', None) or (details.get('code') if isinstance(details, dict) else None)
+    return code in ('PGRST202', '42883') or getattr(error, 'status_code', None) == 404
+
 # Instância global do serviço
 rag_service = RAGIngestionService()
 
 # Funções de conveniência
-async def ingest_empresa_rag(empresa_id: str, force_update: bool = False) -> Dict[str, Any]:
+async def ingest_empresa_rag(empresa_id: str, force_update: bool = False,
+                             batch_size: Optional[int] = None,
+                             incremental: bool = False,
+                             concurrent: bool = False) -> Dict[str, Any]:
     """Função de conveniência para ingestão RAG"""
-    return await rag_service.ingest_empresa_data(empresa_id, force_update)
+    return await rag_service.ingest_empresa_data(empresa_id, force_update, batch_size,
+                                                 incremental, concurrent)
 
-def get_rag_status(empresa_id: str) -> Dict[str, Any]:
+async def get_rag_status(empresa_id: str) -> Dict[str, Any]:
     """Função de conveniência para status RAG"""
-    return rag_service.get_ingestion_status(empresa_id)
+    return await rag_service.get_ingestion_status(empresa_id)
 
 # Execução standalone para teste
 if __name__ == "__main__":
@@ -664,7 +1319,7 @@ if __name__ == "__main__":
                 print("❌ Supabase não configurado")
                 return
             
-            empresas_result = rag_service.supabase.table('empresas').select('id, nome').limit(1).execute()
+            empresas_result = await rag_service.supabase.table('empresas').select('id, nome').limit(1).execute()
             
             if not empresas_result.data:
                 print("❌ Nenhuma empresa encontrada")
@@ -685,6 +1340,11 @@ if __name__ == "__main__":
             print(f"   🎯 Competências: {result['competencias']}")
             print(f"   ⚙️ Workflows: {result['workflows']}")
             print(f"   📚 Knowledge: {result['knowledge']}")
+            print(f"   ⚡ Escrita: {result['write_stats']['rows_written']} linhas "
+                  f"({result['write_stats']['rows_per_second']} linhas/s)")
+            if 'embedding_stats' in result:
+                print(f"   🧮 Embeddings: {result['embedding_stats']['chunks_embedded']} chunks "
+                      f"({result['embedding_stats']['chunks_per_second']} chunks/s)")
             print(f"   ❌ Erros: {len(result['errors'])}")
             
             if result['errors']:
@@ -16,6 +16,7 @@ CREATE TABLE IF NOT EXISTS rag_documents (
     source_id UUID, -- ID da fonte original (persona_id, workflow_id, etc)
     metadata JSONB DEFAULT '{}',
     embedding VECTOR(1536), -- Embedding do OpenAI ada-002
+    is_active BOOLEAN DEFAULT true, -- false: documento em reingestão (collection sombra) ou removido
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     
@@ -33,6 +34,9 @@ CREATE INDEX IF NOT EXISTS idx_rag_type ON rag_documents(document_type);
 CREATE INDEX IF NOT EXISTS idx_rag_source ON rag_documents(source_id);
 CREATE INDEX IF NOT EXISTS idx_rag_created ON rag_documents(created_at);
 
+-- Bancos criados antes da coluna is_active
+ALTER TABLE rag_documents ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT true;
+
 -- Tabela de chunks (fragmentos de documentos)
 CREATE TABLE IF NOT EXISTS rag_chunks (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -114,6 +118,7 @@ AS $$
         d.created_at
     FROM rag_documents d
     WHERE d.empresa_id = target_empresa_id
+    AND d.is_active
     AND (1 - (d.embedding <=> query_embedding)) > similarity_threshold
     ORDER BY d.embedding <=> query_embedding
     LIMIT max_results;
@@ -147,6 +152,7 @@ AS $$
     FROM rag_chunks c
     JOIN rag_documents d ON c.document_id = d.id
     WHERE d.empresa_id = target_empresa_id
+    AND d.is_active
     AND (1 - (c.embedding <=> query_embedding)) > similarity_threshold
     ORDER BY c.embedding <=> query_embedding
     LIMIT max_results;
@@ -184,7 +190,7 @@ SELECT
     AVG(LENGTH(d.content)) as avg_content_length,
     MAX(d.updated_at) as last_updated
 FROM empresas e
-LEFT JOIN rag_documents d ON e.id = d.empresa_id
+LEFT JOIN rag_documents d ON e.id = d.empresa_id AND d.is_active
 GROUP BY e.id, e.nome;
 
 -- Comentários das tabelas
@@ -68,6 +68,14 @@ BEGIN
         CREATE INDEX IF NOT EXISTS idx_rag_documents_persona ON rag_documents(persona_id);
     END IF;
 
+    -- is_active: false enquanto o documento está na collection sombra ou foi removido
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_name = 'rag_documents' AND column_name = 'is_active'
+    ) THEN
+        ALTER TABLE rag_documents ADD COLUMN is_active BOOLEAN DEFAULT true;
+    END IF;
+
 END
 $$;
 
@@ -98,11 +106,15 @@ CREATE TABLE IF NOT EXISTS rag_ingestion_jobs (
     success_items INTEGER DEFAULT 0,
     failed_items INTEGER DEFAULT 0,
     error_details JSONB DEFAULT '[]',
+    phase_stats JSONB DEFAULT '{}', -- duração, linhas e throughput por fase
     started_at TIMESTAMP WITH TIME ZONE,
     completed_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Métricas por fase em bancos criados antes da coluna
+ALTER TABLE rag_ingestion_jobs ADD COLUMN IF NOT EXISTS phase_stats JSONB DEFAULT '{}';
+
 -- Índices para performance
 CREATE INDEX IF NOT EXISTS idx_rag_ingestion_empresa ON rag_ingestion_jobs(empresa_id);
 CREATE INDEX IF NOT EXISTS idx_rag_ingestion_status ON rag_ingestion_jobs(status);
@@ -135,6 +147,42 @@ BEGIN
 END;
 $$;
 
+-- Troca atômica da collection sombra da reingestão (force_update)
+-- Remove os documentos antigos e promove os novos em uma única transação
+CREATE OR REPLACE FUNCTION swap_empresa_rag_collection(
+    target_empresa_id UUID,
+    shadow_collection_id UUID,
+    live_collection_id UUID
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    deleted_count INTEGER := 0;
+BEGIN
+    -- Deletar chunks dos documentos antigos primeiro (foreign key)
+    DELETE FROM rag_chunks rc
+    USING rag_documents rd
+    WHERE rc.document_id = rd.id
+    AND rd.empresa_id = target_empresa_id
+    AND rd.collection_id IS DISTINCT FROM shadow_collection_id;
+    
+    DELETE FROM rag_documents
+    WHERE empresa_id = target_empresa_id
+    AND collection_id IS DISTINCT FROM shadow_collection_id;
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+    
+    -- Promover documentos novos para a collection da empresa
+    UPDATE rag_documents
+    SET collection_id = live_collection_id, is_active = true
+    WHERE collection_id = shadow_collection_id;
+    
+    DELETE FROM rag_collections WHERE id = shadow_collection_id;
+    
+    RETURN deleted_count;
+END;
+$$;
+
 -- Função para buscar documentos similares (funciona com ou sem vector extension)
 CREATE OR REPLACE FUNCTION search_similar_documents(
     target_empresa_id UUID,
@@ -170,6 +218,7 @@ BEGIN
         rd.created_at
     FROM rag_documents rd
     WHERE rd.empresa_id = target_empresa_id
+    AND rd.is_active
     AND (doc_type IS NULL OR rd.document_type = doc_type)
     AND (
         rd.title ILIKE '%' || search_query || '%' OR 
@@ -194,7 +243,7 @@ SELECT
     MAX(rd.updated_at) as last_updated,
     COUNT(rc.id) as total_chunks
 FROM empresas e
-LEFT JOIN rag_documents rd ON e.id = rd.empresa_id
+LEFT JOIN rag_documents rd ON e.id = rd.empresa_id AND rd.is_active
 LEFT JOIN rag_chunks rc ON rd.id = rc.document_id
 GROUP BY e.id, e.nome;
 
@@ -240,5 +289,6 @@ WHERE NOT EXISTS (
 COMMENT ON TABLE rag_config_empresa IS 'Configurações RAG específicas por empresa';
 COMMENT ON TABLE rag_ingestion_jobs IS 'Jobs de ingestão de dados para RAG';
 COMMENT ON FUNCTION clean_empresa_rag_data IS 'Remove todos os dados RAG de uma empresa';
+COMMENT ON FUNCTION swap_empresa_rag_collection IS 'Troca atômica da collection sombra de reingestão';
 COMMENT ON FUNCTION search_similar_documents IS 'Busca documentos similares (compatível com/sem vector)';
 COMMENT ON VIEW rag_empresa_stats IS 'Estatísticas RAG por empresa';
\ No newline at end of file
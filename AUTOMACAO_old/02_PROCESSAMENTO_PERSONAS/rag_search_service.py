@@ -0,0 +1,365 @@
+"""
+VCM RAG Search Service
+Busca vetorial em processo, espelhando search_rag_chunks (rag_schema.sql)
+Índice por empresa em matriz NumPy contígua, memory-mapped do disco
+Cada build grava uma versão nova em diretório próprio, publicada pelo ponteiro CURRENT
+Author: VCM Team
+Date: November 2025
+"""
+
+import os
+import json
+import time
+import logging
+import asyncio
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Union
+
+import numpy as np
+
+from rag_ingestion_service import rag_service
+from rag_embedding_service import EMBEDDING_DIMENSION, create_embedding_backend
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Configuração do índice (configurável via .env)
+DEFAULT_INDEX_PATH = os.getenv('VCM_RAG_INDEX_PATH')
+DEFAULT_INDEX_TTL = float(os.getenv('VCM_RAG_INDEX_TTL', '300'))
+DEFAULT_IVF_MIN_VECTORS = int(os.getenv('VCM_RAG_IVF_MIN_VECTORS', '20000'))
+DEFAULT_IVF_NPROBE = int(os.getenv('VCM_RAG_IVF_NPROBE', '8'))
+
+# Arquivo com o nome do diretório da versão publicada do índice
+INDEX_POINTER = 'CURRENT'
+
+# Versões mais novas que isso não são removidas (podem ser builds em andamento de outro processo)
+INDEX_PRUNE_GRACE_SECONDS = 600
+
+class VectorIndex:
+    """
+    Índice vetorial de uma empresa
+    Linhas normalizadas (produto interno = similaridade de cosseno);
+    com IVF, as linhas ficam ordenadas por partição e cada partição é uma fatia contígua
+    """
+
+    def __init__(self, path: Path, matrix: np.ndarray, meta: Dict[str, Any],
+                 centroids: Optional[np.ndarray] = None,
+                 offsets: Optional[np.ndarray] = None):
+        self.path = path
+        self.matrix = matrix
+        self.meta = meta
+        self.centroids = centroids
+        self.offsets = offsets
+        self.loaded_at = time.time()
+
+    @property
+    def size(self) -> int:
+        return self.matrix.shape[0]
+
+    @classmethod
+    def build(cls, path: Path, rows: List[Dict[str, Any]], watermark: Optional[str],
+              ivf_min_vectors: int = DEFAULT_IVF_MIN_VECTORS) -> 'VectorIndex':
+        """
+        Grava o índice em disco a partir das linhas de chunks e o carrega (mmap)
+        Cada build vai para um diretório novo (arquivos memory-mapped nunca são
+        substituídos, o que falha no Windows) e só fica visível quando o ponteiro
+        CURRENT passa a apontar para ele: leitores veem a versão antiga ou a nova inteira
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        version = f"v{time.time_ns()}_{os.getpid()}"
+        version_path = path / version
+        version_path.mkdir()
+
+        matrix = np.zeros((len(rows), EMBEDDING_DIMENSION), dtype=np.float32)
+        for i, row in enumerate(rows):
+            matrix[i] = row['embedding']
+        _normalize_rows(matrix)
+
+        centroids = None
+        offsets = None
+        if len(rows) >= ivf_min_vectors:
+            n_lists = int(np.sqrt(len(rows)))
+            centroids, assignments = _kmeans(matrix, n_lists)
+            order = np.argsort(assignments, kind='stable')
+            matrix = matrix[order]
+            rows = [rows[i] for i in order]
+            offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1)).astype(np.int64)
+            np.save(version_path / 'ivf_centroids.npy', centroids)
+            np.save(version_path / 'ivf_offsets.npy', offsets)
+
+        np.save(version_path / 'embeddings.npy', matrix)
+
+        meta = {
+            'watermark': watermark,
+            'built_at': time.time(),
+            'chunk_ids': [row['id'] for row in rows],
+            'document_ids': [row['document_id'] for row in rows],
+            'document_titles': [row.get('document_title') for row in rows],
+            'contents': [row.get('content') for row in rows],
+            'metadata': [row.get('metadata') for row in rows]
+        }
+        with open(version_path / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        _publish_version(path, version)
+
+        logger.info(f"🗂️ Índice vetorial gravado: {len(rows)} vetores"
+                    f"{f', IVF com {len(centroids)} partições' if centroids is not None else ''}")
+
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['VectorIndex']:
+        """Carrega a versão publicada do índice (matriz memory-mapped) ou None se não existir"""
+        try:
+            version_path = path / (path / INDEX_POINTER).read_text(encoding='utf-8').strip()
+
+            matrix = np.load(version_path / 'embeddings.npy', mmap_mode='r')
+            with open(version_path / 'meta.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            centroids = None
+            offsets = None
+            if (version_path / 'ivf_centroids.npy').exists():
+                centroids = np.load(version_path / 'ivf_centroids.npy')
+                offsets = np.load(version_path / 'ivf_offsets.npy')
+        except FileNotFoundError:
+            # Sem índice publicado (ou versão removida por outro processo): reconstruir
+            return None
+
+        return cls(version_path, matrix, meta, centroids, offsets)
+
+    def search(self, query_vector: np.ndarray, similarity_threshold: float = 0.7,
+               max_results: int = 10, nprobe: int = DEFAULT_IVF_NPROBE) -> List[Dict[str, Any]]:
+        """Top-k por cosseno com similarity > similarity_threshold (mesma semântica do SQL)"""
+        if self.size == 0 or max_results <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        if self.centroids is not None:
+            probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+            rows = np.concatenate([
+                np.arange(self.offsets[p], self.offsets[p + 1]) for p in probes
+            ])
+            similarities = self.matrix[rows] @ query
+        else:
+            rows = None
+            similarities = self.matrix @ query
+
+        candidates = np.nonzero(similarities > similarity_threshold)[0]
+        if len(candidates) > max_results:
+            top = np.argpartition(similarities[candidates], -max_results)[-max_results:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(similarities[candidates])[::-1]]
+
+        results = []
+        for position in candidates:
+            i = int(rows[position]) if rows is not None else int(position)
+            results.append({
+                'chunk_id': self.meta['chunk_ids'][i],
+                'document_id': self.meta['document_ids'][i],
+                'document_title': self.meta['document_titles'][i],
+                'content': self.meta['contents'][i],
+                'similarity': float(similarities[position]),
+                'metadata': self.meta['metadata'][i]
+            })
+
+        return results
+
+class RAGSearchService:
+    """
+    Serviço de busca RAG sem round-trip ao banco por consulta
+    Índices são construídos a partir de rag_chunks/rag_documents, persistidos em disco
+    e revalidados contra o último job de ingestão concluído a cada `index_ttl` segundos
+    """
+
+    def __init__(self, supabase=None, index_path: Optional[str] = None,
+                 index_ttl: float = DEFAULT_INDEX_TTL):
+        self.supabase = supabase
+        self.index_path = Path(index_path or DEFAULT_INDEX_PATH
+                               or Path(__file__).parent.parent / '.cache' / 'rag_index')
+        self.index_ttl = index_ttl
+        self.embedding_backend = create_embedding_backend()
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def search(self, empresa_id: str, query: Union[str, List[float]],
+                     similarity_threshold: float = 0.7, max_results: int = 10,
+                     rebuild: bool = False) -> List[Dict[str, Any]]:
+        """Busca por texto (vetorizado pelo backend configurado) ou por vetor"""
+        index = await self.get_index(empresa_id, rebuild=rebuild)
+
+        if isinstance(query, str):
+            if not self.embedding_backend:
+                raise Exception("Nenhum backend de embedding configurado para consultas em texto")
+            query_vector = (await self.embedding_backend.embed([query]))[0]
+        else:
+            query_vector = np.asarray(query, dtype=np.float32)
+
+        return index.search(query_vector, similarity_threshold, max_results)
+
+    async def get_index(self, empresa_id: str, rebuild: bool = False) -> VectorIndex:
+        """Índice em memória, do disco ou reconstruído se desatualizado"""
+        # empresa_id vira nome de diretório: só UUIDs (nada de "../")
+        try:
+            empresa_id = str(uuid.UUID(str(empresa_id)))
+        except ValueError:
+            raise ValueError(f"empresa_id inválido: {empresa_id!r}")
+
+        lock = self._locks.setdefault(empresa_id, asyncio.Lock())
+
+        async with lock:
+            index = self._indexes.get(empresa_id)
+            if index and not rebuild and time.time() - index.loaded_at < self.index_ttl:
+                return index
+
+            watermark = await self._get_watermark(empresa_id)
+
+            if not index and not rebuild:
+                index = VectorIndex.load(self.index_path / empresa_id)
+
+            if rebuild or not index or index.meta.get('watermark') != watermark:
+                rows = await self._load_chunk_rows(empresa_id)
+                # Build (matriz, k-means, gravação) e limpeza fora do event loop da API
+                index = await asyncio.to_thread(VectorIndex.build, self.index_path / empresa_id, rows, watermark)
+                # A versão anterior deixa de ser referenciada (o mmap fecha quando a última
+                # busca em andamento terminar) e seu diretório é removido
+                self._indexes[empresa_id] = index
+                await asyncio.to_thread(_prune_versions, self.index_path / empresa_id, index.path.name)
+            else:
+                index.loaded_at = time.time()
+                self._indexes[empresa_id] = index
+
+            return index
+
+    async def _get_watermark(self, empresa_id: str) -> Optional[str]:
+        """Data do último job de ingestão concluído (versão do índice)"""
+        if not self.supabase:
+            raise Exception("Supabase não configurado")
+
+        result = await self.supabase.table('rag_ingestion_jobs')\
+            .select('completed_at')\
+            .eq('empresa_id', empresa_id)\
+            .eq('status', 'completed')\
+            .order('completed_at', desc=True)\
+            .limit(1)\
+            .execute()
+
+        return result.data[0]['completed_at'] if result.data else None
+
+    async def _load_chunk_rows(self, empresa_id: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """Chunks com embedding dos documentos ativos da empresa, com o título do documento"""
+        titles: Dict[str, str] = {}
+        start = 0
+        while True:
+            page = await self.supabase.table('rag_documents')\
+                .select('id, title')\
+                .eq('empresa_id', empresa_id)\
+                .eq('is_active', True)\
+                .order('id')\
+                .range(start, start + page_size - 1)\
+                .execute()
+            if not page.data:
+                break
+            for doc in page.data:
+                titles[doc['id']] = doc.get('title')
+            # Avança pelo que veio (max-rows do PostgREST pode devolver menos que page_size)
+            start += len(page.data)
+
+        rows = []
+        document_ids = list(titles.keys())
+        for i in range(0, len(document_ids), 100):
+            batch_ids = document_ids[i:i + 100]
+            start = 0
+            while True:
+                page = await self.supabase.table('rag_chunks')\
+                    .select('id, document_id, content, metadata, embedding')\
+                    .in_('document_id', batch_ids)\
+                    .order('id')\
+                    .range(start, start + page_size - 1)\
+                    .execute()
+                if not page.data:
+                    break
+                for chunk in page.data:
+                    embedding = chunk.get('embedding')
+                    if not embedding:
+                        continue
+                    if isinstance(embedding, str):
+                        embedding = json.loads(embedding)
+                    chunk['embedding'] = embedding
+                    chunk['document_title'] = titles.get(chunk['document_id'])
+                    rows.append(chunk)
+                start += len(page.data)
+
+        return rows
+
+def _normalize_rows(matrix: np.ndarray):
+    """Normalização L2 por linha, no lugar"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+
+def _publish_version(path: Path, version: str):
+    """Aponta CURRENT para a versão (substituição atômica do ponteiro, nunca mapeado)"""
+    tmp_path = path / f"{INDEX_POINTER}.{os.getpid()}.tmp"
+    tmp_path.write_text(version, encoding='utf-8')
+    os.replace(tmp_path, path / INDEX_POINTER)
+
+def _prune_versions(path: Path, keep: str):
+    """
+    Remove versões antigas do índice (e arquivos do layout anterior, sem versão)
+    No Windows, versões ainda mapeadas por outro processo ficam para a próxima limpeza
+    """
+    now = time.time()
+    for child in path.iterdir():
+        if child.name in (keep, INDEX_POINTER) or child.name.endswith('.tmp'):
+            continue
+        try:
+            if now - child.stat().st_mtime < INDEX_PRUNE_GRACE_SECONDS:
+                continue
+            if child.is_dir():
+                shutil.rmtree(child)
+            else:
+                child.unlink()
+        except OSError as e:
+            logger.debug(f"Versão do índice ainda em uso, removida depois: {child} ({e})")
+
+def _kmeans(matrix: np.ndarray, n_lists: int, iterations: int = 10,
+            sample_size: int = 50000, seed: int = 42):
+    """K-means esférico simples para as partições IVF"""
+    rng = np.random.default_rng(seed)
+    sample = matrix[rng.choice(len(matrix), min(sample_size, len(matrix)), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for k in range(n_lists):
+            members = sample[assignments == k]
+            if len(members):
+                centroids[k] = members.sum(axis=0)
+        _normalize_rows(centroids)
+
+    assignments = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), 10000):
+        block = matrix[start:start + 10000]
+        assignments[start:start + 10000] = np.argmax(block @ centroids.T, axis=1)
+
+    return centroids, assignments
+
+# Instância global (compartilha o cliente Supabase da ingestão)
+rag_search_service = RAGSearchService(rag_service.supabase)
+
+# Funções de conveniência
+async def search_rag(empresa_id: str, query: Union[str, List[float]],
+                     similarity_threshold: float = 0.7, max_results: int = 10,
+                     rebuild: bool = False) -> List[Dict[str, Any]]:
+    """Função de conveniência para busca RAG"""
+    return await rag_search_service.search(empresa_id, query, similarity_threshold,
+                                           max_results, rebuild)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+🏷️ TASK CLASSIFIER
+==================
+
+Classificação de tarefas por palavras-chave do Script 4 (origem, processamento,
+destino, ferramentas e critérios de validação).
+
+- Regras em task_rules.json (estender sem editar código; VCM_TASK_RULES aponta outro arquivo)
+- Todas as palavras-chave compiladas uma vez em uma única regex em forma de trie
+- Cada tarefa é classificada em uma passada; classify_batch classifica um lote inteiro
+  (ex.: todas as tarefas da empresa) em uma única varredura
+
+Semântica idêntica a `keyword in task.lower()` para cada regra.
+
+Versão: 1.0.0
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+import os
+import re
+import json
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+RULES_PATH = Path(os.getenv('VCM_TASK_RULES', str(Path(__file__).parent / "task_rules.json")))
+
+# Tarefas classificadas mantidas em memória (templates repetem as mesmas tarefas entre personas)
+CLASSIFY_CACHE_MAX = 4096
+
+# Separador do lote: nenhuma palavra-chave o contém, então nenhum casamento cruza tarefas
+BATCH_SEPARATOR = "\x00"
+
+def _trie_pattern(node: Dict) -> str:
+    """Regex de uma trie: ramos por caractere, terminais opcionais gulosos (casa a palavra mais longa)"""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+
+    body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if '' in node:
+        body = f"(?:{body})?" if len(branches) == 1 else f"{body}?"
+    return body
+
+class KeywordMatcher:
+    """
+    Autômato de palavras-chave sobre uma regex única
+    Em cada posição casa a palavra mais longa; as palavras contidas nela herdam o casamento
+    """
+
+    def __init__(self, keyword_ids: Dict[str, Iterable[int]]):
+        keywords = {keyword: set(ids) for keyword, ids in keyword_ids.items()
+                    if keyword and BATCH_SEPARATOR not in keyword}
+
+        # Fecho: a palavra mais longa também reporta os ids das palavras que contém
+        self.keyword_ids: Dict[str, Set[int]] = {
+            keyword: set().union(*(ids for other, ids in keywords.items() if other in keyword))
+            for keyword in keywords
+        }
+
+        trie: Dict = {}
+        for keyword in self.keyword_ids:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        self.pattern = re.compile(f"(?=({_trie_pattern(trie)}))") if trie else None
+
+    def match(self, text: str) -> Set[int]:
+        """Ids das palavras-chave contidas no texto (já em minúsculas)"""
+        matched: Set[int] = set()
+        if self.pattern:
+            for found in self.pattern.finditer(text):
+                matched |= self.keyword_ids[found.group(1)]
+        return matched
+
+    def match_batch(self, texts: List[str]) -> List[Set[int]]:
+        """match() de vários textos em uma única varredura"""
+        matched: List[Set[int]] = [set() for _ in texts]
+        if not self.pattern or not texts:
+            return matched
+
+        starts, offset = [], 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(BATCH_SEPARATOR)
+
+        for found in self.pattern.finditer(BATCH_SEPARATOR.join(texts)):
+            matched[bisect_right(starts, found.start()) - 1] |= self.keyword_ids[found.group(1)]
+        return matched
+
+class TaskClassifier:
+    """
+    Regras de task_rules.json compiladas em um único KeywordMatcher
+    Os resultados são compartilhados pelo cache: quem os recebe não deve modificá-los
+    """
+
+    def __init__(self, rules: Dict):
+        self.version = rules.get("version")
+        self.dimensions: Dict[str, Dict] = {}
+        keyword_ids: Dict[str, Set[int]] = {}
+
+        rule_id = 0
+        for name, dimension in rules["dimensions"].items():
+            labels = []
+            for rule in dimension.get("rules", []):
+                labels.append((rule_id, rule["label"]))
+                for keyword in rule["keywords"]:
+                    keyword_ids.setdefault(keyword.lower(), set()).add(rule_id)
+                rule_id += 1
+
+            self.dimensions[name] = {
+                "rules": labels,
+                "default": list(dimension.get("default", [])),
+                "always": list(dimension.get("always", []))
+            }
+
+        self.matcher = KeywordMatcher(keyword_ids)
+        self._cache: Dict[str, Dict[str, List[str]]] = {}
+
+    @classmethod
+    def from_file(cls, rules_path: Path = RULES_PATH) -> "TaskClassifier":
+        """Carrega as regras do arquivo de dados"""
+        with open(rules_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def classify(self, task: str) -> Dict[str, List[str]]:
+        """Rótulos de cada dimensão para a tarefa, na ordem das regras"""
+        return self.classify_batch([task])[0]
+
+    def classify_batch(self, tasks: Iterable[str]) -> List[Dict[str, List[str]]]:
+        """Classifica um lote de tarefas; as ainda não vistas são varridas juntas"""
+        lowered = [task.lower() for task in tasks]
+        pending = list(dict.fromkeys(text for text in lowered if text not in self._cache))
+
+        if pending:
+            if len(self._cache) + len(pending) > CLASSIFY_CACHE_MAX:
+                self._cache.clear()
+            for text, matched in zip(pending, self.matcher.match_batch(pending)):
+                self._cache[text] = self._labels(matched)
+
+        return [self._cache[text] for text in lowered]
+
+    def _labels(self, matched: Set[int]) -> Dict[str, List[str]]:
+        classification = {}
+        for name, dimension in self.dimensions.items():
+            labels = [label for rule_id, label in dimension["rules"] if rule_id in matched]
+            classification[name] = dimension["always"] + (labels or dimension["default"])
+        return classification
+
+# Instância global (regras compiladas uma vez por processo)
+_task_classifier: Optional[TaskClassifier] = None
+
+def get_task_classifier() -> TaskClassifier:
+    """Classificador compartilhado do processo"""
+    global _task_classifier
+    if _task_classifier is None:
+        _task_classifier = TaskClassifier.from_file()
+    return _task_classifier
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+TESTE - BuildGraph (build_graph.py)
+Persona atualizada é pulada; biografia, saída ou gerador alterados reconstroem
+o script e os scripts que dependem dele
+
+Executar: python test_build_graph.py  (ou pytest)
+"""
+
+import tempfile
+from pathlib import Path
+
+from build_graph import BuildGraph, STAGES, STAGE_SOURCES
+
+ALL_STAGES = [1, 2, 3, 4, 5]
+
+def _make_build(root: Path):
+    """Geradores falsos e uma persona com todas as saídas registradas no manifesto"""
+    generators = root / "scripts"
+    generators.mkdir()
+    sources = {}
+    for stage in ALL_STAGES:
+        sources[stage] = generators / f"0{stage}_generate.py"
+        sources[stage].write_text(f"# gerador {stage}\n", encoding='utf-8')
+        for name in STAGE_SOURCES[stage]:
+            (generators / name).write_text(f"# {name}\n", encoding='utf-8')
+
+    persona_dir = root / "personas" / "Ana_Silva"
+    persona_dir.mkdir(parents=True)
+    (persona_dir / "Ana_Silva_bio.md").write_text("**Nome:** Ana Silva\n", encoding='utf-8')
+
+    graph = BuildGraph(sources)
+    for stage in ALL_STAGES:
+        for output in STAGES[stage][2](persona_dir):
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(f"saída do script {stage}: {output.name}\n", encoding='utf-8')
+        graph.record(stage, persona_dir)
+
+    return sources, persona_dir
+
+def test_fresh_persona_is_skipped(tmp_path):
+    """Nada mudou desde o último build: nenhum script reconstrói a persona"""
+    sources, persona_dir = _make_build(tmp_path)
+    graph = BuildGraph(sources)
+
+    assert graph.stale_stages(persona_dir, ALL_STAGES) == {}
+    assert all(graph.is_fresh(stage, persona_dir) for stage in ALL_STAGES)
+
+def test_edited_bio_rebuilds_dependent_stages(tmp_path):
+    """Biografia editada: scripts 1, 2 e 3 pela entrada, 4 e 5 pela dependência"""
+    sources, persona_dir = _make_build(tmp_path)
+    (persona_dir / "Ana_Silva_bio.md").write_text("**Nome:** Ana Silva Costa\n", encoding='utf-8')
+
+    stale = BuildGraph(sources).stale_stages(persona_dir, ALL_STAGES)
+
+    assert stale == {
+        1: "entrada alterada: Ana_Silva_bio.md",
+        2: "script 1 reconstruído",
+        3: "script 1 reconstruído",
+        4: "script 1 reconstruído",
+        5: "script 1 reconstruído",
+    }
+
+def test_edited_output_is_rebuilt(tmp_path):
+    """Saída editada à mão: o script volta a gerá-la, e os dependentes também"""
+    sources, persona_dir = _make_build(tmp_path)
+    (persona_dir / "script4_tasktodo" / "tasktodo.md").write_text("editado\n", encoding='utf-8')
+
+    stale = BuildGraph(sources).stale_stages(persona_dir, ALL_STAGES)
+
+    assert stale == {4: "saída modificada: script4_tasktodo/tasktodo.md", 5: "script 4 reconstruído"}
+
+def test_missing_output_is_rebuilt(tmp_path):
+    """Saída apagada: só o script que a gera reconstrói a persona"""
+    sources, persona_dir = _make_build(tmp_path)
+    (persona_dir / "rag" / "context_rules.md").unlink()
+
+    assert BuildGraph(sources).stale_stages(persona_dir, ALL_STAGES) == {3: "saída ausente"}
+
+def test_generator_change_rebuilds(tmp_path):
+    """Código do gerador ou de um arquivo auxiliar alterado invalida o build"""
+    sources, persona_dir = _make_build(tmp_path)
+    with open(sources[5], 'a', encoding='utf-8') as f:
+        f.write("# nova regra\n")
+
+    assert BuildGraph(sources).stale_stages(persona_dir, ALL_STAGES) == {5: "gerador alterado"}
+
+    with open(sources[4].parent / "task_rules.json", 'a', encoding='utf-8') as f:
+        f.write("\n")
+
+    assert BuildGraph(sources).stale_stages(persona_dir, ALL_STAGES) == {
+        4: "gerador alterado",
+        5: "script 4 reconstruído",
+    }
+
+def test_force_rebuilds_everything(tmp_path):
+    """force=True ignora o manifesto"""
+    sources, persona_dir = _make_build(tmp_path)
+
+    stale = BuildGraph(sources, force=True).stale_stages(persona_dir, ALL_STAGES)
+
+    assert stale == {1: "forçado", 2: "script 1 reconstruído", 3: "script 1 reconstruído",
+                     4: "script 1 reconstruído", 5: "script 1 reconstruído"}
+
+if __name__ == "__main__":
+    for test in (test_fresh_persona_is_skipped,
+                 test_edited_bio_rebuilds_dependent_stages,
+                 test_edited_output_is_rebuilt,
+                 test_missing_output_is_rebuilt,
+                 test_generator_change_rebuilds,
+                 test_force_rebuilds_everything):
+        test(Path(tempfile.mkdtemp()))
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+TESTE - BulkWriter da ingestão RAG
+Fases concorrentes escrevendo no mesmo writer: nenhum chunk pode ser enviado
+antes do documento pai (FK rag_chunks.document_id -> rag_documents.id)
+
+Executar: python test_rag_bulk_writer.py  (ou pytest)
+"""
+
+import asyncio
+import uuid
+
+from rag_ingestion_service import BulkWriter, CURRENT_PHASE
+
+class FKEnforcingSupabase:
+    """Cliente falso: insert com latência de rede e FK de rag_chunks verificada"""
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self.tables = {'rag_documents': [], 'rag_chunks': []}
+
+    def table(self, name):
+        return _FakeInsert(self, name)
+
+class _FakeInsert:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.rows = []
+
+    def insert(self, rows):
+        self.rows = rows
+        return self
+
+    async def execute(self):
+        # Verificação do FK no momento em que o servidor recebe o lote
+        if self.table == 'rag_chunks':
+            document_ids = {doc['id'] for doc in self.db.tables['rag_documents']}
+            orphans = [row for row in self.rows if row['document_id'] not in document_ids]
+            if orphans:
+                raise Exception(f"violates foreign key constraint: {len(orphans)} chunks sem documento")
+
+        await asyncio.sleep(self.db.latency)
+        self.db.tables[self.table].extend(self.rows)
+
+async def _run_phase(writer: BulkWriter, name: str, documents: int, chunks_per_document: int):
+    token = CURRENT_PHASE.set(name)
+    try:
+        for _ in range(documents):
+            document_id = str(uuid.uuid4())
+            await writer.add('rag_documents', {'id': document_id, 'phase': name})
+            for index in range(chunks_per_document):
+                await writer.add('rag_chunks', {'id': str(uuid.uuid4()), 'document_id': document_id,
+                                                'chunk_index': index})
+                # Cede o event loop entre chunks, como a geração real de chunks/embeddings
+                await asyncio.sleep(0)
+    finally:
+        CURRENT_PHASE.reset(token)
+
+def test_concurrent_phases_never_send_orphan_chunks():
+    """Fases intercaladas: todo chunk é gravado depois do seu documento"""
+
+    async def scenario():
+        db = FKEnforcingSupabase()
+        writer = BulkWriter(db, batch_size=10, max_retries=3, retry_delay=0)
+
+        await asyncio.gather(*[
+            _run_phase(writer, f"fase_{n}", documents=20, chunks_per_document=3)
+            for n in range(3)
+        ])
+        await writer.flush()
+        return db, writer
+
+    db, writer = asyncio.run(scenario())
+
+    assert writer.stats['failed_rows'] == 0, writer.errors
+    assert len(db.tables['rag_documents']) == 60
+    assert len(db.tables['rag_chunks']) == 180
+    assert all(writer.failed_documents(f"fase_{n}") == 0 for n in range(3))
+
+def test_flush_writes_documents_before_chunks():
+    """flush() de uma tabela dependente grava antes os documentos pendentes"""
+
+    async def scenario():
+        db = FKEnforcingSupabase(latency=0)
+        writer = BulkWriter(db, batch_size=100, retry_delay=0)
+        await writer.add('rag_documents', {'id': 'doc-1'})
+        await writer.add('rag_chunks', {'id': 'chunk-1', 'document_id': 'doc-1'})
+        await writer.flush('rag_chunks')
+        return db, writer
+
+    db, writer = asyncio.run(scenario())
+
+    assert writer.stats['failed_rows'] == 0, writer.errors
+    assert [row['id'] for row in db.tables['rag_chunks']] == ['chunk-1']
+
+if __name__ == "__main__":
+    for test in (test_concurrent_phases_never_send_orphan_chunks,
+                 test_flush_writes_documents_before_chunks):
+        test()
+        print(f"✅ {test.__name__}")
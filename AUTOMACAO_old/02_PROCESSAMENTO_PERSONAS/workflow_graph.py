@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+🕸️ WORKFLOW GRAPH
+=================
+
+Grafo interno dos workflows N8N do Script 5.
+
+- Nós indexados por id (dict na ordem de inserção) e IDs compactos determinísticos
+  por workflow (node_1, node_2, ...): a mesma persona gera sempre os mesmos IDs
+- Conexões em lista de adjacência por nó de origem: inserção O(1)
+- validate(): nós órfãos, ciclos, nós inalcançáveis e conexões pendentes em tempo linear
+- to_n8n(): serialização para o JSON do N8N em uma única passada
+
+Versão: 1.0.0
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+# Conexão: (nó de destino, saída da origem, entrada do destino)
+Edge = Tuple[str, int, int]
+
+class WorkflowGraph:
+    """
+    Workflow N8N como grafo dirigido
+    Os nós são os dicts do N8N; as conexões só viram JSON em to_n8n()
+    """
+
+    def __init__(self, name: str, **properties: Any):
+        self.name = name
+        self.properties = properties
+        self.nodes: Dict[str, Dict] = {}
+        self.adjacency: Dict[str, List[Edge]] = {}
+        self.edge_count = 0
+        self._next_id = 0
+
+    @classmethod
+    def from_n8n(cls, workflow: Dict) -> "WorkflowGraph":
+        """Reconstrói o grafo a partir do JSON do N8N (ex.: workflow lido do disco)"""
+        properties = {key: value for key, value in workflow.items() if key not in ("name", "nodes", "connections")}
+        graph = cls(workflow.get("name", ""), **properties)
+        for node in workflow.get("nodes", []):
+            graph.add_node(node)
+        for source_id, outputs in workflow.get("connections", {}).items():
+            for output_index, targets in enumerate(outputs.get("main", [])):
+                for target in targets:
+                    graph.connect(source_id, target["node"], output_index, target.get("index", 0))
+        return graph
+
+    def new_id(self) -> str:
+        """Próximo ID compacto do workflow"""
+        self._next_id += 1
+        return f"node_{self._next_id}"
+
+    def add_node(self, node: Dict) -> str:
+        """Adiciona o nó (gera o id se ausente); ids repetidos são rejeitados"""
+        if "id" not in node:
+            node["id"] = self.new_id()
+        node_id = node["id"]
+        if node_id in self.nodes:
+            raise ValueError(f"Nó duplicado no workflow {self.name}: {node_id}")
+        self.nodes[node_id] = node
+        return node_id
+
+    def add_nodes(self, nodes: List[Dict]) -> List[str]:
+        return [self.add_node(node) for node in nodes]
+
+    def connect(self, source_id: str, target_id: str, output_index: int = 0, input_index: int = 0):
+        """Conexão source -> target em O(1); nós inexistentes são apontados por validate()"""
+        self.adjacency.setdefault(source_id, []).append((target_id, output_index, input_index))
+        self.edge_count += 1
+
+    def chain(self, node_ids: List[str]):
+        """Conecta os nós em sequência"""
+        for source_id, target_id in zip(node_ids, node_ids[1:]):
+            self.connect(source_id, target_id)
+
+    def validate(self) -> Dict[str, List]:
+        """
+        Validação estrutural em O(nós + conexões)
+        - dangling: conexões com origem ou destino inexistente
+        - orphans: nós sem nenhuma conexão (em workflows com mais de um nó)
+        - unreachable: nós conectados que não são alcançados a partir dos nós de entrada
+        - cycles: nós que participam de ciclos (sobram na ordenação topológica)
+        """
+        dangling = []
+        successors: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        in_degree = dict.fromkeys(self.nodes, 0)
+
+        for source_id, edges in self.adjacency.items():
+            for target_id, _, _ in edges:
+                if source_id not in self.nodes or target_id not in self.nodes:
+                    dangling.append({"source": source_id, "target": target_id})
+                    continue
+                successors[source_id].append(target_id)
+                in_degree[target_id] += 1
+
+        connected = {node_id for node_id, targets in successors.items() if targets}
+        connected.update(node_id for node_id, degree in in_degree.items() if degree)
+        orphans = [node_id for node_id in self.nodes if node_id not in connected] if len(self.nodes) > 1 else []
+        entries = [node_id for node_id in self.nodes if node_id in connected and not in_degree[node_id]]
+
+        # Alcance a partir dos nós de entrada (BFS)
+        reached = set(entries)
+        queue = deque(entries)
+        while queue:
+            for target_id in successors[queue.popleft()]:
+                if target_id not in reached:
+                    reached.add(target_id)
+                    queue.append(target_id)
+        unreachable = [node_id for node_id in self.nodes if node_id in connected and node_id not in reached]
+
+        # Ciclos (Kahn): nós que nunca chegam a grau de entrada zero
+        remaining = dict(in_degree)
+        queue = deque(node_id for node_id, degree in remaining.items() if not degree)
+        while queue:
+            for target_id in successors[queue.popleft()]:
+                remaining[target_id] -= 1
+                if not remaining[target_id]:
+                    queue.append(target_id)
+        cycles = [node_id for node_id, degree in remaining.items() if degree]
+
+        return {
+            "entry_nodes": entries,
+            "orphans": orphans,
+            "unreachable": unreachable,
+            "cycles": cycles,
+            "dangling": dangling
+        }
+
+    def to_n8n(self) -> Dict:
+        """JSON do N8N: nós na ordem de inserção, conexões agrupadas por origem e saída"""
+        connections: Dict[str, Dict[str, List[List[Dict]]]] = {}
+        for source_id, edges in self.adjacency.items():
+            outputs: List[List[Dict]] = []
+            for target_id, output_index, input_index in edges:
+                while len(outputs) <= output_index:
+                    outputs.append([])
+                outputs[output_index].append({"node": target_id, "type": "main", "index": input_index})
+            connections[source_id] = {"main": outputs}
+
+        return {
+            "name": self.name,
+            "nodes": list(self.nodes.values()),
+            "connections": connections,
+            **self.properties
+        }
@@ -30,6 +30,9 @@ from pathlib import Path
 import logging
 from datetime import datetime
 
+from vcm_database_strategy import VCMDatabaseManager
+from pipeline_runner import PipelineRunner
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -45,6 +48,14 @@ except ImportError as e:
     logger.warning(f"⚠️ RAG service não disponível: {e}")
     RAG_AVAILABLE = False
 
+# Import RAG search (busca vetorial em processo, requer numpy)
+try:
+    from rag_search_service import search_rag
+    RAG_SEARCH_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"⚠️ RAG search não disponível: {e}")
+    RAG_SEARCH_AVAILABLE = False
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -82,6 +93,7 @@ class BiografiaGenerationRequest(BaseModel):
 class CascadeScriptRequest(BaseModel):
     empresa_codigo: str
     force_regenerate: Optional[bool] = False
+    dry_run: Optional[bool] = False
 
 class ScriptResponse(BaseModel):
     success: bool
@@ -100,6 +112,16 @@ SCRIPT_PATHS = {
     "fluxos": AUTOMACAO_DIR / "02_PROCESSAMENTO_PERSONAS" / "04_generate_fluxos_analise.py",
     "workflows": AUTOMACAO_DIR / "02_PROCESSAMENTO_PERSONAS" / "05_generate_workflows_n8n.py",
 }
+CASCADE_SCRIPTS = {
+    1: "competencias",
+    2: "tech_specs",
+    3: "rag",
+    4: "fluxos",
+    5: "workflows"
+}
+
+# Scripts da cascata em pool de processos aquecido (subprocesso como fallback)
+pipeline_runner = PipelineRunner({num: SCRIPT_PATHS[key] for num, key in CASCADE_SCRIPTS.items()})
 
 # ========================================
 # 🏥 HEALTH CHECK ENDPOINTS
@@ -228,35 +250,35 @@ async def execute_cascade_script(script_number: int, request: CascadeScriptReque
     """
     Executa um script específico da cascata (1-5)
     """
-    if script_number not in [1, 2, 3, 4, 5]:
+    if script_number not in CASCADE_SCRIPTS:
         raise HTTPException(status_code=400, detail="Número do script deve ser entre 1 e 5")
     
-    script_map = {
-        1: "competencias",
-        2: "tech_specs", 
-        3: "rag",
-        4: "fluxos",
-        5: "workflows"
-    }
-    
     try:
-        script_key = script_map[script_number]
-        script_path = SCRIPT_PATHS[script_key]
+        script_key = CASCADE_SCRIPTS[script_number]
         
-        args = ["--empresa-codigo", request.empresa_codigo]
-        if request.force_regenerate:
-            args.extend(["--force-regenerate"])
+        # Dry-run: só lista as personas que seriam reprocessadas
+        if request.dry_run:
+            plan = await pipeline_runner.plan(AUTOMACAO_DIR, [script_number], force=request.force_regenerate)
+            return ScriptResponse(
+                success=True,
+                message=f"Dry-run do script {script_number}",
+                data=plan
+            )
         
-        result = run_python_script(script_path, args)
+        result = await pipeline_runner.run_stage(script_number, AUTOMACAO_DIR,
+                                                 empresa_id=request.empresa_codigo,
+                                                 force=request.force_regenerate)
         
-        if result["success"]:
+        if result["status"] == "success":
             return ScriptResponse(
                 success=True,
                 message=f"Script {script_number} executado com sucesso",
                 data={
                     "script_number": script_number,
                     "script_name": script_key,
-                    "empresa_codigo": request.empresa_codigo
+                    "empresa_codigo": request.empresa_codigo,
+                    "mode": result.get("mode"),
+                    "results": result.get("results")
                 },
                 output=result["output"]
             )
@@ -282,36 +304,39 @@ async def execute_full_cascade(request: CascadeScriptRequest, background_tasks:
     Executa toda a cascata de scripts (1-5) em sequência
     """
     try:
+        if request.dry_run:
+            plan = await pipeline_runner.plan(AUTOMACAO_DIR, list(CASCADE_SCRIPTS),
+                                              force=request.force_regenerate)
+            return ScriptResponse(
+                success=True,
+                message="Dry-run da cascata completa",
+                data=plan
+            )
+        
+        logger.info(f"Executando cascata 1-5 ({pipeline_runner.mode})")
+        
+        # Contexto em memória repassado entre os scripts pelo runner
+        # Personas sem alterações são puladas (force_regenerate reprocessa todas)
+        stage_results = await pipeline_runner.run_pipeline(
+            AUTOMACAO_DIR, list(CASCADE_SCRIPTS), empresa_id=request.empresa_codigo,
+            force=request.force_regenerate
+        )
+        
         results = []
-        for script_num in [1, 2, 3, 4, 5]:
-            script_map = {
-                1: "competencias",
-                2: "tech_specs",
-                3: "rag", 
-                4: "fluxos",
-                5: "workflows"
-            }
-            
-            script_key = script_map[script_num]
-            script_path = SCRIPT_PATHS[script_key]
-            
-            logger.info(f"Executando script {script_num}: {script_key}")
-            
-            args = ["--empresa-codigo", request.empresa_codigo]
-            if request.force_regenerate:
-                args.extend(["--force-regenerate"])
-            
-            result = run_python_script(script_path, args)
+        for result in stage_results:
+            script_num = result["script"]
             results.append({
                 "script_number": script_num,
-                "script_name": script_key,
-                "success": result["success"],
+                "script_name": CASCADE_SCRIPTS[script_num],
+                "success": result["status"] == "success",
                 "output": result.get("output", ""),
-                "error": result.get("error")
+                "error": result.get("error"),
+                "execution_time": result.get("execution_time"),
+                "personas": result.get("results")
             })
             
             # Se um script falha, para a execução
-            if not result["success"]:
+            if result["status"] != "success":
                 return ScriptResponse(
                     success=False,
                     message=f"Cascata interrompida no script {script_num}",
@@ -443,6 +468,16 @@ async def list_script_outputs(empresa_codigo: str):
 class RAGRequest(BaseModel):
     empresa_id: str
     force_update: Optional[bool] = False
+    incremental: Optional[bool] = False
+    concurrent: Optional[bool] = False
+
+class RAGSearchRequest(BaseModel):
+    empresa_id: str
+    query: Optional[str] = None
+    query_embedding: Optional[List[float]] = None
+    similarity_threshold: Optional[float] = 0.7
+    max_results: Optional[int] = 10
+    rebuild_index: Optional[bool] = False
 
 class RAGResponse(BaseModel):
     success: bool
@@ -468,21 +503,17 @@ async def ingest_rag_data(request: RAGRequest, background_tasks: BackgroundTasks
                 error="RAG service não está carregado"
             )
         
-        # Executar ingestão em background
-        def run_rag_ingestion():
+        # Executar ingestão em background (no próprio event loop, I/O assíncrono)
+        async def run_rag_ingestion():
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(
-                    ingest_empresa_rag(request.empresa_id, request.force_update)
-                )
+                result = await ingest_empresa_rag(request.empresa_id, request.force_update,
+                                                  incremental=request.incremental,
+                                                  concurrent=request.concurrent)
                 logger.info(f"✅ Ingestão RAG concluída: {result}")
                 return result
             except Exception as e:
                 logger.error(f"❌ Erro na ingestão RAG: {e}")
                 raise e
-            finally:
-                loop.close()
         
         # Executar em background
         background_tasks.add_task(run_rag_ingestion)
@@ -493,6 +524,8 @@ async def ingest_rag_data(request: RAGRequest, background_tasks: BackgroundTasks
             data={
                 "empresa_id": request.empresa_id,
                 "force_update": request.force_update,
+                "incremental": request.incremental,
+                "concurrent": request.concurrent,
                 "status": "started"
             }
         )
@@ -524,7 +557,7 @@ async def get_rag_status_endpoint(empresa_id: str):
             )
         
         # Obter status RAG
-        status_data = get_rag_status(empresa_id)
+        status_data = await get_rag_status(empresa_id)
         
         if 'error' in status_data:
             return RAGResponse(
@@ -569,7 +602,9 @@ async def ingest_rag_data_sync(request: RAGRequest):
             )
         
         # Executar ingestão síncrona
-        result = await ingest_empresa_rag(request.empresa_id, request.force_update)
+        result = await ingest_empresa_rag(request.empresa_id, request.force_update,
+                                          incremental=request.incremental,
+                                          concurrent=request.concurrent)
         
         return RAGResponse(
             success=True,
@@ -585,6 +620,72 @@ async def ingest_rag_data_sync(request: RAGRequest):
             error=str(e)
         )
 
+@app.post("/api/rag/search", response_model=RAGResponse)
+async def search_rag_endpoint(request: RAGSearchRequest):
+    """
+    🔍 Buscar chunks RAG por similaridade
+    
+    Mesma semântica de search_rag_chunks, mas executada em processo
+    sobre o índice vetorial local da empresa (sem round-trip por consulta).
+    """
+    try:
+        if not RAG_SEARCH_AVAILABLE:
+            return RAGResponse(
+                success=False,
+                message="Busca RAG não disponível",
+                error="RAG search service não está carregado"
+            )
+        
+        query = request.query_embedding if request.query_embedding else request.query
+        if not query:
+            return RAGResponse(
+                success=False,
+                message="Consulta vazia",
+                error="Informe query ou query_embedding"
+            )
+        
+        results = await search_rag(request.empresa_id, query,
+                                   similarity_threshold=request.similarity_threshold,
+                                   max_results=request.max_results,
+                                   rebuild=request.rebuild_index)
+        
+        return RAGResponse(
+            success=True,
+            message=f"{len(results)} resultados encontrados",
+            data={
+                "empresa_id": request.empresa_id,
+                "results": results
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Erro em search_rag_endpoint: {str(e)}")
+        return RAGResponse(
+            success=False,
+            message="Erro na busca RAG",
+            error=str(e)
+        )
+
+@app.on_event("startup")
+async def start_client_registry():
+    """Inicia a verificação de saúde/expiração dos clientes de banco compartilhados"""
+    VCMDatabaseManager.clients.start()
+
+@app.on_event("startup")
+async def start_pipeline_runner():
+    """Aquece o pool da cascata (geradores importados antes da primeira requisição)"""
+    await pipeline_runner.start()
+
+@app.on_event("shutdown")
+async def shutdown_rag_client():
+    """Fecha os pools de conexões PostgREST (compartilhados pelo registro)"""
+    await VCMDatabaseManager.clients.close()
+
+@app.on_event("shutdown")
+async def shutdown_pipeline_runner():
+    """Encerra o pool da cascata"""
+    await pipeline_runner.stop()
+
 @app.get("/api/rag/health")
 async def rag_health_check():
     """
@@ -603,6 +704,7 @@ async def rag_health_check():
                 from rag_ingestion_service import rag_service
                 has_supabase = rag_service.supabase is not None
                 health_status["supabase_connected"] = has_supabase
+                health_status["database_clients"] = VCMDatabaseManager.clients.get_stats()
                 health_status["status"] = "healthy" if has_supabase else "supabase_disconnected"
             except Exception as e:
                 health_status["supabase_connected"] = False
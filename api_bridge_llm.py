@@ -30,6 +30,8 @@ from pathlib import Path
 import logging
 from datetime import datetime
 
+from pipeline_runner import PipelineRunner
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -53,8 +55,9 @@ app.add_middleware(
 # Import dos serviços LLM (com fallback para scripts antigos)
 try:
     sys.path.append(str(Path(__file__).parent / "AUTOMACAO" / "02_PROCESSAMENTO_PERSONAS"))
-    from llm_service import LLMService, ContentType, get_cost_summary
+    from llm_service import LLMService, ContentType, get_cost_summary, get_cache_stats
     from avatar_service import generate_avatar_for_persona, get_avatar_cost_summary
+    from http_session_service import close_http_sessions
     import importlib.util
     
     # Import dinâmico do script com número no nome
@@ -111,6 +114,7 @@ class CostSummaryResponse(BaseModel):
     llm_cost: Dict[str, Any]
     avatar_cost: Dict[str, Any]
     total_cost: float
+    cache: Optional[Dict[str, Any]] = None
 
 # Configurações
 AUTOMACAO_DIR = Path(__file__).parent / "AUTOMACAO"
@@ -126,6 +130,10 @@ SCRIPT_PATHS = {
     "fluxos": AUTOMACAO_DIR / "02_PROCESSAMENTO_PERSONAS" / "04_generate_fluxos_analise.py",
     "workflows": AUTOMACAO_DIR / "02_PROCESSAMENTO_PERSONAS" / "05_generate_workflows_n8n.py",
 }
+CASCADE_SCRIPTS = ["competencias", "tech_specs", "rag", "fluxos", "workflows"]
+
+# Cascata legada em pool de processos aquecido (subprocesso como fallback)
+pipeline_runner = PipelineRunner({num: SCRIPT_PATHS[key] for num, key in enumerate(CASCADE_SCRIPTS, start=1)})
 
 def run_python_script(script_path: Path, args: List[str] = None) -> Dict[str, Any]:
     """
@@ -390,7 +398,8 @@ async def get_costs():
     return CostSummaryResponse(
         llm_cost=llm_cost,
         avatar_cost=avatar_cost,
-        total_cost=total_cost
+        total_cost=total_cost,
+        cache=get_cache_stats()
     )
 
 @app.post("/run-cascade", response_model=ScriptResponse)
@@ -407,17 +416,19 @@ async def run_cascade(request: CascadeScriptRequest):
                 detail="Cascata LLM ainda não implementada. Use cascata legada."
             )
         else:
-            # Cascata legada
+            # Cascata legada (contexto em memória repassado entre os scripts)
             results = []
-            scripts_order = ["competencias", "tech_specs", "rag", "fluxos", "workflows"]
+            # Personas sem alterações são puladas (force_regenerate reprocessa todas)
+            stage_results = await pipeline_runner.run_pipeline(
+                AUTOMACAO_DIR, list(range(1, len(CASCADE_SCRIPTS) + 1)),
+                empresa_id=request.empresa_codigo,
+                force=request.force_regenerate
+            )
             
-            for script_name in scripts_order:
-                logger.info(f"Executando script: {script_name}")
-                
-                script_path = SCRIPT_PATHS[script_name]
-                result = run_python_script(script_path, [request.empresa_codigo])
+            for result in stage_results:
+                script_name = CASCADE_SCRIPTS[result["script"] - 1]
                 
-                if not result["success"]:
+                if result["status"] != "success":
                     return ScriptResponse(
                         success=False,
                         message=f"Falha no script {script_name}",
@@ -500,10 +511,17 @@ async def startup_event():
         logger.info("✅ Integração Google AI + OpenAI + Nano Banana ativa")
     else:
         logger.info("⚠️ Usando apenas scripts legados")
+    
+    await pipeline_runner.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup na finalização"""
+    if LLM_AVAILABLE:
+        # Fecha as sessões HTTP compartilhadas dos providers (Google AI, OpenAI, Nano Banana)
+        await close_http_sessions()
+    
+    await pipeline_runner.stop()
     logger.info("🛑 VCM Dashboard API Bridge LLM finalizado")
 
 # Endpoint de teste
@@ -8,7 +8,7 @@ EXECUTA OS SCRIPTS REAIS sem modificá-los.
 
 Funcionalidades:
 - Executar gerador de biografias
-- Executar cascata de scripts (1-5) em sequência
+- Executar cascata de scripts (1-5) em sequência (fila persistente de jobs)
 - Monitorar status e logs em tempo real
 - Sincronizar dados com Supabase
 
@@ -30,6 +30,9 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import logging
 
+from cascade_job_queue import CascadeJobQueue
+from pipeline_runner import PipelineRunner
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -73,6 +76,14 @@ class BiografiaRequest(BaseModel):
 class ScriptRequest(BaseModel):
     script_number: int
     force_regenerate: bool = False
+    dry_run: bool = False
+
+class CascadeJobRequest(BaseModel):
+    empresa_id: str = "default"
+    base_path: Optional[str] = None
+    scripts: List[int] = [1, 2, 3, 4, 5]
+    force_regenerate: bool = False
+    dry_run: bool = False
 
 class ScriptResponse(BaseModel):
     success: bool
@@ -94,6 +105,16 @@ SCRIPT_PATHS = {
     5: AUTOMACAO_DIR / "02_PROCESSAMENTO_PERSONAS" / "05_generate_workflows_n8n.py",
 }
 
+# Scripts da cascata em pool de processos aquecido (compartilhado com a fila)
+pipeline_runner = PipelineRunner(SCRIPT_PATHS)
+
+# Fila persistente da cascata
+cascade_queue = CascadeJobQueue(
+    db_path=Path(os.getenv('VCM_JOB_QUEUE_PATH', str(BASE_DIR / ".cache" / "cascade_jobs.sqlite"))),
+    script_paths=SCRIPT_PATHS,
+    runner=pipeline_runner
+)
+
 # Controle de execução
 execution_status = {
     "biografia": {"running": False, "last_run": None, "last_result": None},
@@ -187,6 +208,18 @@ def copy_personas_to_processing_dir() -> bool:
         logger.error(f"Erro ao copiar personas: {str(e)}")
         return False
 
+@app.on_event("startup")
+async def startup_event():
+    """Aquece o pool da cascata e inicia os workers da fila"""
+    await pipeline_runner.start()
+    await cascade_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Encerra os workers da fila e o pool da cascata"""
+    await cascade_queue.stop()
+    await pipeline_runner.stop()
+
 @app.get("/")
 async def root():
     """Status da API"""
@@ -202,8 +235,20 @@ async def root():
 @app.get("/status")
 async def get_status():
     """Status de execução de todos os scripts"""
+    queue_stats = cascade_queue.get_stats()
+    
+    # Status da cascata derivado da fila (compatível com o dashboard)
+    latest_jobs = cascade_queue.list_jobs(limit=1)
+    execution_status["cascade"]["running"] = queue_stats["jobs"]["running"] > 0
+    if latest_jobs:
+        execution_status["cascade"]["last_run"] = latest_jobs[0]["started_at"] or latest_jobs[0]["created_at"]
+        execution_status["cascade"]["last_result"] = {
+            "completed": "success", "failed": "error"
+        }.get(latest_jobs[0]["status"], execution_status["cascade"]["last_result"])
+    
     return {
         "execution_status": execution_status,
+        "job_queue": queue_stats,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -276,6 +321,15 @@ async def run_script(script_number: int, request: ScriptRequest):
     if script_number not in SCRIPT_PATHS:
         raise HTTPException(status_code=400, detail=f"Script {script_number} não existe")
     
+    # Dry-run: só lista as personas que seriam reprocessadas
+    if request.dry_run:
+        plan = await pipeline_runner.plan(AUTOMACAO_DIR, [script_number], force=request.force_regenerate)
+        return ScriptResponse(
+            success=True,
+            message=f"Dry-run do Script {script_number}",
+            data=plan
+        )
+    
     script_key = f"script_{script_number}"
     
     if execution_status[script_key]["running"]:
@@ -297,16 +351,18 @@ async def run_script(script_number: int, request: ScriptRequest):
                 error="Prerequisite missing"
             )
         
-        result = run_python_script(script_path, timeout=600)  # 10 minutos
+        result = await pipeline_runner.run_stage(script_number, AUTOMACAO_DIR, force=request.force_regenerate)
         
-        if result["success"]:
+        if result["status"] == "success":
             execution_status[script_key]["last_result"] = "success"
             return ScriptResponse(
                 success=True,
                 message=f"Script {script_number} executado com sucesso",
                 data={
                     "script_number": script_number,
-                    "script_path": str(script_path)
+                    "script_path": str(script_path),
+                    "mode": result.get("mode"),
+                    "results": result.get("results")
                 },
                 output=result["output"],
                 execution_time=result["execution_time"]
@@ -317,7 +373,7 @@ async def run_script(script_number: int, request: ScriptRequest):
                 success=False,
                 message=f"Erro na execução do Script {script_number}",
                 error=result["error"],
-                output=result["output"],
+                output=result.get("output"),
                 execution_time=result["execution_time"]
             )
             
@@ -332,103 +388,113 @@ async def run_script(script_number: int, request: ScriptRequest):
     finally:
         execution_status[script_key]["running"] = False
 
-@app.post("/run-cascade", response_model=ScriptResponse)
-async def run_cascade(background_tasks: BackgroundTasks):
+def resolve_base_path(base_path: Optional[str]) -> Path:
     """
-    Executa toda a cascata de scripts (1-5) em sequência
+    Diretório base da cascata (relativo a AUTOMACAO_DIR ou absoluto dentro dele)
+    Qualquer caminho fora de AUTOMACAO_DIR é rejeitado: os scripts leem e gravam nele
     """
-    if execution_status["cascade"]["running"]:
-        raise HTTPException(status_code=429, detail="Cascata já está executando")
+    if not base_path:
+        return AUTOMACAO_DIR
     
-    execution_status["cascade"]["running"] = True
-    execution_status["cascade"]["last_run"] = datetime.now().isoformat()
+    root = AUTOMACAO_DIR.resolve()
+    resolved = (root / base_path).resolve()
+    if resolved != root and root not in resolved.parents:
+        raise HTTPException(status_code=400, detail="base_path fora do diretório de automação")
+    return resolved
+
+@app.post("/run-cascade", response_model=ScriptResponse)
+async def run_cascade(request: Optional[CascadeJobRequest] = None):
+    """
+    Enfileira a cascata de scripts (1-5) e retorna o ID do job imediatamente
+    Acompanhe em /jobs/{job_id}
+    """
+    request = request or CascadeJobRequest()
     
     try:
-        logger.info("Iniciando cascata completa de scripts")
+        invalid = [num for num in request.scripts if num not in SCRIPT_PATHS]
+        if invalid or not request.scripts:
+            raise HTTPException(status_code=400, detail=f"Scripts inválidos: {invalid or request.scripts}")
+        
+        base_path = resolve_base_path(request.base_path)
         
         # Verificar prerequisito
-        personas_dir = AUTOMACAO_DIR / "04_PERSONAS_COMPLETAS"
+        personas_dir = base_path / "04_PERSONAS_COMPLETAS"
         if not personas_dir.exists():
-            execution_status["cascade"]["last_result"] = "error"
             return ScriptResponse(
                 success=False,
                 message="Diretório 04_PERSONAS_COMPLETAS não encontrado. Execute primeiro a geração de biografias.",
                 error="Prerequisite missing"
             )
         
-        results = []
-        total_time = 0
-        
-        for script_num in [1, 2, 3, 4, 5]:
-            script_path = SCRIPT_PATHS[script_num]
-            script_key = f"script_{script_num}"
-            
-            logger.info(f"Executando Script {script_num} na cascata")
-            execution_status[script_key]["running"] = True
-            execution_status[script_key]["last_run"] = datetime.now().isoformat()
-            
-            result = run_python_script(script_path, timeout=600)
-            total_time += result.get("execution_time", 0)
-            
-            if result["success"]:
-                execution_status[script_key]["last_result"] = "success"
-                results.append({
-                    "script": script_num,
-                    "status": "success",
-                    "execution_time": result["execution_time"]
-                })
-            else:
-                execution_status[script_key]["last_result"] = "error"
-                results.append({
-                    "script": script_num,
-                    "status": "error",
-                    "error": result["error"],
-                    "execution_time": result["execution_time"]
-                })
-                # Parar cascata em caso de erro
-                break
-            
-            execution_status[script_key]["running"] = False
-        
-        # Verificar se todos foram executados com sucesso
-        all_success = all(r["status"] == "success" for r in results)
-        
-        if all_success:
-            execution_status["cascade"]["last_result"] = "success"
+        if request.dry_run:
+            plan = await pipeline_runner.plan(base_path, request.scripts, force=request.force_regenerate)
             return ScriptResponse(
                 success=True,
-                message="Cascata completa executada com sucesso",
-                data={
-                    "scripts_executed": len(results),
-                    "results": results,
-                    "total_execution_time": total_time
-                },
-                execution_time=total_time
-            )
-        else:
-            execution_status["cascade"]["last_result"] = "error"
-            return ScriptResponse(
-                success=False,
-                message=f"Cascata falhou no script {results[-1]['script']}",
-                data={
-                    "scripts_executed": len(results),
-                    "results": results,
-                    "total_execution_time": total_time
-                },
-                error=f"Falha no script {results[-1]['script']}",
-                execution_time=total_time
+                message="Dry-run da cascata (nenhum job enfileirado)",
+                data=plan
             )
-            
+        
+        job = cascade_queue.enqueue(request.empresa_id, base_path, request.scripts,
+                                    force=request.force_regenerate)
+        
+        return ScriptResponse(
+            success=True,
+            message=f"Cascata enfileirada (job {job['id']})",
+            data={
+                "job_id": job["id"],
+                "status": job["status"],
+                "empresa_id": job["empresa_id"],
+                "scripts": job["scripts"],
+                "poll_url": f"/jobs/{job['id']}"
+            }
+        )
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        execution_status["cascade"]["last_result"] = "error"
         logger.error(f"Erro em run_cascade: {str(e)}")
         return ScriptResponse(
             success=False,
             message="Erro interno do servidor",
             error=str(e)
         )
-    finally:
-        execution_status["cascade"]["running"] = False
+
+@app.get("/jobs")
+async def list_jobs(status: Optional[str] = None, empresa_id: Optional[str] = None, limit: int = 50):
+    """
+    Lista jobs da cascata (mais recentes primeiro)
+    """
+    return {
+        "success": True,
+        "data": cascade_queue.list_jobs(status, empresa_id, limit),
+        "stats": cascade_queue.get_stats()
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Estado de um job da cascata
+    """
+    job = cascade_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado")
+    
+    return {"success": True, "data": job}
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancela um job na fila ou em execução
+    """
+    job = cascade_queue.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado")
+    
+    return {
+        "success": True,
+        "message": "Cancelamento solicitado" if job["status"] == "running" else f"Job {job['status']}",
+        "data": job
+    }
 
 @app.get("/outputs")
 async def list_outputs():
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+🗂️ VCM CASCADE JOB QUEUE
+========================
+
+Fila persistente (SQLite) para execução da cascata de scripts (1-5).
+
+- Jobs gravados em disco e retomados após reinício da API
+- Pool de workers assíncronos (estágios não bloqueiam o event loop)
+- Scripts executados pelo PipelineRunner (pool em processo, subprocesso como fallback)
+- Isolamento: no máximo um job em execução por empresa e por diretório base
+- Cancelamento de jobs na fila ou em execução
+
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from pipeline_runner import PipelineRunner
+
+logger = logging.getLogger(__name__)
+
+# Configuração da fila (configurável via .env)
+DEFAULT_WORKERS = int(os.getenv('VCM_CASCADE_WORKERS', '2'))
+DEFAULT_SCRIPT_TIMEOUT = int(os.getenv('VCM_CASCADE_SCRIPT_TIMEOUT', '600'))
+OUTPUT_TAIL_CHARS = 4000
+
+JOB_STATUSES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+
+class CascadeJobQueue:
+    """
+    Fila de jobs da cascata com pool de workers
+    Cada job executa os scripts em sequência, parando no primeiro erro
+    """
+
+    def __init__(self, db_path: Path, script_paths: Dict[int, Path],
+                 workers: int = DEFAULT_WORKERS,
+                 script_timeout: int = DEFAULT_SCRIPT_TIMEOUT,
+                 poll_interval: float = 1.0,
+                 runner: Optional[PipelineRunner] = None):
+        self.db_path = Path(db_path)
+        self.script_paths = script_paths
+        self.workers = workers
+        self.script_timeout = script_timeout
+        self.poll_interval = poll_interval
+        self.runner = runner or PipelineRunner(script_paths, workers=workers,
+                                               stage_timeout=script_timeout,
+                                               poll_interval=poll_interval)
+        self._owns_runner = runner is None
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+
+    def _init_db(self):
+        """Cria a tabela de jobs"""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cascade_jobs (
+                    id TEXT PRIMARY KEY,
+                    empresa_id TEXT NOT NULL,
+                    base_path TEXT NOT NULL,
+                    scripts TEXT NOT NULL,
+                    force INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    current_script INTEGER,
+                    results TEXT NOT NULL DEFAULT '[]',
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    completed_at TEXT
+                )
+            """)
+            # Bancos criados antes da coluna force (reprocessar personas sem alterações)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(cascade_jobs)")}
+            if 'force' not in columns:
+                self._conn.execute("ALTER TABLE cascade_jobs ADD COLUMN force INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cascade_jobs_status ON cascade_jobs(status, created_at)"
+            )
+
+    def _requeue_interrupted(self):
+        """
+        Devolve à fila jobs que estavam em execução quando a API parou
+        Feito em start(), não no construtor: os workers da cascata (spawn) importam o
+        módulo da API e criam a fila de novo, sem poder mexer nos jobs em execução
+        """
+        with self._lock, self._conn:
+            requeued = self._conn.execute(
+                "UPDATE cascade_jobs SET status = 'queued', current_script = NULL, started_at = NULL "
+                "WHERE status = 'running'"
+            ).rowcount
+
+        if requeued:
+            logger.info(f"♻️ {requeued} jobs interrompidos devolvidos à fila")
+
+    # ------------------------------------------------------------------
+    # API da fila
+    # ------------------------------------------------------------------
+
+    def enqueue(self, empresa_id: str, base_path: Path, scripts: List[int],
+                force: bool = False) -> Dict[str, Any]:
+        """Registra um job e acorda os workers (force reprocessa personas sem alterações)"""
+        job_id = str(uuid.uuid4())
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO cascade_jobs (id, empresa_id, base_path, scripts, force, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, empresa_id, str(base_path), json.dumps(scripts), int(force),
+                 datetime.now().isoformat())
+            )
+
+        if self._wakeup:
+            self._wakeup.set()
+
+        logger.info(f"📥 Job {job_id} enfileirado (empresa {empresa_id}, scripts {scripts})")
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado atual de um job"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM cascade_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, empresa_id: Optional[str] = None,
+                  limit: int = 50) -> List[Dict[str, Any]]:
+        """Jobs mais recentes, com filtros opcionais"""
+        query = "SELECT * FROM cascade_jobs WHERE 1 = 1"
+        params: List[Any] = []
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        if empresa_id:
+            query += " AND empresa_id = ?"
+            params.append(empresa_id)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancela job na fila imediatamente; job em execução é interrompido pelo worker"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE cascade_jobs SET status = 'cancelled', completed_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (datetime.now().isoformat(), job_id)
+            )
+            self._conn.execute(
+                "UPDATE cascade_jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                (job_id,)
+            )
+        return self.get_job(job_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Contagem de jobs por status"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS total FROM cascade_jobs GROUP BY status"
+            ).fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row['status']: row['total'] for row in rows})
+        return {'workers': self.workers, 'jobs': counts, 'pipeline': self.runner.get_stats()}
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        """Inicia o pool de workers no event loop atual"""
+        self._requeue_interrupted()
+        if self._owns_runner:
+            await self.runner.start()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"👷 Pool de cascata iniciado com {self.workers} workers")
+
+    async def stop(self):
+        """Encerra os workers (jobs em execução voltam à fila no próximo start)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._owns_runner:
+            await self.runner.stop()
+
+    def _claim_next_job(self) -> Optional[Dict[str, Any]]:
+        """Reserva o próximo job cuja empresa/diretório não tem job em execução"""
+        with self._lock, self._conn:
+            row = self._conn.execute("""
+                SELECT * FROM cascade_jobs
+                WHERE status = 'queued'
+                AND empresa_id NOT IN (SELECT empresa_id FROM cascade_jobs WHERE status = 'running')
+                AND base_path NOT IN (SELECT base_path FROM cascade_jobs WHERE status = 'running')
+                ORDER BY created_at
+                LIMIT 1
+            """).fetchone()
+
+            if not row:
+                return None
+
+            self._conn.execute(
+                "UPDATE cascade_jobs SET status = 'running', started_at = ? WHERE id = ?",
+                (datetime.now().isoformat(), row['id'])
+            )
+
+        return self._row_to_job(row)
+
+    async def _worker(self, worker_id: int):
+        """Loop do worker: reserva e executa jobs até ser cancelado"""
+        while True:
+            job = self._claim_next_job()
+
+            if not job:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info(f"▶️ Worker {worker_id} executando job {job['id']} (empresa {job['empresa_id']})")
+
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                logger.error(f"Erro no job {job['id']}: {e}")
+                self._finish_job(job['id'], 'failed', error=str(e))
+
+            # Outro job da mesma empresa pode ter sido liberado
+            self._wakeup.set()
+
+    async def _run_job(self, job: Dict[str, Any]):
+        """Executa os scripts do job em sequência, repassando o contexto em memória"""
+        if self.runner.fused and await self._run_fused_job(job):
+            return
+
+        results = []
+        context: Dict[str, Dict] = {}
+
+        for script_num in job['scripts']:
+            self._update_job(job['id'], current_script=script_num)
+
+            result = await self.runner.run_stage(
+                script_num, Path(job['base_path']),
+                empresa_id=job['empresa_id'],
+                context=context,
+                should_cancel=lambda: self._cancel_requested(job['id']),
+                force=job['force']
+            )
+            context = result.get('context') or context
+            entry = {
+                'script': script_num,
+                'status': result['status'],
+                'execution_time': result['execution_time']
+            }
+            if result.get('mode'):
+                entry['mode'] = result['mode']
+            if result.get('error'):
+                entry['error'] = result['error']
+            if result.get('output'):
+                entry['output'] = result['output'][-OUTPUT_TAIL_CHARS:]
+            results.append(entry)
+            self._update_job(job['id'], results=json.dumps(results))
+
+            if result['status'] == 'cancelled':
+                self._finish_job(job['id'], 'cancelled')
+                return
+
+            if result['status'] != 'success':
+                # Parar cascata em caso de erro
+                self._finish_job(job['id'], 'failed', error=f"Falha no script {script_num}")
+                return
+
+        self._finish_job(job['id'], 'completed')
+
+    async def _run_fused_job(self, job: Dict[str, Any]) -> bool:
+        """Job no modo fused (persona a persona); False se o runner não pôde executá-lo"""
+        self._update_job(job['id'], current_script=min(job['scripts']))
+
+        stage_results = await self.runner.run_fused(
+            Path(job['base_path']), job['scripts'],
+            empresa_id=job['empresa_id'],
+            force=job['force'],
+            should_cancel=lambda: self._cancel_requested(job['id'])
+        )
+        if stage_results is None:
+            return False
+
+        results = []
+        for result in stage_results:
+            entry = {key: result[key] for key in ('script', 'status', 'execution_time', 'mode', 'error')
+                     if result.get(key) is not None}
+            if result.get('results'):
+                entry['results'] = result['results']
+            if result.get('output'):
+                entry['output'] = result['output'][-OUTPUT_TAIL_CHARS:]
+            results.append(entry)
+        self._update_job(job['id'], results=json.dumps(results))
+
+        failed = next((result for result in stage_results if result['status'] != 'success'), None)
+        if failed is None:
+            self._finish_job(job['id'], 'completed')
+        elif failed['status'] == 'cancelled':
+            self._finish_job(job['id'], 'cancelled')
+        else:
+            self._finish_job(job['id'], 'failed', error=f"Falha no script {failed['script']}")
+        return True
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cancel_requested FROM cascade_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def _update_job(self, job_id: str, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE cascade_jobs SET {assignments} WHERE id = ?",
+                               (*fields.values(), job_id))
+
+    def _finish_job(self, job_id: str, status: str, error: Optional[str] = None):
+        self._update_job(job_id, status=status, error=error, current_script=None,
+                         completed_at=datetime.now().isoformat())
+        logger.info(f"{'✅' if status == 'completed' else '⏹️'} Job {job_id}: {status}")
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['scripts'] = json.loads(job['scripts'])
+        job['results'] = json.loads(job['results'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['force'] = bool(job['force'])
+        return job
@@ -0,0 +1,978 @@
+#!/usr/bin/env python3
+"""
+⚙️ VCM PIPELINE RUNNER
+======================
+
+Execução em processo da cascata de scripts (1-5).
+
+- Geradores importados como bibliotecas em workers aquecidos (um processo exclusivo por estágio em execução)
+- Resultados de cada estágio repassados em memória ao próximo (competências, tech specs, fluxos)
+- Modo subprocesso mantido como fallback (VCM_PIPELINE_MODE=subprocess)
+- Personas sem alterações puladas pelo build graph (force reprocessa tudo; plan() é o dry-run)
+- Modo fused (VCM_PIPELINE_FUSED=true): cada persona passa pelos scripts 1→5 em memória,
+  com os scripts em threads ligadas por filas limitadas e gravação única no fim (write-behind)
+
+Autor: Sergio Castro
+Data: November 2025
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import threading
+import logging
+import traceback
+import importlib.util
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuração do runner (configurável via .env)
+DEFAULT_PIPELINE_MODE = os.getenv('VCM_PIPELINE_MODE', 'inprocess')
+DEFAULT_PIPELINE_WORKERS = int(os.getenv('VCM_PIPELINE_WORKERS', os.getenv('VCM_CASCADE_WORKERS', '2')))
+DEFAULT_STAGE_TIMEOUT = int(os.getenv('VCM_CASCADE_SCRIPT_TIMEOUT', '600'))
+DEFAULT_PIPELINE_FUSED = os.getenv('VCM_PIPELINE_FUSED', 'false').lower() == 'true'
+FUSED_QUEUE_SIZE = int(os.getenv('VCM_FUSED_QUEUE_SIZE', '8'))
+# spawn: workers não herdam threads/sockets do processo da API e funcionam também no Windows
+DEFAULT_START_METHOD = os.getenv('VCM_PIPELINE_START_METHOD', 'spawn')
+OUTPUT_TAIL_CHARS = 4000
+
+PIPELINE_MODES = ('inprocess', 'subprocess')
+
+# ========================================
+# 🔧 EXECUÇÃO DENTRO DO WORKER
+# ========================================
+
+# Módulos dos geradores carregados pelo inicializador de cada worker
+_worker_modules: Dict[int, Any] = {}
+_worker_errors: Dict[int, str] = {}
+
+def load_stage_module(script_num: int, script_path: Path):
+    """Importa um script da cascata como biblioteca (nomes começam com dígitos)"""
+    spec = importlib.util.spec_from_file_location(f"vcm_stage_{script_num}", str(script_path))
+    module = importlib.util.module_from_spec(spec)
+    # Registrado para que as classes dos geradores sejam serializáveis (--workers)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def _init_worker(script_paths: Dict[int, str]):
+    """Inicializador do worker: importa os geradores uma única vez"""
+    # Mesmo diretório de trabalho do modo subprocesso (logs/ relativos dos scripts 4-5)
+    scripts_dir = Path(next(iter(script_paths.values()))).parent
+    if scripts_dir.exists():
+        os.chdir(scripts_dir)
+        # Módulos auxiliares dos scripts (ex.: persona_workers)
+        sys.path.insert(0, str(scripts_dir))
+
+    for script_num, script_path in script_paths.items():
+        try:
+            _worker_modules[script_num] = load_stage_module(script_num, Path(script_path))
+        except Exception as e:
+            _worker_errors[script_num] = f"{type(e).__name__}: {e}"
+
+def _warmup() -> List[int]:
+    """Tarefa vazia usada para subir os workers antes do primeiro job"""
+    return sorted(_worker_modules)
+
+def _execute_stage(script_num: int, base_path: str, context: Dict[str, Dict],
+                   empresa_id: Optional[str], force: bool = False) -> Dict[str, Any]:
+    """Executa um estágio no worker; stdout capturado como no modo subprocesso"""
+    if script_num not in _worker_modules:
+        return {'success': False, 'unavailable': True,
+                'error': _worker_errors.get(script_num, f"Script {script_num} não carregado")}
+
+    output = io.StringIO()
+
+    try:
+        with _empresa_env(empresa_id), redirect_stdout(output):
+            results = STAGE_RUNNERS[script_num](_worker_modules[script_num], Path(base_path), context, force)
+    except Exception:
+        return {'success': False, 'output': output.getvalue(),
+                'error': traceback.format_exc()[-OUTPUT_TAIL_CHARS:]}
+
+    failed = results.get('failed', [])
+    return {
+        'success': not failed,
+        'output': output.getvalue(),
+        'error': f"{len(failed)} persona(s) falharam" if failed else None,
+        'results': {'processed': len(results.get('processed', [])),
+                    'skipped': len(results.get('skipped', [])), 'failed': failed,
+                    'total': results.get('total', 0)},
+        'context': context
+    }
+
+@contextmanager
+def _empresa_env(empresa_id: Optional[str]):
+    """VCM_EMPRESA_ID do job durante a execução no worker"""
+    previous_empresa = os.environ.get('VCM_EMPRESA_ID')
+    if empresa_id:
+        os.environ['VCM_EMPRESA_ID'] = empresa_id
+    try:
+        yield
+    finally:
+        if previous_empresa is None:
+            os.environ.pop('VCM_EMPRESA_ID', None)
+        else:
+            os.environ['VCM_EMPRESA_ID'] = previous_empresa
+
+def _run_generator_stage(module, class_name: str, base_path: Path, context: Dict[str, Dict],
+                         force: bool = False) -> Dict:
+    """Scripts 1-3: process_all_personas com o contexto dos estágios anteriores"""
+    generator = getattr(module, class_name)(str(base_path))
+    if hasattr(generator, 'preloaded'):
+        generator.preloaded = context
+
+    results = generator.process_all_personas(force=force)
+
+    for persona_dir, outputs in getattr(generator, 'generated', {}).items():
+        context.setdefault(persona_dir, {}).update(outputs)
+
+    return results
+
+def _run_fluxos_stage(module, base_path: Path, context: Dict[str, Dict], force: bool = False) -> Dict:
+    """Script 4: análise de fluxos a partir das competências/tech specs em memória"""
+    from build_graph import BuildGraph
+
+    analyzer = module.FluxoAnalyzer(str(base_path))
+    build_graph = BuildGraph({4: Path(module.__file__)}, force=force)
+    results = {"processed": [], "skipped": [], "failed": [], "total": 0}
+
+    print("\n" + "="*60)
+    print("🔀 SCRIPT 4 - ANÁLISE DE FLUXOS E TASK MAPPING")
+    print("="*60)
+
+    for persona_dir in iter_persona_dirs(base_path):
+        results["total"] += 1
+        outputs = context.setdefault(str(persona_dir), {})
+
+        # Sem fluxos no contexto: o script 5 lê o fluxos_analysis.json existente
+        if build_graph.is_fresh(4, persona_dir):
+            results["skipped"].append(str(persona_dir))
+            continue
+
+        try:
+            _fluxos_for_persona(analyzer, persona_dir, outputs)
+            build_graph.record(4, persona_dir)
+            results["processed"].append(str(persona_dir))
+        except Exception as e:
+            results["failed"].append(str(persona_dir))
+            print(f"❌ Erro ao processar {persona_dir.name}: {e}")
+
+    _print_report(results)
+    return results
+
+def _fluxos_for_persona(analyzer, persona_dir: Path, outputs: Dict[str, Any]):
+    """Script 4 para uma persona; os fluxos ficam em outputs para o script 5"""
+    persona_data = build_persona_data(persona_dir, outputs)
+    fluxos_analysis = analyzer.analyze_persona_flows(persona_data)
+    tasktodo_path = analyzer.generate_tasktodo_document(persona_data, fluxos_analysis)
+    outputs["fluxos"] = fluxos_analysis
+    print(f"✅ TaskTodo gerado para {persona_dir.name}: {tasktodo_path}")
+
+def _run_workflows_stage(module, base_path: Path, context: Dict[str, Dict], force: bool = False) -> Dict:
+    """Script 5: workflows N8N a partir dos fluxos em memória"""
+    from build_graph import BuildGraph
+
+    generator = module.N8NWorkflowGenerator(str(base_path))
+    build_graph = BuildGraph({5: Path(module.__file__)}, force=force)
+    results = {"processed": [], "skipped": [], "failed": [], "total": 0}
+
+    print("\n" + "="*60)
+    print("🔗 SCRIPT 5 - GERAÇÃO DE WORKFLOWS N8N")
+    print("="*60)
+
+    for persona_dir in iter_persona_dirs(base_path):
+        results["total"] += 1
+        outputs = context.setdefault(str(persona_dir), {})
+
+        if build_graph.is_fresh(5, persona_dir):
+            results["skipped"].append(str(persona_dir))
+            continue
+
+        try:
+            _workflow_for_persona(generator, persona_dir, outputs)
+            build_graph.record(5, persona_dir)
+            results["processed"].append(str(persona_dir))
+        except Exception as e:
+            results["failed"].append(str(persona_dir))
+            print(f"❌ Erro ao processar {persona_dir.name}: {e}")
+
+    _print_report(results)
+    return results
+
+def _workflow_for_persona(generator, persona_dir: Path, outputs: Dict[str, Any]):
+    """Script 5 para uma persona (fluxos em memória ou fluxos_analysis.json)"""
+    persona_data = build_persona_data(persona_dir, outputs)
+    persona_data["fluxos"] = outputs.get("fluxos") or _read_json(
+        persona_dir / "script4_tasktodo" / "fluxos_analysis.json"
+    )
+    graph = generator.build_workflow_graph(persona_data)
+    validation_report = generator.validate_workflow_consistency(graph, persona_data)
+    workflow_path, _, _ = generator.save_workflow(
+        graph.to_n8n(), persona_data["full_path"], validation_report, persona_dir=persona_dir
+    )
+    print(f"✅ Workflow gerado para {persona_dir.name}: {workflow_path} "
+          f"({validation_report['summary']['validation_status']})")
+
+# Scripts 1-3: classe do gerador e método que processa uma persona
+GENERATOR_STAGES = {
+    1: ('CompetenciasGenerator', 'create_competencias_structure'),
+    2: ('TechSpecsGenerator', 'create_tech_specs_structure'),
+    3: ('RAGGenerator', 'create_rag_structure'),
+}
+
+STAGE_RUNNERS: Dict[int, Callable[[Any, Path, Dict[str, Dict], bool], Dict]] = {
+    1: lambda module, base_path, context, force: _run_generator_stage(module, 'CompetenciasGenerator', base_path, context, force),
+    2: lambda module, base_path, context, force: _run_generator_stage(module, 'TechSpecsGenerator', base_path, context, force),
+    3: lambda module, base_path, context, force: _run_generator_stage(module, 'RAGGenerator', base_path, context, force),
+    4: _run_fluxos_stage,
+    5: _run_workflows_stage,
+}
+
+def iter_persona_dirs(base_path: Path):
+    """Pastas de persona em 04_PERSONAS_COMPLETAS/<categoria>/<persona>"""
+    personas_path = Path(base_path) / "04_PERSONAS_COMPLETAS"
+    if not personas_path.exists():
+        return
+    for role_folder in sorted(personas_path.iterdir()):
+        if role_folder.is_dir():
+            for persona_folder in sorted(role_folder.iterdir()):
+                if persona_folder.is_dir():
+                    yield persona_folder
+
+def build_persona_data(persona_dir: Path, outputs: Dict[str, Dict]) -> Dict[str, Any]:
+    """
+    Dados da persona no formato dos scripts 4-5
+    Usa os resultados em memória dos scripts 1-2; relê os arquivos só quando o estágio rodou isolado
+    """
+    competencias = outputs.get("competencias") or _read_json(
+        persona_dir / "competencias" / "competencias_core.json"
+    )
+
+    tech_specs = outputs.get("tech_specs")
+    if tech_specs is None:
+        tech_specs = {}
+        for name in ("ai_config", "tools_config"):
+            config_file = persona_dir / "tech_specs" / f"{name}.json"
+            if config_file.exists():
+                tech_specs[name] = _read_json(config_file)
+
+    # Tarefas ficam no bloco "competencias" de competencias_core.json; ferramentas como "tools"
+    stage_tech_specs = {}
+    if "ai_config" in tech_specs:
+        stage_tech_specs["ai_config"] = tech_specs["ai_config"]
+    if "tools_config" in tech_specs:
+        stage_tech_specs["tools"] = tech_specs["tools_config"]
+
+    categoria = persona_dir.parent.name
+    return {
+        "competencias": competencias.get("competencias", competencias),
+        "tech_specs": stage_tech_specs,
+        "persona_name": persona_dir.name,
+        "categoria": categoria,
+        "persona_dir": str(persona_dir),
+        "full_path": f"{categoria}/{persona_dir.name}"
+    }
+
+def _read_json(path: Path) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _print_report(results: Dict):
+    print(f"\n{'='*60}")
+    print("📊 RELATÓRIO FINAL")
+    print(f"{'='*60}")
+    print(f"✅ Processadas: {len(results['processed'])}")
+    print(f"⏭️ Sem alterações: {len(results['skipped'])}")
+    print(f"❌ Falharam: {len(results['failed'])}")
+    print(f"📊 Total: {results['total']}")
+
+# ========================================
+# 🔀 MODO FUSED (PERSONA A PERSONA)
+# ========================================
+
+# Fim da fila entre os scripts
+_DONE = object()
+
+class _ThreadOutput(io.TextIOBase):
+    """stdout do worker separado por thread (saída de cada script no modo fused)"""
+
+    def __init__(self):
+        self._buffers: Dict[int, io.StringIO] = {}
+        self._default = io.StringIO()
+
+    def register(self) -> io.StringIO:
+        buffer = self._buffers[threading.get_ident()] = io.StringIO()
+        return buffer
+
+    def write(self, text: str) -> int:
+        return self._buffers.get(threading.get_ident(), self._default).write(text)
+
+def _persona_processor(script_num: int, module, base_path: Path) -> Callable[[Path, Dict[str, Any], Any], bool]:
+    """Processa uma persona em um script, gravando pelo writer recebido"""
+    if script_num in GENERATOR_STAGES:
+        class_name, method_name = GENERATOR_STAGES[script_num]
+        generator = getattr(module, class_name)(str(base_path))
+
+        def process(persona_dir: Path, outputs: Dict[str, Any], writer) -> bool:
+            generator.writer = writer
+            if hasattr(generator, 'preloaded'):
+                generator.preloaded = {str(persona_dir): outputs}
+            if not getattr(generator, method_name)(persona_dir):
+                return False
+            outputs.update(getattr(generator, 'generated', {}).pop(str(persona_dir), {}))
+            return True
+
+        return process
+
+    if script_num == 4:
+        worker = module.FluxoAnalyzer(str(base_path))
+        build = _fluxos_for_persona
+    else:
+        worker = module.N8NWorkflowGenerator(str(base_path))
+        build = _workflow_for_persona
+
+    def process(persona_dir: Path, outputs: Dict[str, Any], writer) -> bool:
+        worker.writer = writer
+        build(worker, persona_dir, outputs)
+        return True
+
+    return process
+
+class FusedPipeline:
+    """
+    Cascata persona a persona: cada script roda em uma thread e repassa a persona
+    (resultados em memória + arquivos pendentes) ao próximo por uma fila limitada.
+    A última thread grava os arquivos da persona de uma vez e registra o build graph.
+    """
+
+    def __init__(self, modules: Dict[int, Any], base_path: Path, scripts: List[int],
+                 force: bool = False, queue_size: int = FUSED_QUEUE_SIZE):
+        from build_graph import BuildGraph
+
+        self.base_path = Path(base_path)
+        self.scripts = sorted(scripts)
+        self.queue_size = queue_size
+        self.processors = {num: _persona_processor(num, modules[num], self.base_path) for num in self.scripts}
+        self.graph = BuildGraph({num: Path(modules[num].__file__) for num in self.scripts}, force=force)
+        self.stage_results = {num: {"processed": [], "skipped": [], "failed": [], "total": 0, "busy": 0.0}
+                              for num in self.scripts}
+        self.stage_output: Dict[int, io.StringIO] = {}
+        self.output = _ThreadOutput()
+        self.stats = {'personas': 0, 'files_written': 0, 'bytes_written': 0, 'write_errors': 0,
+                      'first_persona_seconds': None}
+
+    def run(self) -> Dict[str, Any]:
+        """Executa a cascata; devolve resultados por script e métricas do pipeline"""
+        from persona_writer import BufferedWriter
+
+        started_at = time.time()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.scripts) + 1)]
+        threads = [
+            threading.Thread(target=self._stage_worker, args=(num, queues[i], queues[i + 1]),
+                             name=f"vcm-fused-{num}", daemon=True)
+            for i, num in enumerate(self.scripts)
+        ]
+        threads.append(threading.Thread(target=self._writer_worker, args=(queues[-1], started_at),
+                                        name="vcm-fused-writer", daemon=True))
+
+        with redirect_stdout(self.output):
+            for thread in threads:
+                thread.start()
+
+            # Fila limitada: a leitura das personas acompanha o ritmo dos scripts
+            try:
+                for persona_dir in iter_persona_dirs(self.base_path):
+                    queues[0].put({
+                        'persona_dir': persona_dir,
+                        'stale': self.graph.stale_stages(persona_dir, self.scripts),
+                        'outputs': {},
+                        'writer': BufferedWriter(),
+                        'built': [],
+                        'failed': False
+                    })
+            finally:
+                # Mesmo com erro na leitura, as threads drenam as filas e terminam
+                queues[0].put(_DONE)
+                for thread in threads:
+                    thread.join()
+
+        self.stats['elapsed_seconds'] = round(time.time() - started_at, 3)
+        return {'stages': self.stage_results, 'output': {num: buffer.getvalue()
+                                                         for num, buffer in self.stage_output.items()},
+                'stats': self.stats}
+
+    def _stage_worker(self, script_num: int, inbox: queue.Queue, outbox: queue.Queue):
+        output = self.stage_output[script_num] = self.output.register()
+        results = self.stage_results[script_num]
+        process = self.processors[script_num]
+        print(f"\n🔀 SCRIPT {script_num} (fused)")
+
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                outbox.put(_DONE)
+                break
+
+            persona_dir = item['persona_dir']
+            if item['failed']:
+                # Persona interrompida em um script anterior
+                outbox.put(item)
+                continue
+
+            results["total"] += 1
+            if script_num not in item['stale']:
+                results["skipped"].append(str(persona_dir))
+                outbox.put(item)
+                continue
+
+            started_at = time.time()
+            try:
+                success = process(persona_dir, item['outputs'], item['writer'])
+            except Exception as e:
+                print(f"❌ Erro ao processar {persona_dir.name}: {e}")
+                success = False
+            results["busy"] += time.time() - started_at
+
+            if success:
+                results["processed"].append(str(persona_dir))
+                item['built'].append(script_num)
+            else:
+                results["failed"].append(str(persona_dir))
+                item['failed'] = True
+            outbox.put(item)
+
+        _print_report(results)
+
+    def _writer_worker(self, inbox: queue.Queue, started_at: float):
+        """Write-behind: grava os arquivos da persona de uma vez e registra os scripts reconstruídos"""
+        self.output.register()
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+
+            # Qualquer erro fica nesta persona (sem registro no build graph): a thread segue
+            # drenando a fila até _DONE para não travar os scripts anteriores
+            try:
+                writer = item['writer']
+                pending_bytes = writer.pending_bytes
+                self.stats['files_written'] += len(writer.flush())
+                self.stats['bytes_written'] += pending_bytes
+                for script_num in item['built']:
+                    self.graph.record(script_num, item['persona_dir'])
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error(f"❌ Erro ao gravar {item['persona_dir']}: {e}")
+
+            self.stats['personas'] += 1
+            if self.stats['first_persona_seconds'] is None:
+                self.stats['first_persona_seconds'] = round(time.time() - started_at, 3)
+
+def _execute_fused(base_path: str, scripts: List[int], empresa_id: Optional[str],
+                   force: bool = False) -> Dict[str, Any]:
+    """Executa a cascata fused no worker"""
+    missing = [num for num in scripts if num not in _worker_modules]
+    if missing:
+        return {'success': False, 'unavailable': True,
+                'error': '; '.join(_worker_errors.get(num, f"Script {num} não carregado") for num in missing)}
+
+    try:
+        with _empresa_env(empresa_id):
+            outcome = FusedPipeline(_worker_modules, Path(base_path), scripts, force=force).run()
+    except Exception:
+        return {'success': False, 'error': traceback.format_exc()[-OUTPUT_TAIL_CHARS:]}
+
+    outcome['success'] = not any(results['failed'] for results in outcome['stages'].values())
+    return outcome
+
+# ========================================
+# 🏭 RUNNER
+# ========================================
+
+class PipelineRunner:
+    """
+    Executa os scripts da cascata em workers de processo aquecidos
+    Cada estágio ocupa um worker exclusivo: cancelar ou estourar o timeout de um job
+    mata só o worker dele (os estágios de outros jobs seguem rodando)
+    Cada estágio devolve o contexto em memória consumido pelo estágio seguinte
+    """
+
+    def __init__(self, script_paths: Dict[int, Path],
+                 workers: int = DEFAULT_PIPELINE_WORKERS,
+                 mode: str = DEFAULT_PIPELINE_MODE,
+                 stage_timeout: int = DEFAULT_STAGE_TIMEOUT,
+                 poll_interval: float = 1.0,
+                 fused: bool = DEFAULT_PIPELINE_FUSED,
+                 start_method: str = DEFAULT_START_METHOD):
+        self.script_paths = {num: Path(path) for num, path in script_paths.items()}
+        self.workers = workers
+        self.fused = fused
+        self.stage_timeout = stage_timeout
+        self.poll_interval = poll_interval
+        self.mode = mode if mode in PIPELINE_MODES else 'inprocess'
+        # Workers (um ProcessPoolExecutor de um processo cada): livres e em uso
+        self._idle: List[ProcessPoolExecutor] = []
+        self._busy: set = set()
+        self._replenishing: set = set()
+        self._running = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self.stats = {
+            'inprocess_stages': 0,
+            'subprocess_stages': 0,
+            'fused_runs': 0,
+            'fallbacks': 0,
+            'worker_restarts': 0
+        }
+
+        # Com spawn, os workers importam o módulo principal como __mp_main__:
+        # efeitos colaterais dele devem ficar sob `if __name__ == "__main__"` ou em start()
+        if start_method not in multiprocessing.get_all_start_methods():
+            logger.warning(f"⚠️ Start method {start_method} indisponível - usando spawn")
+            start_method = 'spawn'
+        self._mp_context = multiprocessing.get_context(start_method)
+
+    async def start(self):
+        """Sobe e aquece os workers (geradores importados antes do primeiro job)"""
+        if self.mode != 'inprocess' or self._running:
+            return
+
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+
+        async with self._start_lock:
+            if self._running:
+                return
+
+            warmed = await asyncio.gather(*(self._spawn_worker() for _ in range(self.workers)),
+                                          return_exceptions=True)
+            warmed = [worker for worker in warmed if isinstance(worker, tuple)]
+            self._idle = [executor for executor, _ in warmed]
+            self._slots = asyncio.Semaphore(self.workers)
+            self._running = True
+
+            loaded = warmed[0][1] if warmed else []
+            logger.info(f"🔥 Workers da cascata aquecidos: {len(self._idle)}/{self.workers}, scripts {loaded}")
+
+    async def stop(self):
+        """Encerra os workers (estágios em execução são interrompidos)"""
+        self._running = False
+        for task in list(self._replenishing):
+            task.cancel()
+        workers, self._idle = self._idle + list(self._busy), []
+        self._busy.clear()
+        for executor in workers:
+            _terminate_executor(executor)
+
+    async def run_stage(self, script_num: int, base_path: Path,
+                        empresa_id: Optional[str] = None,
+                        context: Optional[Dict[str, Dict]] = None,
+                        should_cancel: Optional[Callable[[], bool]] = None,
+                        force: bool = False) -> Dict[str, Any]:
+        """
+        Executa um script da cascata (force reprocessa personas sem alterações)
+        Retorna status ('success' | 'error' | 'cancelled'), saída, tempo e o contexto para o próximo estágio
+        """
+        script_path = self.script_paths[script_num]
+        if not script_path.exists():
+            return {'status': 'error', 'error': f"Script não encontrado: {script_path}",
+                    'execution_time': 0}
+
+        if self.mode == 'inprocess':
+            try:
+                result = await self._run_inprocess(script_num, base_path, empresa_id,
+                                                   context or {}, should_cancel, force)
+                if result is not None:
+                    self.stats['inprocess_stages'] += 1
+                    return result
+            except BrokenProcessPool as e:
+                logger.warning(f"⚠️ Worker da cascata interrompido ({e}) - script {script_num} em subprocesso")
+
+            self.stats['fallbacks'] += 1
+
+        self.stats['subprocess_stages'] += 1
+        return await self._run_subprocess(script_num, base_path, empresa_id, should_cancel, force)
+
+    async def run_pipeline(self, base_path: Path, scripts: List[int],
+                           empresa_id: Optional[str] = None,
+                           force: bool = False) -> List[Dict[str, Any]]:
+        """Executa os scripts em sequência repassando o contexto; para no primeiro erro"""
+        if self.fused and self.mode == 'inprocess':
+            fused_results = await self.run_fused(base_path, scripts, empresa_id=empresa_id, force=force)
+            if fused_results is not None:
+                return fused_results
+
+        results = []
+        context: Dict[str, Dict] = {}
+
+        for script_num in scripts:
+            result = await self.run_stage(script_num, base_path, empresa_id=empresa_id, context=context,
+                                          force=force)
+            context = result.pop('context', None) or context
+            results.append({'script': script_num, **result})
+
+            if result['status'] != 'success':
+                break
+
+        return results
+
+    async def plan(self, base_path: Path, scripts: List[int], force: bool = False) -> Dict[str, Any]:
+        """
+        Dry-run: personas que cada script reconstruiria, sem executar nada
+        Reconstruir uma persona em um script propaga para os scripts que dependem dele
+        """
+        def build_plan() -> Dict[str, Any]:
+            scripts_dir = str(next(iter(self.script_paths.values())).parent)
+            if scripts_dir not in sys.path:
+                sys.path.append(scripts_dir)
+            from build_graph import plan_cascade
+
+            persona_dirs = list(iter_persona_dirs(base_path))
+            stages = plan_cascade(persona_dirs, scripts, self.script_paths, force=force)
+            return {
+                'total_personas': len(persona_dirs),
+                'scripts': {script_num: {'rebuild': len(entries), 'personas': entries}
+                            for script_num, entries in stages.items()}
+            }
+
+        return await asyncio.get_running_loop().run_in_executor(None, build_plan)
+
+    async def run_fused(self, base_path: Path, scripts: List[int],
+                        empresa_id: Optional[str] = None, force: bool = False,
+                        should_cancel: Optional[Callable[[], bool]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Cascata persona a persona em um worker exclusivo (FusedPipeline)
+        Mesmo formato de run_pipeline; None quando o pool não pode executá-la (usar run_pipeline)
+        """
+        if self.mode != 'inprocess':
+            return None
+
+        scripts = sorted(scripts)
+
+        try:
+            state, outcome, elapsed = await self._run_on_worker(
+                self.stage_timeout * len(scripts), should_cancel,
+                _execute_fused, str(base_path), scripts, empresa_id, force
+            )
+        except BrokenProcessPool as e:
+            logger.warning(f"⚠️ Worker da cascata interrompido ({e}) - cascata fused abortada")
+            return None
+
+        if state != 'done':
+            error = 'Job cancelado' if state == 'cancelled' else f"Cascata timeout ({self.stage_timeout * len(scripts)} segundos)"
+            return [{'script': scripts[0], 'status': state if state == 'cancelled' else 'error',
+                     'error': error, 'execution_time': elapsed, 'mode': 'fused'}]
+
+        if outcome.get('unavailable'):
+            logger.warning(f"⚠️ Cascata fused indisponível ({outcome['error']}) - executando script a script")
+            return None
+
+        self.stats['fused_runs'] += 1
+        if 'stages' not in outcome:
+            return [{'script': scripts[0], 'status': 'error', 'error': outcome['error'],
+                     'execution_time': elapsed, 'mode': 'fused'}]
+
+        stats = outcome['stats']
+        logger.info(f"🔀 Cascata fused: {stats['personas']} personas em {elapsed:.2f}s "
+                    f"(primeira em {stats['first_persona_seconds']}s, {stats['files_written']} arquivos)")
+
+        results = []
+        for script_num in scripts:
+            stage = outcome['stages'][script_num]
+            failed = stage['failed']
+            result = {
+                'script': script_num,
+                'status': 'error' if failed else 'success',
+                'output': outcome['output'].get(script_num, ''),
+                'execution_time': round(stage['busy'], 3),
+                'mode': 'fused',
+                'results': {'processed': len(stage['processed']), 'skipped': len(stage['skipped']),
+                            'failed': failed, 'total': stage['total']},
+                'pipeline': stats
+            }
+            if failed:
+                result['error'] = f"{len(failed)} persona(s) falharam"
+            results.append(result)
+        return results
+
+    async def _run_on_worker(self, timeout: float, should_cancel: Optional[Callable[[], bool]],
+                             fn: Callable, *args) -> Tuple[str, Any, float]:
+        """
+        Executa fn em um worker exclusivo acompanhando cancelamento e timeout
+        Retorna ('done' | 'cancelled' | 'timeout', resultado, tempo); só o worker deste
+        estágio é morto quando ele é interrompido
+        """
+        executor = await self._acquire_worker()
+        state = None
+        try:
+            state, outcome, elapsed = await self._await_worker(executor, timeout, should_cancel, fn, *args)
+            return state, outcome, elapsed
+        finally:
+            self._release_worker(executor, healthy=state == 'done')
+
+    async def _await_worker(self, executor: ProcessPoolExecutor, timeout: float,
+                            should_cancel: Optional[Callable[[], bool]],
+                            fn: Callable, *args) -> Tuple[str, Any, float]:
+        """Aguarda fn no worker verificando cancelamento e timeout a cada poll_interval"""
+        start_time = datetime.now()
+
+        def elapsed() -> float:
+            return (datetime.now() - start_time).total_seconds()
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, fn, *args)
+        # Worker morto por cancelamento/timeout: exceção consumida aqui
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        while not future.done():
+            await asyncio.wait({future}, timeout=self.poll_interval)
+
+            if future.done():
+                break
+
+            if should_cancel and should_cancel():
+                return 'cancelled', None, elapsed()
+
+            if elapsed() > timeout:
+                return 'timeout', None, elapsed()
+
+        return 'done', future.result(), elapsed()
+
+    async def _run_inprocess(self, script_num: int, base_path: Path,
+                             empresa_id: Optional[str], context: Dict[str, Dict],
+                             should_cancel: Optional[Callable[[], bool]],
+                             force: bool = False) -> Optional[Dict[str, Any]]:
+        """Estágio em um worker; None quando o worker não carregou o script (usar subprocesso)"""
+        state, outcome, elapsed = await self._run_on_worker(
+            self.stage_timeout, should_cancel,
+            _execute_stage, script_num, str(base_path), context, empresa_id, force
+        )
+
+        if state == 'cancelled':
+            return {'status': 'cancelled', 'error': 'Job cancelado', 'execution_time': elapsed,
+                    'mode': 'inprocess'}
+
+        if state == 'timeout':
+            return {'status': 'error', 'error': f"Script timeout ({self.stage_timeout} segundos)",
+                    'execution_time': elapsed, 'mode': 'inprocess'}
+
+        if outcome.get('unavailable'):
+            logger.warning(f"⚠️ Script {script_num} não carregado no pool ({outcome['error']}) - usando subprocesso")
+            return None
+
+        result = {
+            'status': 'success' if outcome['success'] else 'error',
+            'output': outcome.get('output', ''),
+            'execution_time': elapsed,
+            'mode': 'inprocess',
+            'context': outcome.get('context', context)
+        }
+        if outcome.get('error'):
+            result['error'] = outcome['error']
+        if outcome.get('results'):
+            result['results'] = outcome['results']
+        return result
+
+    async def _run_subprocess(self, script_num: int, base_path: Path, empresa_id: Optional[str],
+                              should_cancel: Optional[Callable[[], bool]],
+                              force: bool = False) -> Dict[str, Any]:
+        """
+        Fallback: script em subprocesso assíncrono
+        O diretório base vai como argumento (scripts 1-3) e pela entrada padrão (scripts 4-5)
+        Scripts 4-5 isolados não consultam o build graph (sempre reprocessam)
+        """
+        script_path = self.script_paths[script_num]
+        start_time = datetime.now()
+
+        def elapsed() -> float:
+            return (datetime.now() - start_time).total_seconds()
+
+        env = {**os.environ, 'PYTHONIOENCODING': 'utf-8'}
+        if empresa_id:
+            env['VCM_EMPRESA_ID'] = empresa_id
+
+        args = [str(base_path)] + (['--force'] if force and script_num <= 3 else [])
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(script_path), *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=str(script_path.parent),
+            env=env
+        )
+        communicate = asyncio.create_task(process.communicate(input=f"{base_path}\n".encode()))
+
+        try:
+            while not communicate.done():
+                await asyncio.wait({communicate}, timeout=self.poll_interval)
+
+                if communicate.done():
+                    break
+
+                if should_cancel and should_cancel():
+                    process.kill()
+                    await communicate
+                    return {'status': 'cancelled', 'error': 'Job cancelado', 'execution_time': elapsed(),
+                            'mode': 'subprocess'}
+
+                if elapsed() > self.stage_timeout:
+                    process.kill()
+                    await communicate
+                    return {'status': 'error', 'error': f"Script timeout ({self.stage_timeout} segundos)",
+                            'execution_time': elapsed(), 'mode': 'subprocess'}
+        except asyncio.CancelledError:
+            # Worker encerrado: não deixar o subprocesso órfão
+            process.kill()
+            raise
+
+        stdout, stderr = communicate.result()
+        output = stdout.decode('utf-8', errors='replace')
+
+        if process.returncode == 0:
+            return {'status': 'success', 'output': output, 'execution_time': elapsed(), 'mode': 'subprocess'}
+
+        return {'status': 'error', 'output': output,
+                'error': stderr.decode('utf-8', errors='replace')[-OUTPUT_TAIL_CHARS:],
+                'execution_time': elapsed(), 'mode': 'subprocess'}
+
+    async def _spawn_worker(self) -> Tuple[ProcessPoolExecutor, List[int]]:
+        """Novo worker (um processo) já com os geradores importados"""
+        executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=self._mp_context,
+            initializer=_init_worker,
+            initargs=({num: str(path) for num, path in self.script_paths.items()},)
+        )
+        try:
+            stages = await asyncio.get_running_loop().run_in_executor(executor, _warmup)
+        except BaseException:
+            _terminate_executor(executor)
+            raise
+        return executor, stages
+
+    async def _acquire_worker(self) -> ProcessPoolExecutor:
+        """Reserva um worker livre (ou aquece um novo); no máximo `workers` em uso"""
+        await self.start()
+        await self._slots.acquire()
+        try:
+            executor = self._idle.pop() if self._idle else (await self._spawn_worker())[0]
+        except BaseException:
+            self._slots.release()
+            raise
+        self._busy.add(executor)
+        return executor
+
+    def _release_worker(self, executor: ProcessPoolExecutor, healthy: bool):
+        """Devolve o worker; interrompido (cancelamento/timeout/erro) é morto e substituído em segundo plano"""
+        # Fora de _busy: worker de antes de um stop() (o slot já não existe)
+        if executor in self._busy:
+            self._busy.discard(executor)
+            self._slots.release()
+
+        if healthy and self._running:
+            self._idle.append(executor)
+            return
+
+        _terminate_executor(executor)
+        if not healthy:
+            self.stats['worker_restarts'] += 1
+        if self._running:
+            task = asyncio.ensure_future(self._replenish())
+            self._replenishing.add(task)
+            task.add_done_callback(self._replenishing.discard)
+
+    async def _replenish(self):
+        """Aquece um worker substituto para a lista de livres"""
+        try:
+            executor, _ = await self._spawn_worker()
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao aquecer worker substituto: {e}")
+            return
+
+        if self._running and len(self._idle) + len(self._busy) < self.workers:
+            self._idle.append(executor)
+        else:
+            _terminate_executor(executor)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Modo de execução e contadores de estágios"""
+        return {
+            'mode': self.mode,
+            'fused': self.fused,
+            'workers': self.workers,
+            'start_method': self._mp_context.get_start_method(),
+            'pool_running': self._running,
+            'idle_workers': len(self._idle),
+            **self.stats
+        }
+
+def _terminate_executor(executor: ProcessPoolExecutor):
+    """Encerra o worker sem esperar o estágio em execução"""
+    for process in list((getattr(executor, '_processes', None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+# Execução direta: python pipeline_runner.py <base_path> [scripts...] [--force] [--dry-run]
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    scripts_dir = Path(__file__).parent / "AUTOMACAO_old" / "02_PROCESSAMENTO_PERSONAS"
+    script_paths = {
+        1: scripts_dir / "01_generate_competencias.py",
+        2: scripts_dir / "02_generate_tech_specs.py",
+        3: scripts_dir / "03_generate_rag.py",
+        4: scripts_dir / "04_generate_fluxos_analise.py",
+        5: scripts_dir / "05_generate_workflows_n8n.py",
+    }
+
+    parser = argparse.ArgumentParser(description="Cascata VCM em processo")
+    parser.add_argument("base_path")
+    parser.add_argument("scripts", nargs="*", type=int)
+    parser.add_argument("--force", action="store_true", help="Reprocessar personas sem alterações")
+    parser.add_argument("--dry-run", action="store_true", help="Só listar o que seria reconstruído")
+    parser.add_argument("--fused", action="store_true", default=DEFAULT_PIPELINE_FUSED,
+                        help="Cascata persona a persona (scripts em threads, gravação única no fim)")
+    args = parser.parse_args()
+
+    async def main():
+        runner = PipelineRunner(script_paths, fused=args.fused)
+        scripts = args.scripts or [1, 2, 3, 4, 5]
+        base_path = Path(args.base_path).resolve()
+
+        if args.dry_run:
+            plan = await runner.plan(base_path, scripts, force=args.force)
+            for script_num, stage in plan['scripts'].items():
+                print(f"📜 Script {script_num}: {stage['rebuild']}/{plan['total_personas']} persona(s)")
+                for entry in stage['personas']:
+                    print(f"   - {entry['persona']} ({entry['reason']})")
+            sys.exit(0)
+
+        try:
+            results = await runner.run_pipeline(base_path, scripts, force=args.force)
+        finally:
+            await runner.stop()
+
+        for result in results:
+            status = '✅' if result['status'] == 'success' else '❌'
+            print(f"{status} Script {result['script']} ({result.get('mode')}): "
+                  f"{result['execution_time']:.2f}s {result.get('results', '')}")
+            if result.get('error'):
+                print(result['error'])
+
+        sys.exit(0 if all(r['status'] == 'success' for r in results) else 1)
+
+    asyncio.run(main())
@@ -14,13 +14,19 @@ Data: 2025-11-10
 import os
 import sys
 import json
+import asyncio
+import hashlib
+import argparse
 import logging
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import uuid
-from vcm_database_strategy import get_database_strategy, DatabaseStrategy
+from vcm_database_strategy import get_database_manager, DatabaseStrategy
+
+# Cliente PostgREST assíncrono (compartilhado com os serviços RAG)
+sys.path.append(str(Path(__file__).parent / "AUTOMACAO_old" / "02_PROCESSAMENTO_PERSONAS"))
+from async_postgrest_service import AsyncPostgrestClient
 
 # Configurar logging
 logging.basicConfig(
@@ -33,6 +39,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Sincronização (configurável via .env)
+SYNC_STATE_PATH = os.getenv('VCM_LIFEWAY_SYNC_STATE')
+SYNC_BATCH_SIZE = int(os.getenv('VCM_LIFEWAY_SYNC_BATCH_SIZE', '200'))      # personas por delete in_()
+SYNC_PAGE_SIZE = int(os.getenv('VCM_LIFEWAY_SYNC_PAGE_SIZE', '500'))        # personas por página/upsert
+SYNC_CONCURRENCY = int(os.getenv('VCM_LIFEWAY_SYNC_CONCURRENCY', '4'))      # páginas gravadas em paralelo
+
 class LifewaySyncManager:
     def __init__(self):
         """Inicializar o gerenciador de sincronização"""
@@ -40,6 +52,7 @@ class LifewaySyncManager:
         self.load_environment()
         self.setup_database_strategy()
         self.setup_clients()
+        self.state_path = Path(SYNC_STATE_PATH or self.base_path / '.cache' / 'lifeway_sync_state.json')
         
     def load_environment(self):
         """Carregar variáveis de ambiente"""
@@ -52,7 +65,8 @@ class LifewaySyncManager:
         
     def setup_database_strategy(self):
         """Configurar estratégia de banco de dados para LifewayUSA"""
-        self.db_config = get_database_strategy("LifewayUSA")
+        self.db_manager = get_database_manager()
+        self.db_config = self.db_manager.get_database_config("LifewayUSA")
         
         if self.db_config.strategy != DatabaseStrategy.LEGACY_SEPARATE:
             raise ValueError("LifewayUSA deve usar estratégia LEGACY_SEPARATE")
@@ -72,40 +86,17 @@ class LifewaySyncManager:
             if not self.db_config.rag_key: missing.append('LIFEWAY_SUPABASE_SERVICE_KEY')
             raise ValueError(f"Variáveis de ambiente faltando: {missing}")
         
-        # Criar clientes usando a configuração da estratégia
-        self.vcm_client: Client = create_client(self.db_config.vcm_url, self.db_config.vcm_key)
-        self.lifeway_client: Client = create_client(self.db_config.rag_url, self.db_config.rag_key)
+        # Clientes compartilhados do registro do processo (um pool por banco)
+        self.vcm_client: AsyncPostgrestClient = self.db_manager.get_vcm_client()
+        self.lifeway_client: AsyncPostgrestClient = self.db_manager.get_client(self.db_config.rag_url,
+                                                                               self.db_config.rag_key)
         
         logger.info("✅ Clientes Supabase configurados via estratégia")
         
-    def cleanup_existing_lifeway_personas(self, empresa_id):
-        """Limpar personas LifewayUSA existentes no VCM Central antes da nova sincronização"""
-        try:
-            # Buscar personas existentes da LifewayUSA
-            response = self.vcm_client.table('personas').select('id, persona_code').eq('empresa_id', empresa_id).execute()
-            
-            if response.data:
-                logger.info(f"🧹 Encontradas {len(response.data)} personas existentes para limpeza")
-                
-                # Deletar cada persona
-                for persona in response.data:
-                    delete_response = self.vcm_client.table('personas').delete().eq('id', persona['id']).execute()
-                    if delete_response.data:
-                        logger.info(f"🗑️ Persona {persona['persona_code']} removida")
-                    else:
-                        logger.warning(f"⚠️ Falha ao remover persona {persona['persona_code']}")
-                
-                logger.info(f"✅ Limpeza concluída: {len(response.data)} personas removidas")
-            else:
-                logger.info("ℹ️ Nenhuma persona existente encontrada para limpeza")
-                
-        except Exception as e:
-            logger.error(f"❌ Erro durante limpeza: {e}")
-            
-    def get_lifeway_company_id(self):
+    async def get_lifeway_company_id(self):
         """Obter ID da empresa LifewayUSA no banco VCM Central"""
         try:
-            response = self.vcm_client.table('empresas').select('id').eq('nome', 'LifewayUSA').execute()
+            response = await self.vcm_client.table('empresas').select('id').eq('nome', 'LifewayUSA').execute()
             
             if not response.data:
                 logger.error("❌ Empresa LifewayUSA não encontrada no banco VCM Central")
@@ -119,33 +110,84 @@ class LifewaySyncManager:
             logger.error(f"❌ Erro ao buscar empresa LifewayUSA: {e}")
             return None
     
-    def get_lifeway_personas(self):
-        """Obter personas da LifewayUSA do banco RAG"""
+    async def iter_pages(self, build_query, page_size=SYNC_PAGE_SIZE):
+        """
+        Páginas de uma consulta, paginadas por chave (id > último id)
+        A próxima página é buscada enquanto a atual é processada; a leitura só termina
+        com uma página vazia (o max-rows do PostgREST pode devolver menos que page_size)
+        """
+        async def fetch_page(last_id):
+            query = build_query()
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            return (await query.order('id').limit(page_size).execute()).data or []
+        
+        pending = asyncio.ensure_future(fetch_page(None))
         try:
-            response = self.lifeway_client.table('personas').select('*').execute()
-            
-            if not response.data:
-                logger.warning("⚠️ Nenhuma persona encontrada no banco RAG da LifewayUSA")
-                return []
-                
-            logger.info(f"✅ Encontradas {len(response.data)} personas no banco RAG da LifewayUSA")
-            return response.data
-            
-        except Exception as e:
-            logger.error(f"❌ Erro ao buscar personas do banco RAG: {e}")
-            return []
+            while pending:
+                page = await pending
+                pending = asyncio.ensure_future(fetch_page(page[-1]['id'])) if page else None
+                if page:
+                    yield page
+        finally:
+            if pending:
+                pending.cancel()
     
-    def check_existing_personas(self, empresa_id):
-        """Verificar personas existentes no VCM Central para evitar duplicatas"""
-        try:
-            response = self.vcm_client.table('personas').select('persona_code').eq('empresa_id', empresa_id).execute()
-            existing_codes = {persona['persona_code'] for persona in response.data}
-            logger.info(f"✅ {len(existing_codes)} personas já existem no VCM Central")
-            return existing_codes
-            
-        except Exception as e:
-            logger.error(f"❌ Erro ao verificar personas existentes: {e}")
-            return set()
+    def iter_lifeway_personas(self, watermark=None):
+        """Personas do banco RAG em páginas (só as alteradas desde o watermark, se informado)"""
+        def build_query():
+            query = self.lifeway_client.table('personas').select('*')
+            return query.gte('updated_at', watermark) if watermark else query
+        
+        return self.iter_pages(build_query)
+    
+    async def get_lifeway_ids(self):
+        """Ids de todas as personas do banco RAG (manifesto leve para detectar exclusões)"""
+        ids = set()
+        async for page in self.iter_pages(lambda: self.lifeway_client.table('personas').select('id')):
+            ids.update(str(row['id']) for row in page)
+        return ids
+    
+    async def get_vcm_persona_codes(self, empresa_id):
+        """persona_code das personas da empresa no VCM Central"""
+        codes = set()
+        async for page in self.iter_pages(
+            lambda: self.vcm_client.table('personas').select('id, persona_code').eq('empresa_id', empresa_id)
+        ):
+            codes.update(row['persona_code'] for row in page)
+        return codes
+    
+
+    def load_sync_state(self, empresa_id):
+        """Watermark e manifesto da última sincronização da empresa"""
+        if not self.state_path.exists():
+            return {}
+        
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(empresa_id, {})
+    
+    def save_sync_state(self, empresa_id, state):
+        """Grava o estado da empresa (arquivo temporário + replace)"""
+        all_states = {}
+        if self.state_path.exists():
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                all_states = json.load(f)
+        
+        all_states[empresa_id] = state
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(all_states, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+    
+    def get_persona_code(self, rag_persona):
+        """Código da persona no VCM Central (chave do upsert)"""
+        return rag_persona.get('persona_code', f"LIFEWAY_{rag_persona.get('id', 'UNKNOWN')}")
+    
+    def compute_persona_hash(self, rag_persona):
+        """Hash do conteúdo da persona no banco RAG"""
+        content = json.dumps(rag_persona, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
     
     def transform_persona_data(self, rag_persona, empresa_id):
         """Transformar dados da persona do formato RAG para VCM Central"""
@@ -154,7 +196,7 @@ class LifewaySyncManager:
             # IMPORTANTE: banco LifewayUSA RAG já usa os nomes corretos dos campos
             vcm_persona = {
                 'id': str(uuid.uuid4()),
-                'persona_code': rag_persona.get('persona_code', f"LIFEWAY_{rag_persona.get('id', 'UNKNOWN')}"),
+                'persona_code': self.get_persona_code(rag_persona),
                 'full_name': rag_persona.get('full_name', 'Nome não definido'),
                 'role': rag_persona.get('role', 'Cargo não definido'),
                 'specialty': rag_persona.get('specialty', ''),
@@ -184,48 +226,147 @@ class LifewaySyncManager:
             logger.error(f"❌ Erro ao transformar dados da persona {rag_persona.get('id')}: {e}")
             return None
     
-    def sync_personas(self, empresa_id, rag_personas, existing_codes):
-        """Sincronizar personas do RAG para VCM Central"""
-        synced_count = 0
-        skipped_count = 0
-        error_count = 0
+    async def sync_personas(self, empresa_id, pages, manifest):
+        """
+        Sincronizar páginas de personas do RAG para o VCM Central
+        Até SYNC_CONCURRENCY páginas são gravadas ao mesmo tempo; a memória fica
+        limitada a poucas páginas, independente do tamanho da tabela
+        """
+        totals = {'fetched': 0, 'upserted': 0, 'unchanged': 0, 'errors': 0, 'watermark': None,
+                  'replaced_codes': set(), 'failed_codes': set(), 'failed_watermark': None}
+        semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+        tasks = set()
         
-        for rag_persona in rag_personas:
+        async def sync_page(page):
             try:
-                persona_code = rag_persona.get('codigo_persona', f"LIFEWAY_{rag_persona.get('id', 'UNKNOWN')}")
-                
-                # Pular se já existe
-                if persona_code in existing_codes:
-                    logger.info(f"⏭️ Persona {persona_code} já existe, pulando...")
-                    skipped_count += 1
-                    continue
+                upserted, unchanged, failed = await self.upsert_personas(empresa_id, page, manifest,
+                                                                         totals['replaced_codes'])
+                totals['upserted'] += upserted
+                totals['unchanged'] += unchanged
+                totals['errors'] += len(failed)
                 
-                # Transformar dados
-                vcm_persona = self.transform_persona_data(rag_persona, empresa_id)
-                if not vcm_persona:
-                    error_count += 1
-                    continue
-                
-                # Inserir no VCM Central
-                response = self.vcm_client.table('personas').insert(vcm_persona).execute()
-                
-                if response.data:
-                    logger.info(f"✅ Persona {persona_code} sincronizada com sucesso")
-                    synced_count += 1
-                else:
-                    logger.error(f"❌ Falha ao sincronizar persona {persona_code}")
-                    error_count += 1
-                    
-            except Exception as e:
-                logger.error(f"❌ Erro ao sincronizar persona {rag_persona.get('id', 'UNKNOWN')}: {e}")
-                error_count += 1
+                # Personas com erro: preservadas na remoção e relidas na próxima sincronização
+                totals['failed_codes'].update(self.get_persona_code(rag_persona) for rag_persona in failed)
+                # ('' = persona sem updated_at: o watermark não pode avançar)
+                if failed:
+                    failed_watermark = min(rag_persona.get('updated_at') or '' for rag_persona in failed)
+                    if totals['failed_watermark'] is None or failed_watermark < totals['failed_watermark']:
+                        totals['failed_watermark'] = failed_watermark
+            finally:
+                semaphore.release()
+        
+        async for page in pages:
+            await semaphore.acquire()
+            totals['fetched'] += len(page)
+            
+            page_watermark = self.get_max_updated_at(page)
+            if page_watermark and (not totals['watermark'] or page_watermark > totals['watermark']):
+                totals['watermark'] = page_watermark
+            
+            task = asyncio.ensure_future(sync_page(page))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        if tasks:
+            await asyncio.gather(*tasks)
+        
+        return totals
+    
+    async def upsert_personas(self, empresa_id, rag_personas, manifest, replaced_codes=None):
+        """
+        Grava uma página de personas em um único upsert (on_conflict persona_code)
+        Personas com o mesmo hash do manifesto são ignoradas; sem `id` no payload,
+        o id existente no VCM Central é mantido. Quando o persona_code muda, o código
+        antigo vai para `replaced_codes` (removido ao final).
+        Retorna (gravadas, inalteradas, personas com erro)
+        """
+        rows = []
+        unchanged = 0
+        failed = []
+        
+        for rag_persona in rag_personas:
+            content_hash = self.compute_persona_hash(rag_persona)
+            entry = manifest.get(str(rag_persona['id']))
+            
+            if entry and entry['hash'] == content_hash:
+                unchanged += 1
+                continue
+            
+            vcm_persona = self.transform_persona_data(rag_persona, empresa_id)
+            if not vcm_persona:
+                failed.append(rag_persona)
+                continue
+            
+            vcm_persona.pop('id')
+            vcm_persona.pop('created_at')
+            rows.append((rag_persona, content_hash, vcm_persona))
+        
+        if not rows:
+            return 0, unchanged, failed
+        
+        rejected = await self.upsert_rows(rows)
+        if rejected:
+            failed.extend(rag_persona for rag_persona, _, _ in rejected)
+            rejected_ids = {id(row) for row in rejected}
+            rows = [row for row in rows if id(row) not in rejected_ids]
+        
+        for rag_persona, content_hash, vcm_persona in rows:
+            entry = manifest.get(str(rag_persona['id']))
+            if entry and replaced_codes is not None and entry['persona_code'] != vcm_persona['persona_code']:
+                replaced_codes.add(entry['persona_code'])
+            manifest[str(rag_persona['id'])] = {
+                'persona_code': vcm_persona['persona_code'],
+                'hash': content_hash
+            }
+        
+        logger.info(f"✅ Página de {len(rows)} personas gravada")
+        return len(rows), unchanged, failed
+    
+    async def upsert_rows(self, rows):
+        """
+        Upsert de (persona RAG, hash, persona VCM); retorna as linhas rejeitadas
+        Lote recusado pelo banco (erro 4xx: dado inválido) é dividido ao meio até isolar
+        as personas com problema; falhas de rede/servidor rejeitam o lote inteiro
+        """
+        try:
+            await self.vcm_client.table('personas')\
+                .upsert([vcm_persona for _, _, vcm_persona in rows], on_conflict='persona_code',
+                        returning='minimal')\
+                .execute()
+            return []
+        except Exception as e:
+            status_code = getattr(e, 'status_code', 0)
+            if len(rows) == 1 or not 400 <= status_code < 500:
+                codes = ', '.join(vcm_persona['persona_code'] for _, _, vcm_persona in rows[:5])
+                logger.error(f"❌ Erro no upsert de {len(rows)} personas ({codes}{'...' if len(rows) > 5 else ''}): {e}")
+                return rows
+        
+        middle = len(rows) // 2
+        return await self.upsert_rows(rows[:middle]) + await self.upsert_rows(rows[middle:])
+    
+
+    async def delete_removed_personas(self, empresa_id, persona_codes):
+        """Remove do VCM Central as personas que não existem mais no banco RAG"""
+        for start in range(0, len(persona_codes), SYNC_BATCH_SIZE):
+            batch = persona_codes[start:start + SYNC_BATCH_SIZE]
+            await self.vcm_client.table('personas').delete(returning='minimal')\
+                .eq('empresa_id', empresa_id)\
+                .in_('persona_code', batch)\
+                .execute()
         
-        return synced_count, skipped_count, error_count
+        if persona_codes:
+            logger.info(f"🗑️ {len(persona_codes)} personas removidas (excluídas no banco RAG)")
+    
+    async def count_empresa_personas(self, empresa_id):
+        """Total de personas da empresa no VCM Central"""
+        response = await self.vcm_client.table('personas').select('id', count='exact')\
+            .eq('empresa_id', empresa_id).limit(1).execute()
+        return response.count or 0
     
-    def update_empresa_count(self, empresa_id, total_personas):
+    async def update_empresa_count(self, empresa_id, total_personas):
         """Atualizar contador de personas na empresa"""
         try:
-            response = self.vcm_client.table('empresas').update({
+            response = await self.vcm_client.table('empresas').update({
                 'total_personas': total_personas,
                 'updated_at': datetime.now().isoformat()
             }).eq('id', empresa_id).execute()
@@ -238,48 +379,80 @@ class LifewaySyncManager:
         except Exception as e:
             logger.error(f"❌ Erro ao atualizar contador de personas: {e}")
     
-    def run_sync(self):
-        """Executar sincronização completa"""
+    async def run_sync(self, incremental=False):
+        """
+        Executar sincronização
+        Completa: grava todas as personas e remove as que não existem mais na origem.
+        Incremental: grava apenas personas alteradas desde a última sincronização
+        """
         logger.info("🔄 Iniciando sincronização de personas LifewayUSA...")
         
         try:
             # 1. Obter ID da empresa LifewayUSA
-            empresa_id = self.get_lifeway_company_id()
+            empresa_id = await self.get_lifeway_company_id()
             if not empresa_id:
                 return False
             
-            # 2. Limpar personas existentes incorretas
-            logger.info("🧹 Limpando personas existentes...")
-            self.cleanup_existing_lifeway_personas(empresa_id)
+            state = self.load_sync_state(empresa_id) if incremental else {}
+            watermark = state.get('watermark')
+            manifest = state.get('manifest', {}) if watermark else {}
+            if incremental and not watermark:
+                logger.info("ℹ️ Sem sincronização anterior - executando sincronização completa")
             
-            # 3. Obter personas do banco RAG
-            rag_personas = self.get_lifeway_personas()
-            if not rag_personas:
+            # 2. Gravar personas do banco RAG página a página
+            totals = await self.sync_personas(empresa_id, self.iter_lifeway_personas(watermark), manifest)
+            
+            if not watermark and not totals['fetched']:
                 logger.warning("⚠️ Nenhuma persona encontrada para sincronizar")
                 return True
             
-            # 4. Verificar personas existentes (deve estar vazio após limpeza)
-            existing_codes = self.check_existing_personas(empresa_id)
+            # 3. Remover personas que não existem mais na origem
+            if watermark:
+                source_ids = await self.get_lifeway_ids()
+                removed_ids = [persona_id for persona_id in manifest if persona_id not in source_ids]
+                removed_codes = [manifest.pop(persona_id)['persona_code'] for persona_id in removed_ids]
+                # persona_code alterado na origem: a linha com o código antigo sai do VCM Central
+                # (a menos que outra persona tenha passado a usar o código)
+                current_codes = {entry['persona_code'] for entry in manifest.values()}
+                removed_codes += [code for code in totals['replaced_codes'] if code not in current_codes]
+            else:
+                # Personas com erro não estão no manifesto, mas continuam existindo na origem
+                synced_codes = {entry['persona_code'] for entry in manifest.values()} | totals['failed_codes']
+                removed_codes = [code for code in await self.get_vcm_persona_codes(empresa_id)
+                                 if code not in synced_codes]
+            await self.delete_removed_personas(empresa_id, removed_codes)
             
-            # 5. Sincronizar personas
-            synced, skipped, errors = self.sync_personas(empresa_id, rag_personas, existing_codes)
+            # 4. Atualizar contador na empresa
+            total_personas = await self.count_empresa_personas(empresa_id)
+            await self.update_empresa_count(empresa_id, total_personas)
             
-            # 6. Atualizar contador na empresa
-            total_personas = synced + len(existing_codes)
-            self.update_empresa_count(empresa_id, total_personas)
+            # 5. Estado para as próximas sincronizações
+            # Com erros, o watermark para na persona com erro mais antiga (relida na próxima execução;
+            # as demais são ignoradas pelo hash do manifesto)
+            new_watermark = totals['watermark'] or watermark
+            if totals['errors']:
+                failed_watermark = totals['failed_watermark']
+                new_watermark = min(failed_watermark, new_watermark) if failed_watermark and new_watermark else watermark
+            self.save_sync_state(empresa_id, {
+                'watermark': new_watermark,
+                'manifest': manifest,
+                'last_sync': datetime.now().isoformat()
+            })
             
-            # 7. Relatório final
+            # 6. Relatório final
             logger.info("=" * 50)
-            logger.info("📊 RELATÓRIO DE SINCRONIZAÇÃO")
+            logger.info(f"📊 RELATÓRIO DE SINCRONIZAÇÃO {'INCREMENTAL' if watermark else 'COMPLETA'}")
             logger.info("=" * 50)
-            logger.info(f"✅ Personas sincronizadas: {synced}")
-            logger.info(f"⏭️ Personas já existentes: {skipped}")
-            logger.info(f"❌ Erros: {errors}")
+            logger.info(f"🔄 Personas lidas da origem: {totals['fetched']}")
+            logger.info(f"✅ Personas sincronizadas: {totals['upserted']}")
+            logger.info(f"⏭️ Personas inalteradas: {totals['unchanged']}")
+            logger.info(f"🗑️ Personas removidas: {len(removed_codes)}")
+            logger.info(f"❌ Erros: {totals['errors']}")
             logger.info(f"📊 Total de personas na empresa: {total_personas}")
             logger.info("=" * 50)
             
-            if errors > 0:
-                logger.warning(f"⚠️ Sincronização completada com {errors} erros")
+            if totals['errors'] > 0:
+                logger.warning(f"⚠️ Sincronização completada com {totals['errors']} erros")
             else:
                 logger.info("🎉 Sincronização completada com sucesso!")
             
@@ -288,15 +461,29 @@ class LifewaySyncManager:
         except Exception as e:
             logger.error(f"❌ Erro durante a sincronização: {e}")
             return False
+        finally:
+            # Clientes pertencem ao registro do processo: liberados por ele, não individualmente
+            await self.db_manager.clients.close()
+    
+
+    def get_max_updated_at(self, rag_personas):
+        """Maior updated_at entre as personas (novo watermark)"""
+        values = [rag_persona['updated_at'] for rag_persona in rag_personas if rag_persona.get('updated_at')]
+        return max(values) if values else None
 
 def main():
     """Função principal"""
+    parser = argparse.ArgumentParser(description="Sincronização de personas LifewayUSA")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Sincroniza apenas personas alteradas desde a última execução")
+    args = parser.parse_args()
+    
     print("🔄 Script de Sincronização LifewayUSA Personas")
     print("=" * 50)
     
     try:
         sync_manager = LifewaySyncManager()
-        success = sync_manager.run_sync()
+        success = asyncio.run(sync_manager.run_sync(incremental=args.incremental))
         
         if success:
             print("\n✅ Sincronização concluída!")
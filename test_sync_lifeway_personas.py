@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+TESTE - Sincronização LifewayUSA (sync_lifeway_personas.py)
+Estado entre execuções: manifesto de hashes, watermark, remoção de personas
+excluídas/renomeadas na origem e personas rejeitadas pelo banco
+
+Executar: python test_sync_lifeway_personas.py  (ou pytest)
+"""
+
+import asyncio
+import json
+import logging
+import re
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from sync_lifeway_personas import LifewaySyncManager
+from async_postgrest_service import AsyncPostgrestClient
+
+logging.disable(logging.CRITICAL)
+
+class FakePostgrest:
+    """PostgREST em memória: filtros eq/gt/gte/in, order/limit, upsert on_conflict e delete"""
+
+    def __init__(self):
+        self.tables = {}
+        self.reject_codes = set()   # persona_code recusado no upsert (erro 400 no lote inteiro)
+        self.upserts = 0
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        table_name = request.url.path.rsplit('/', 1)[-1]
+        table = self.tables.setdefault(table_name, [])
+        params = list(request.url.params.multi_items())
+        options = dict(params)
+        filters = [(column, expr) for column, expr in params
+                   if column not in ('select', 'order', 'limit', 'on_conflict', 'columns')]
+        rows = [row for row in table if all(_matches(row, column, expr) for column, expr in filters)]
+
+        if request.method == 'GET':
+            if 'order' in options:
+                rows.sort(key=lambda row: str(row.get(options['order'].split('.')[0])))
+            total = len(rows)
+            if 'limit' in options:
+                rows = rows[:int(options['limit'])]
+            if options.get('select', '*') != '*':
+                columns = [column.strip() for column in options['select'].split(',')]
+                rows = [{column: row.get(column) for column in columns} for row in rows]
+            return httpx.Response(200, json=rows, headers={'content-range': f"0-{len(rows) - 1}/{total}"})
+
+        if request.method == 'POST':
+            items = json.loads(request.content)
+            self.upserts += 1
+            if any(item.get('persona_code') in self.reject_codes for item in items):
+                return httpx.Response(400, json={'message': 'violates check constraint'})
+            key = options.get('on_conflict')
+            for item in items:
+                existing = [row for row in table if key and row.get(key) == item.get(key)]
+                if existing:
+                    existing[0].update(item)
+                else:
+                    table.append({'id': f"vcm-{len(table)}-{item.get(key)}", **item})
+            return httpx.Response(201, json=[])
+
+        if request.method == 'PATCH':
+            for row in rows:
+                row.update(json.loads(request.content))
+            return httpx.Response(200, json=rows)
+
+        if request.method == 'DELETE':
+            self.tables[table_name] = [row for row in table if row not in rows]
+            return httpx.Response(200, json=[])
+
+        return httpx.Response(405, json={'message': request.method})
+
+def _matches(row, column, expr):
+    operator, _, value = expr.partition('.')
+    current = str(row.get(column))
+    if operator == 'eq':
+        return current == value
+    if operator == 'gt':
+        return current > value
+    if operator == 'gte':
+        return current >= value
+    if operator == 'in':
+        return current in [item.strip('"') for item in re.findall(r'"(?:[^"\\]|\\.)*"|[^,]+', value[1:-1])]
+    raise ValueError(f"operador não suportado: {operator}")
+
+class _ClientRegistry:
+    async def close(self):
+        pass
+
+class _DatabaseManager:
+    clients = _ClientRegistry()
+
+def _make_manager(state_dir: Path, personas: int = 6):
+    """Gerenciador ligado a dois bancos falsos (origem RAG e VCM Central)"""
+    source, vcm = FakePostgrest(), FakePostgrest()
+    vcm.tables['empresas'] = [{'id': 'emp-1', 'nome': 'LifewayUSA'}]
+    source.tables['personas'] = [
+        {'id': f"p{n:03d}", 'persona_code': f"LW{n:03d}", 'full_name': f"Persona {n}",
+         'updated_at': f"2025-11-01T00:00:{n:02d}"}
+        for n in range(personas)
+    ]
+
+    manager = LifewaySyncManager.__new__(LifewaySyncManager)
+    manager.vcm_client = AsyncPostgrestClient('http://vcm.local', 'key', transport=vcm.transport())
+    manager.lifeway_client = AsyncPostgrestClient('http://lifeway.local', 'key', transport=source.transport())
+    manager.db_manager = _DatabaseManager()
+    manager.state_path = state_dir / 'lifeway_sync_state.json'
+    return source, vcm, manager
+
+def _codes(vcm):
+    return sorted(row['persona_code'] for row in vcm.tables['personas'])
+
+def _state(manager):
+    return json.loads(manager.state_path.read_text(encoding='utf-8'))['emp-1']
+
+def test_incremental_skips_unchanged_personas(tmp_path):
+    """Sem alterações na origem, a sincronização incremental não grava nada"""
+    source, vcm, manager = _make_manager(tmp_path)
+
+    async def scenario():
+        assert await manager.run_sync()
+        upserts = vcm.upserts
+        # Releitura pelo watermark (gte) da última persona: ignorada pelo hash do manifesto
+        assert await manager.run_sync(incremental=True)
+        assert vcm.upserts == upserts
+
+        source.tables['personas'][2].update(full_name='Persona 2 (editada)', updated_at='2025-11-02T00:00:00')
+        assert await manager.run_sync(incremental=True)
+        assert vcm.upserts == upserts + 1
+
+    asyncio.run(scenario())
+
+    assert _codes(vcm) == [f"LW{n:03d}" for n in range(6)]
+    assert [row['full_name'] for row in vcm.tables['personas'] if row['persona_code'] == 'LW002'] \
+        == ['Persona 2 (editada)']
+    assert _state(manager)['watermark'] == '2025-11-02T00:00:00'
+
+def test_incremental_removes_personas_deleted_at_source(tmp_path):
+    """Persona excluída na origem sai do VCM Central e do manifesto"""
+    source, vcm, manager = _make_manager(tmp_path)
+
+    async def scenario():
+        assert await manager.run_sync()
+        source.tables['personas'] = [row for row in source.tables['personas'] if row['id'] != 'p003']
+        assert await manager.run_sync(incremental=True)
+
+    asyncio.run(scenario())
+
+    assert 'LW003' not in _codes(vcm)
+    assert len(vcm.tables['personas']) == 5
+    assert 'p003' not in _state(manager)['manifest']
+    assert vcm.tables['empresas'][0]['total_personas'] == 5
+
+def test_incremental_rename_deletes_previous_code(tmp_path):
+    """persona_code alterado na origem: a linha com o código antigo é removida"""
+    source, vcm, manager = _make_manager(tmp_path)
+
+    async def scenario():
+        assert await manager.run_sync()
+        source.tables['personas'][1].update(persona_code='LW001-NEW', updated_at='2025-11-02T00:00:00')
+        assert await manager.run_sync(incremental=True)
+
+        # Troca: p002 assume o código antigo de p003, que passa a usar outro código
+        source.tables['personas'][2].update(persona_code='LW003', updated_at='2025-11-03T00:00:00')
+        source.tables['personas'][3].update(persona_code='LW003-B', updated_at='2025-11-03T00:00:00')
+        assert await manager.run_sync(incremental=True)
+
+    asyncio.run(scenario())
+
+    assert _codes(vcm) == ['LW000', 'LW001-NEW', 'LW003', 'LW003-B', 'LW004', 'LW005']
+    assert _state(manager)['manifest']['p002']['persona_code'] == 'LW003'
+
+def test_rejected_persona_is_kept_and_retried(tmp_path):
+    """
+    Página parcialmente rejeitada: só a persona inválida falha (bisseção do lote),
+    ela não é removida do VCM Central e o watermark para nela até ser gravada
+    """
+    source, vcm, manager = _make_manager(tmp_path)
+    vcm.tables['personas'] = [
+        {'id': 'vcm-stale', 'persona_code': 'STALE', 'empresa_id': 'emp-1'},
+        {'id': 'vcm-lw002', 'persona_code': 'LW002', 'full_name': 'Versão anterior', 'empresa_id': 'emp-1'},
+    ]
+    vcm.reject_codes = {'LW002'}
+
+    async def scenario():
+        assert await manager.run_sync()
+        state = _state(manager)
+        assert 'p002' not in state['manifest']
+        assert state['watermark'] == '2025-11-01T00:00:02'
+        # Persona com erro preservada; a que não existe mais na origem, removida
+        assert _codes(vcm) == [f"LW{n:03d}" for n in range(6)]
+
+        vcm.reject_codes = set()
+        assert await manager.run_sync(incremental=True)
+
+    asyncio.run(scenario())
+
+    state = _state(manager)
+    assert 'p002' in state['manifest']
+    assert state['watermark'] == '2025-11-01T00:00:05'
+    assert [row['full_name'] for row in vcm.tables['personas'] if row['persona_code'] == 'LW002'] \
+        == ['Persona 2']
+
+if __name__ == "__main__":
+    for test in (test_incremental_skips_unchanged_personas,
+                 test_incremental_removes_personas_deleted_at_source,
+                 test_incremental_rename_deletes_previous_code,
+                 test_rejected_persona_is_kept_and_retried):
+        test(Path(tempfile.mkdtemp()))
+        print(f"✅ {test.__name__}")
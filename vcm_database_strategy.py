@@ -14,10 +14,24 @@ Data: 2025-11-10
 """
 
 import os
+import sys
+import time
+import asyncio
+import logging
+import weakref
+import threading
 from enum import Enum
-from typing import Dict, Optional, Tuple
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
 from dataclasses import dataclass
 
+logger = logging.getLogger(__name__)
+
+# Registro de clientes (configurável via .env)
+CLIENT_IDLE_TTL = float(os.getenv('VCM_DB_CLIENT_IDLE_TTL', '600'))
+CLIENT_HEALTH_INTERVAL = float(os.getenv('VCM_DB_CLIENT_HEALTH_INTERVAL', '60'))
+
 class DatabaseStrategy(Enum):
     """Estratégias de banco de dados disponíveis"""
     LEGACY_SEPARATE = "legacy_separate"  # LifewayUSA - banco RAG separado
@@ -35,9 +49,143 @@ class DatabaseConfig:
     rag_key: Optional[str] = None
     requires_sync: bool = False
 
+def _create_async_client(url: str, key: str):
+    """Cliente PostgREST assíncrono (async_postgrest_service)"""
+    services_path = str(Path(__file__).parent / "AUTOMACAO_old" / "02_PROCESSAMENTO_PERSONAS")
+    if services_path not in sys.path:
+        sys.path.append(services_path)
+    from async_postgrest_service import create_async_client
+    return create_async_client(url, key)
+
+class ClientRegistry:
+    """
+    Registro de clientes PostgREST do processo, um por (url, key)
+    Clientes são criados sob demanda e compartilham o pool HTTP entre serviços.
+    Uma tarefa em segundo plano verifica a saúde dos clientes ativos e fecha os
+    pools ociosos; um cliente ocioso ainda referenciado por algum serviço é
+    reaproveitado (nunca há dois pools para o mesmo banco)
+    """
+    
+    def __init__(self, factory: Optional[Callable[[str, str], Any]] = None,
+                 idle_ttl: float = CLIENT_IDLE_TTL,
+                 health_interval: float = CLIENT_HEALTH_INTERVAL):
+        self.factory = factory or _create_async_client
+        self.idle_ttl = idle_ttl
+        self.health_interval = health_interval
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._idle: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.health: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'created': 0, 'reused': 0, 'evicted': 0}
+    
+    def get_client(self, url: str, key: str):
+        """Cliente compartilhado para (url, key), criado na primeira chamada"""
+        registry_key = (url.rstrip('/'), key)
+        
+        with self._lock:
+            client = self._clients.get(registry_key)
+            if client is None:
+                client = self._idle.pop(registry_key, None)
+            
+            if client is None:
+                client = self.factory(url, key)
+                self.stats['created'] += 1
+                logger.info(f"🔌 Cliente criado para {registry_key[0]}")
+            else:
+                self.stats['reused'] += 1
+            
+            self._clients[registry_key] = client
+            return client
+    
+    def start(self):
+        """Inicia a verificação de saúde/expiração no event loop atual"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._maintenance_loop())
+    
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+                await self.evict_idle()
+            except Exception as e:
+                logger.warning(f"Erro na manutenção do registro de clientes: {e}")
+    
+    async def check_health(self):
+        """Ping em paralelo de todos os clientes ativos"""
+        clients = list(self._clients.items())
+        await asyncio.gather(*[self._check_client(registry_key[0], client)
+                               for registry_key, client in clients])
+    
+    async def _check_client(self, url: str, client):
+        try:
+            latency = await client.ping()
+            self.health[url] = {
+                'healthy': True,
+                'latency_ms': round(latency * 1000, 1),
+                'checked_at': datetime.now().isoformat()
+            }
+        except Exception as e:
+            logger.warning(f"⚠️ Banco {url} não respondeu: {e}")
+            self.health[url] = {
+                'healthy': False,
+                'error': str(e),
+                'checked_at': datetime.now().isoformat()
+            }
+    
+    async def evict_idle(self):
+        """Fecha o pool dos clientes sem uso há mais de idle_ttl segundos"""
+        now = time.time()
+        
+        with self._lock:
+            # Clientes ociosos que voltaram a ser usados por quem ainda os referencia
+            for registry_key, client in list(self._idle.items()):
+                if now - client.last_used <= self.idle_ttl:
+                    self._clients[registry_key] = self._idle.pop(registry_key)
+            
+            evicted = [(registry_key, client) for registry_key, client in self._clients.items()
+                       if now - client.last_used > self.idle_ttl]
+            for registry_key, client in evicted:
+                del self._clients[registry_key]
+                self._idle[registry_key] = client
+        
+        for registry_key, client in evicted:
+            await client.aclose()
+            self.health.pop(registry_key[0], None)
+            logger.info(f"💤 Pool ocioso fechado: {registry_key[0]}")
+        
+        self.stats['evicted'] += len(evicted)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Clientes ativos/ociosos, contadores e último estado de saúde"""
+        return {
+            'active_clients': len(self._clients),
+            'idle_clients': len(self._idle),
+            **self.stats,
+            'health': dict(self.health)
+        }
+    
+    async def close(self):
+        """Para a manutenção e fecha todos os pools"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        
+        with self._lock:
+            clients = list(self._clients.values()) + list(self._idle.values())
+            self._clients.clear()
+            self._idle.clear()
+        
+        for client in clients:
+            await client.aclose()
+
 class VCMDatabaseManager:
     """Gerenciador de estratégias de banco de dados"""
     
+    # Clientes compartilhados por todo o processo
+    clients = ClientRegistry()
+    
     # Configurações de empresas legadas
     LEGACY_COMPANIES = {
         'LifewayUSA': {
@@ -56,6 +204,9 @@ class VCMDatabaseManager:
         
         if not self.vcm_url or not self.vcm_key:
             raise ValueError("VCM database credentials not found in environment")
+        
+        # Configurações por empresa (lidas do ambiente uma única vez)
+        self._configs: Dict[str, DatabaseConfig] = {}
     
     def get_database_config(self, company_name: str) -> DatabaseConfig:
         """
@@ -67,12 +218,25 @@ class VCMDatabaseManager:
         Returns:
             DatabaseConfig com a estratégia apropriada
         """
+        if company_name in self._configs:
+            return self._configs[company_name]
         
         # Verificar se é empresa legada
         if company_name in self.LEGACY_COMPANIES:
-            return self._get_legacy_config(company_name)
+            config = self._get_legacy_config(company_name)
         else:
-            return self._get_unified_config(company_name)
+            config = self._get_unified_config(company_name)
+        
+        self._configs[company_name] = config
+        return config
+    
+    def get_client(self, url: str, key: str):
+        """Cliente compartilhado do registro do processo"""
+        return self.clients.get_client(url, key)
+    
+    def get_vcm_client(self):
+        """Cliente do banco VCM Central"""
+        return self.get_client(self.vcm_url, self.vcm_key)
     
     def _get_legacy_config(self, company_name: str) -> DatabaseConfig:
         """Configuração para empresas legadas (ex: LifewayUSA)"""
@@ -148,6 +312,15 @@ class VCMDatabaseManager:
         
         return True, "Configuration valid"
 
+_database_manager: Optional[VCMDatabaseManager] = None
+
+def get_database_manager() -> VCMDatabaseManager:
+    """Gerenciador do processo (criado na primeira chamada)"""
+    global _database_manager
+    if _database_manager is None:
+        _database_manager = VCMDatabaseManager()
+    return _database_manager
+
 def get_database_strategy(company_name: str) -> DatabaseConfig:
     """
     Função helper para obter estratégia de banco de dados
@@ -158,8 +331,7 @@ def get_database_strategy(company_name: str) -> DatabaseConfig:
     Returns:
         DatabaseConfig apropriada para a empresa
     """
-    manager = VCMDatabaseManager()
-    return manager.get_database_config(company_name)
+    return get_database_manager().get_database_config(company_name)
 
 # Exemplo de uso
 if __name__ == "__main__":